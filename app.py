@@ -1,7 +1,20 @@
 import logging
 from flask import Flask
 from config import Config
+from logs import configure_logging
 from models import db
+from database import init_sqlite
+from migrations import upgrade, upgrade_db_command
+from model_registry import registry
+from prediction_cache import prediction_cache
+from log_writer import log_writer
+from metrics import metrics
+from upload_store import upload_store, prune_uploads_command
+from thumbnails import thumbnails
+from delicacy_cache import delicacy_cache
+from embedding_index import embedding_index, build_embedding_index_command
+from streaming import sock, open_streams
+from stats import rebuild_stats_command, ensure_backfilled
 from utils import init_db_data
 from routes import main
 
@@ -9,24 +22,39 @@ from routes import main
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
 
-logging.basicConfig(
-    filename='system.log',
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S'
-)
-console = logging.StreamHandler()
-console.setLevel(logging.INFO)
-logging.getLogger('').addHandler(console)
+configure_logging(Config.LOG_FILE, max_bytes=Config.LOG_MAX_BYTES, backups=Config.LOG_BACKUP_COUNT,
+                  json_path=Config.LOG_JSON_FILE)
 
-def create_app():
+def create_app(prefork=False):
+    # prefork=True (wsgi.py): background threads and connections are started
+    # per worker after fork instead of here
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.config['PREFORK'] = prefork
 
     db.init_app(app)
+    init_sqlite(app)
+    registry.init_app(app)
+    prediction_cache.init_app(app)
+    log_writer.init_app(app)
+    upload_store.init_app(app)
+    thumbnails.init_app(app)
+    delicacy_cache.init_app(app)
+    embedding_index.init_app(app)
+    metrics.init_app(app)
+    metrics.gauge('delicacy_log_writer_pending', "InferenceLog rows waiting to be written.", log_writer.pending)
+    metrics.gauge('delicacy_resident_models', "Models currently loaded.", lambda: len(registry.resident()))
+    metrics.gauge('delicacy_prediction_cache_hit_ratio', "Prediction cache hit ratio since start.",
+                  lambda: prediction_cache.stats()['hit_rate'] / 100)
+    metrics.gauge('delicacy_open_streams', "Open kiosk WebSocket streams.", open_streams)
 
     # Register Blueprints
     app.register_blueprint(main)
+    sock.init_app(app)
+    app.cli.add_command(rebuild_stats_command)
+    app.cli.add_command(prune_uploads_command)
+    app.cli.add_command(build_embedding_index_command)
+    app.cli.add_command(upgrade_db_command)
 
     return app
 
@@ -34,5 +62,7 @@ if __name__ == '__main__':
     app = create_app()
     with app.app_context():
         db.create_all()
+        upgrade(db.engine)
         init_db_data()
+        ensure_backfilled()
     app.run(debug=True)
\ No newline at end of file
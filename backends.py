@@ -0,0 +1,124 @@
+import os
+import threading
+import numpy as np
+
+# MODEL_BACKEND values: the Keras graph itself or one of the TFLite exports
+# written by convert_tflite.py
+BACKENDS = ('keras', 'tflite-fp16', 'tflite-int8')
+
+
+def tflite_path(model_path, variant):
+    """MyModels/ResNet50_v1_ft.keras -> MyModels/tflite/ResNet50_v1_ft_fp16.tflite"""
+    folder, filename = os.path.split(model_path)
+    stem = os.path.splitext(filename)[0]
+    return os.path.join(folder, 'tflite', f"{stem}_{variant}.tflite")
+
+
+class TFLiteModel:
+    """Wraps a TFLite interpreter behind the `predict_on_batch` interface of a Keras model."""
+
+    def __init__(self, path, num_threads=None, model_content=None):
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            from tensorflow.lite import Interpreter
+        self.path = path
+        self.model_content = model_content
+        if model_content is not None:
+            # Weights stay in the caller's buffer, e.g. one read before fork
+            self.interpreter = Interpreter(model_content=model_content, num_threads=num_threads)
+        else:
+            self.interpreter = Interpreter(model_path=path, num_threads=num_threads)
+        self.interpreter.allocate_tensors()
+        self._input = self.interpreter.get_input_details()[0]
+        self._output = self.interpreter.get_output_details()[0]
+        self._batch = int(self._input['shape'][0])
+        # The interpreter keeps internal state between invoke() calls
+        self._lock = threading.Lock()
+
+    def predict_on_batch(self, x):
+        x = np.ascontiguousarray(x, dtype=np.float32)
+        with self._lock:
+            if x.shape[0] != self._batch:
+                self.interpreter.resize_tensor_input(self._input['index'], list(x.shape))
+                self.interpreter.allocate_tensors()
+                self._batch = x.shape[0]
+            self.interpreter.set_tensor(self._input['index'], x)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output['index']).copy()
+
+    def size_bytes(self):
+        if self.model_content is not None:
+            return len(self.model_content)
+        return os.path.getsize(self.path)
+
+
+def _resolve_tflite(model_path, backend):
+    path = tflite_path(model_path, backend.split('-', 1)[1])
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found. Run convert_tflite.py first.")
+    return path
+
+
+def load_inference_model(model_path, backend='keras', num_threads=None, model_content=None):
+    """Loads a MODEL_PATHS file with the configured backend.
+
+    Every backend returns an object with `predict_on_batch(batch) -> ndarray`.
+    """
+    if backend == 'keras':
+        from tensorflow.keras.models import load_model
+        return load_model(model_path)
+    if backend in ('tflite-fp16', 'tflite-int8'):
+        return TFLiteModel(_resolve_tflite(model_path, backend), num_threads=num_threads, model_content=model_content)
+    raise ValueError(f"Unknown model backend: {backend}")
+
+
+def split_classifier(model):
+    """Splits a Keras classifier into `(backbone, head)` around its final softmax Dense.
+
+    `backbone.predict_on_batch` returns the penultimate-layer features and
+    `head(features)` applies the final layer in numpy. Returns None for TFLite
+    models and for graphs that don't end in a softmax Dense layer.
+    """
+    if isinstance(model, TFLiteModel):
+        return None
+    try:
+        import tensorflow as tf
+        last = model.layers[-1]
+        if getattr(getattr(last, 'activation', None), '__name__', '') != 'softmax':
+            return None
+        kernel, bias = (np.asarray(w, dtype=np.float32) for w in last.get_weights())
+        backbone = tf.keras.Model(model.inputs, last.input)
+    except Exception:
+        return None
+
+    def head(features):
+        logits = np.asarray(features, dtype=np.float32) @ kernel + bias
+        logits -= logits.max(axis=-1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=-1, keepdims=True)
+        return logits
+
+    return backbone, head
+
+
+def read_model_content(model_path, backend):
+    """Model bytes that can be read once in a pre-fork master and shared
+    copy-on-write with its workers, or None when the backend can't use them.
+
+    TensorFlow's runtime is not fork-safe once it has executed ops, so Keras
+    graphs are always loaded inside each worker instead.
+    """
+    if backend in ('tflite-fp16', 'tflite-int8'):
+        with open(_resolve_tflite(model_path, backend), 'rb') as f:
+            return f.read()
+    return None
+
+
+def model_size_bytes(model, model_path):
+    if isinstance(model, TFLiteModel):
+        return model.size_bytes()
+    try:
+        return int(model.count_params()) * 4
+    except Exception:
+        return os.path.getsize(model_path)
@@ -0,0 +1,230 @@
+import os
+import json
+import time
+import tarfile
+import zipfile
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from preprocessing import IMG_SIZE, decode_into
+from prediction_cache import prediction_cache, content_hash
+from log_writer import log_writer
+from metrics import metrics
+import postprocess
+from utils import IMAGE_EXTENSIONS
+
+
+# --- INPUT ITERATION ---
+def _is_image(name):
+    return os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS and not os.path.basename(name).startswith('.')
+
+
+def open_archive(archive):
+    """Opens an uploaded zip or tar(.gz/.bz2/.xz) so it can be rejected before streaming starts.
+
+    Returns `(filename, ZipFile or TarFile)`, or None when no archive was sent.
+    Raises ValueError if the upload is neither a readable zip nor a readable tar.
+    """
+    if not archive or not archive.filename:
+        return None
+    try:
+        if zipfile.is_zipfile(archive.stream):
+            archive.stream.seek(0)
+            return archive.filename, zipfile.ZipFile(archive.stream)
+        archive.stream.seek(0)
+        # Stream mode never seeks, so .tar/.tar.gz uploads are read front to back;
+        # opening reads the first header, which rejects anything that isn't a tar
+        return archive.filename, tarfile.open(fileobj=archive.stream, mode='r|*')
+    except Exception as e:
+        raise ValueError(f"Unreadable archive '{archive.filename}': {e}") from e
+
+
+def iter_uploads(files, archive, max_bytes):
+    """Yields `(name, data)` for every image, reading archive members one at a time.
+
+    `archive` comes from `open_archive`. `data` is the file's bytes, None when
+    it is over `max_bytes`, or an error message when the member can't be read.
+    """
+    for f in files:
+        if f and f.filename:
+            yield f.filename, f.read(max_bytes + 1)
+
+    if archive is None:
+        return
+    archive_name, handle = archive
+    with handle:
+        if isinstance(handle, zipfile.ZipFile):
+            for info in handle.infolist():
+                if info.is_dir() or not _is_image(info.filename):
+                    continue
+                if info.file_size > max_bytes:
+                    yield info.filename, None
+                    continue
+                try:
+                    data = handle.read(info)
+                except Exception as e:
+                    data = f"unreadable archive member: {e}"
+                yield info.filename, data
+            return
+
+        members = iter(handle)
+        while True:
+            try:
+                member = next(members)
+            except StopIteration:
+                return
+            except Exception as e:
+                # A tar stream can't be resynchronised after a bad header
+                yield archive_name, f"archive truncated or corrupt: {e}"
+                return
+            if not member.isfile() or not _is_image(member.name):
+                continue
+            if member.size > max_bytes:
+                yield member.name, None
+                continue
+            try:
+                data = handle.extractfile(member).read()
+            except Exception as e:
+                yield member.name, f"archive truncated or corrupt: {e}"
+                return
+            yield member.name, data
+
+
+def _chunks(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# --- PREDICTION STREAM ---
+def _decode_chunk(chunk, out, executor, max_bytes, model_name=''):
+    """Decodes a chunk into `out` in parallel. Returns per-row decode ms or an error message."""
+    def _one(args):
+        row, (name, data) = args
+        if isinstance(data, str):
+            return data
+        if data is None or len(data) > max_bytes:
+            return "image too large"
+        started = time.perf_counter()
+        try:
+            decode_into(data, out[row])
+        except Exception as e:
+            return f"decode failed: {e}"
+        elapsed = time.perf_counter() - started
+        metrics.observe('decode', model_name, elapsed)
+        return round(elapsed * 1000, 2)
+
+    return list(executor.map(_one, enumerate(chunk)))
+
+
+def stream_predictions(resident, items, top_k=3, chunk_size=64, workers=4,
+                       max_bytes=25 * 1024 * 1024, user_id=None):
+    """Yields one NDJSON line per image.
+
+    While chunk N runs through the model, chunk N+1 is already being decoded,
+    and only two chunk buffers exist at any time regardless of archive size.
+    """
+    buffers = [np.empty((chunk_size,) + IMG_SIZE[::-1] + (3,), dtype=np.float32) for _ in range(2)]
+    total = 0
+    started_all = time.perf_counter()
+
+    # Decoding runs on `executor`; `prefetcher` coordinates the next chunk so a
+    # chunk-level task never waits on row-level tasks queued in its own pool
+    with ThreadPoolExecutor(max_workers=workers) as executor, ThreadPoolExecutor(max_workers=1) as prefetcher:
+        def _prepare(chunk, buf):
+            # Cache hits need no decode; only misses get a buffer row
+            digests = [content_hash(data) if isinstance(data, bytes) and data else None for _, data in chunk]
+            cached = [prediction_cache.get(d, resident.name) if d else None for d in digests]
+            misses = [i for i, c in enumerate(cached) if c is None]
+            decoded = _decode_chunk([chunk[i] for i in misses], buf, executor, max_bytes, resident.name)
+            return digests, cached, misses, decoded
+
+        chunks = _chunks(items, chunk_size)
+        current = next(chunks, None)
+        pending = prefetcher.submit(_prepare, current, buffers[0]) if current else None
+        slot = 0
+
+        while current is not None:
+            digests, cached, misses, decoded = pending.result()
+            buf = buffers[slot]
+            upcoming = next(chunks, None)
+            if upcoming is not None:
+                pending = prefetcher.submit(_prepare, upcoming, buffers[1 - slot])
+
+            ok_rows = [r for r, d in enumerate(decoded) if not isinstance(d, str)]
+            forward_ms = 0.0
+            failure = None
+            pred_by_row = {}
+            if ok_rows:
+                batch = buf[ok_rows] if len(ok_rows) != len(decoded) else buf[:len(decoded)]
+                try:
+                    with metrics.timer('preprocess', resident.name):
+                        batch = resident.preprocess(batch)
+                    forward_started = time.perf_counter()
+                    preds = np.asarray(resident.predict(batch))
+                except Exception as e:
+                    # The 200 header is already out: report it in the body, then stop
+                    logging.error(f"Batch API forward failed: {e}", extra={'model': resident.name})
+                    failure = f"inference failed: {e}"
+                else:
+                    forward_elapsed = time.perf_counter() - forward_started
+                    metrics.observe('forward', resident.name, forward_elapsed)
+                    forward_ms = round(forward_elapsed * 1000, 2)
+                    pred_by_row = {r: preds[j] for j, r in enumerate(ok_rows)}
+
+            miss_pos = {i: row for row, i in enumerate(misses)}
+            lines, probs = [], []
+            for i, (name, _) in enumerate(current):
+                line = {"file": name}
+                if cached[i] is not None:
+                    probs.append(cached[i])
+                    line.update(cached=True, decode_ms=0.0, forward_ms=0.0)
+                else:
+                    row = miss_pos[i]
+                    if isinstance(decoded[row], str):
+                        line["error"] = decoded[row]
+                    elif failure:
+                        line["error"] = failure
+                    else:
+                        probs.append(pred_by_row[row])
+                        prediction_cache.put(digests[i], resident.name, pred_by_row[row])
+                        line.update(cached=False, decode_ms=decoded[row], forward_ms=forward_ms,
+                                    batch_size=len(ok_rows))
+                lines.append(line)
+
+            # Top-k, calibration, entropy and margin for the whole chunk at once
+            summary = postprocess.summarize(np.stack(probs), resident.temperature, top_k) if probs else None
+            row = 0
+            for line in lines:
+                total += 1
+                if "error" not in line:
+                    line["top_k"] = postprocess.top_k_list(summary, row)
+                    line["confidence"] = round(float(summary["confidence"][row]), 4)
+                    line["entropy"] = round(float(summary["entropy"][row]), 4)
+                    line["margin"] = round(float(summary["margin"][row]), 4)
+                    log_writer.submit(
+                        filename=line["file"][-120:], model_used=resident.name,
+                        inference_time_ms=line["decode_ms"] + line["forward_ms"], user_id=user_id,
+                        batch_size=line.get("batch_size"), forward_time_ms=line["forward_ms"] or None,
+                        is_cached=line["cached"], forward_passes=0 if line["cached"] else 1,
+                        **postprocess.row_fields(summary, row)
+                    )
+                    row += 1
+                yield json.dumps(line) + "\n"
+
+            if failure:
+                yield json.dumps({"error": failure, "images": total}) + "\n"
+                return
+
+            current = upcoming
+            slot = 1 - slot
+
+    elapsed = time.perf_counter() - started_all
+    logging.info(f"Batch API: {total} images via {resident.name} in {elapsed:.1f}s", extra={'model': resident.name})
+    yield json.dumps({"done": True, "images": total, "elapsed_ms": round(elapsed * 1000, 2)}) + "\n"
@@ -0,0 +1,236 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import resource
+import subprocess
+import numpy as np
+from PIL import Image
+
+from utils import MODEL_PATHS, METRIC_KEYS, IMAGE_EXTENSIONS
+from preprocessing import IMG_SIZE, decode_into, resolve_preprocess
+
+# Configuration
+MODEL_FOLDER = 'MyModels'
+REPORT_PATH = os.path.join(MODEL_FOLDER, 'benchmark_report.json')
+BATCH_SIZES = [1, 2, 4, 8, 16, 32, 64]
+SEED = 1234
+
+
+# --- IMAGE SET ---
+def synthetic_images(count, seed=SEED):
+    """Fixed-seed JPEGs at phone-camera size, so decode cost is realistic and repeatable."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        # Smooth gradients plus noise compress like a photo instead of like pure noise
+        base = np.linspace(0, 255, 1600, dtype=np.float32)
+        pixels = (base[None, :, None] * rng.uniform(0.3, 1.0, 3) + rng.normal(0, 12, (1200, 1600, 3)))
+        buf = io.BytesIO()
+        Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8)).save(buf, format='JPEG', quality=90)
+        images.append(buf.getvalue())
+    return images
+
+
+def disk_images(folder, count, seed=SEED):
+    paths = []
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(dirpath, filename))
+    paths.sort()
+    random.Random(seed).shuffle(paths)
+    images = []
+    for path in paths[:count]:
+        with open(path, 'rb') as f:
+            images.append(f.read())
+    return images
+
+
+# --- MEASUREMENT ---
+def percentiles(samples):
+    arr = np.asarray(samples, dtype=np.float64)
+    return {
+        "p50": round(float(np.percentile(arr, 50)), 3),
+        "p95": round(float(np.percentile(arr, 95)), 3),
+        "p99": round(float(np.percentile(arr, 99)), 3),
+        "mean": round(float(arr.mean()), 3),
+    }
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def bench_model(name, backend, images, batch_sizes, runs, warmup):
+    """Runs in a fresh interpreter so cold-load time and peak RSS belong to one model."""
+    from backends import load_inference_model
+
+    model_path = os.path.join(MODEL_FOLDER, MODEL_PATHS[name])
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    model = load_inference_model(model_path, backend)
+    cold_load_s = time.perf_counter() - started
+
+    preprocess = resolve_preprocess(name)
+    buf = np.empty((max(batch_sizes),) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    cursor = 0
+    result = {
+        "model": name,
+        "backend": backend,
+        "cold_load_s": round(cold_load_s, 3),
+        "batches": {},
+    }
+
+    # First call builds the graph / allocates tensors; report it separately
+    decode_into(images[0], buf[0])
+    started = time.perf_counter()
+    model.predict_on_batch(preprocess(buf[:1]))
+    result["first_predict_ms"] = round((time.perf_counter() - started) * 1000, 3)
+
+    for size in batch_sizes:
+        decode_ms, preprocess_ms, forward_ms, total_ms = [], [], [], []
+        for i in range(warmup + runs):
+            t0 = time.perf_counter()
+            for row in range(size):
+                decode_into(images[cursor % len(images)], buf[row])
+                cursor += 1
+            t1 = time.perf_counter()
+            batch = preprocess(buf[:size])
+            t2 = time.perf_counter()
+            model.predict_on_batch(batch)
+            t3 = time.perf_counter()
+            if i < warmup:
+                continue
+            decode_ms.append((t1 - t0) * 1000)
+            preprocess_ms.append((t2 - t1) * 1000)
+            forward_ms.append((t3 - t2) * 1000)
+            total_ms.append((t3 - t0) * 1000)
+        result["batches"][str(size)] = {
+            "decode_ms": percentiles(decode_ms),
+            "preprocess_ms": percentiles(preprocess_ms),
+            "forward_ms": percentiles(forward_ms),
+            "total_ms": percentiles(total_ms),
+            "images_per_s": round(size * 1000 / float(np.median(total_ms)), 1),
+        }
+        print(f"   batch {size:>2}: forward p50 {result['batches'][str(size)]['forward_ms']['p50']} ms",
+              file=sys.stderr)
+
+    result["peak_rss_mb"] = peak_rss_mb()
+    result["rss_growth_mb"] = round(result["peak_rss_mb"] - rss_before, 1)
+    return result
+
+
+# --- REGRESSION CHECK ---
+def compare(report, baseline, tolerance):
+    """Returns a list of human-readable regressions of forward/total p50 beyond `tolerance`."""
+    regressions = []
+    for key, entry in report["models"].items():
+        old = baseline.get("models", {}).get(key)
+        if not old:
+            continue
+        for size, stats in entry["batches"].items():
+            before = old.get("batches", {}).get(size)
+            if not before:
+                continue
+            for stage in ("forward_ms", "total_ms"):
+                new_p50, old_p50 = stats[stage]["p50"], before[stage]["p50"]
+                if old_p50 > 0 and new_p50 > old_p50 * (1 + tolerance):
+                    regressions.append(f"{key} batch {size} {stage}: {old_p50} -> {new_p50} ms "
+                                       f"(+{(new_p50 / old_p50 - 1) * 100:.0f}%)")
+        if old.get("peak_rss_mb") and entry["peak_rss_mb"] > old["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(f"{key} peak RSS: {old['peak_rss_mb']} -> {entry['peak_rss_mb']} MB")
+    return regressions
+
+
+def write_report(report, path):
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark load time, memory and latency for MODEL_PATHS entries.")
+    parser.add_argument('--models', nargs='*', default=list(MODEL_PATHS.keys()))
+    parser.add_argument('--backend', default='keras', help="keras, tflite-fp16 or tflite-int8")
+    parser.add_argument('--batch-sizes', nargs='*', type=int, default=BATCH_SIZES)
+    parser.add_argument('--runs', type=int, default=30, help="Timed runs per batch size")
+    parser.add_argument('--warmup', type=int, default=3)
+    parser.add_argument('--images', help="Folder of photos to use instead of the synthetic set")
+    parser.add_argument('--image-count', type=int, default=64)
+    parser.add_argument('--output', default=REPORT_PATH)
+    parser.add_argument('--baseline', help="Previous report; exit 1 if any p50 regresses beyond --tolerance")
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    parser.add_argument('--single', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    images = disk_images(args.images, args.image_count) if args.images else synthetic_images(args.image_count)
+    if not images:
+        print(f"❌ Error: no images found in {args.images}")
+        sys.exit(2)
+
+    if args.single:
+        # Child mode: benchmark one model and hand the result back on stdout
+        result = bench_model(args.single, args.backend, images, sorted(args.batch_sizes), args.runs, args.warmup)
+        print(json.dumps(result))
+        return
+
+    print(f"--- ⏱️ Benchmarking {len(args.models)} model(s) | backend={args.backend} "
+          f"| {len(images)} {'disk' if args.images else 'synthetic'} images ---")
+    report = {
+        "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": args.backend,
+            "image_set": args.images or f"synthetic:{SEED}",
+            "runs": args.runs,
+        },
+        "models": {},
+    }
+
+    for name in args.models:
+        if not os.path.exists(os.path.join(MODEL_FOLDER, MODEL_PATHS[name])):
+            print(f"   ⚠️ Skipped {name}: model file not found")
+            continue
+        print(f"\n📦 {name}")
+        cmd = [sys.executable, os.path.abspath(__file__), '--single', name, '--backend', args.backend,
+               '--runs', str(args.runs), '--warmup', str(args.warmup), '--image-count', str(args.image_count),
+               '--batch-sizes', *map(str, args.batch_sizes)]
+        if args.images:
+            cmd += ['--images', args.images]
+        env = dict(os.environ, TF_CPP_MIN_LOG_LEVEL='2')
+        proc = subprocess.run(cmd, stdout=subprocess.PIPE, env=env, text=True)
+        if proc.returncode != 0:
+            print(f"   ❌ Benchmark failed for {name} (exit code {proc.returncode})")
+            continue
+        result = json.loads(proc.stdout.strip().splitlines()[-1])
+        report["models"][METRIC_KEYS[name]] = result
+        print(f"   ✅ cold load {result['cold_load_s']}s | peak RSS {result['peak_rss_mb']} MB")
+
+    write_report(report, args.output)
+    print(f"\n--- ✨ Report written to {args.output} ---")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print(f"✅ No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import os
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils import MODEL_PATHS, METRIC_KEYS, iter_labelled_images
+from preprocessing import prepare_batch, resolve_preprocess
+from postprocess import apply_temperature
+
+# Configuration
+MODEL_FOLDER = 'MyModels'
+REPORT_PATH = os.path.join(MODEL_FOLDER, 'calibration.json')
+ECE_BINS = 15
+# Search range for the temperature, on a log scale
+T_MIN, T_MAX = 0.05, 20.0
+
+
+def collect_probs(model, items, preprocess, batch_size=32, workers=4):
+    """Softmax outputs and labels for a labelled folder, decoded in parallel."""
+    probs, labels = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(0, len(items), batch_size):
+            chunk = items[i:i + batch_size]
+            batch = prepare_batch([p for p, _ in chunk], preprocess, executor=executor)
+            probs.append(np.asarray(model.predict_on_batch(batch), dtype=np.float32))
+            labels.extend(label for _, label in chunk)
+    return np.concatenate(probs), np.asarray(labels)
+
+
+def nll(probs, labels, temperature=1.0):
+    scaled = apply_temperature(probs, temperature)
+    return float(-np.mean(np.log(np.maximum(scaled[np.arange(len(labels)), labels], 1e-12))))
+
+
+def ece(probs, labels, temperature=1.0, bins=ECE_BINS):
+    """Expected calibration error: gap between confidence and accuracy, averaged over confidence bins."""
+    scaled = apply_temperature(probs, temperature)
+    confidence = scaled.max(axis=1)
+    correct = scaled.argmax(axis=1) == labels
+    edges = np.linspace(0.0, 1.0, bins + 1)
+    which = np.clip(np.digitize(confidence, edges[1:-1]), 0, bins - 1)
+    total = 0.0
+    for b in range(bins):
+        mask = which == b
+        if mask.any():
+            total += mask.mean() * abs(confidence[mask].mean() - correct[mask].mean())
+    return float(total)
+
+
+def fit_temperature(probs, labels):
+    """Minimises validation NLL over T: a coarse log-spaced grid, then golden-section refinement."""
+    grid = np.exp(np.linspace(np.log(T_MIN), np.log(T_MAX), 60))
+    losses = [nll(probs, labels, t) for t in grid]
+    best = int(np.argmin(losses))
+    lo, hi = np.log(grid[max(best - 1, 0)]), np.log(grid[min(best + 1, len(grid) - 1)])
+    ratio = (np.sqrt(5) - 1) / 2
+    for _ in range(40):
+        a, b = hi - ratio * (hi - lo), lo + ratio * (hi - lo)
+        if nll(probs, labels, np.exp(a)) < nll(probs, labels, np.exp(b)):
+            hi = b
+        else:
+            lo = a
+    return float(np.exp((lo + hi) / 2))
+
+
+def write_report(report):
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    tmp_path = REPORT_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, REPORT_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit per-model softmax temperatures on a held-out labelled folder.")
+    parser.add_argument('--data-dir', required=True, help="Labelled calibration folder (one sub-folder per class)")
+    parser.add_argument('--models', nargs='*', default=list(MODEL_PATHS.keys()))
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite-fp16', 'tflite-int8'])
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    from backends import load_inference_model
+
+    items = list(iter_labelled_images(args.data_dir))
+    if not items:
+        print(f"❌ Error: no labelled images found in {args.data_dir}")
+        return
+    print(f"--- 🌡️ Calibrating {len(args.models)} model(s) on {len(items)} images ({args.backend}) ---")
+
+    report = {}
+    if os.path.exists(REPORT_PATH):
+        with open(REPORT_PATH) as f:
+            report = json.load(f)
+
+    for name in args.models:
+        model_path = os.path.join(MODEL_FOLDER, MODEL_PATHS[name])
+        if not os.path.exists(model_path):
+            print(f"   ⚠️ Skipped {name}: {model_path} not found")
+            continue
+
+        print(f"\n📦 {name}")
+        model = load_inference_model(model_path, args.backend)
+        probs, labels = collect_probs(model, items, resolve_preprocess(name), args.batch_size)
+        temperature = fit_temperature(probs, labels)
+        entry = {
+            "model": name,
+            "backend": args.backend,
+            "temperature": round(temperature, 4),
+            "samples": len(labels),
+            "accuracy": round(float(np.mean(probs.argmax(axis=1) == labels)) * 100, 2),
+            "nll_before": round(nll(probs, labels), 4),
+            "nll_after": round(nll(probs, labels, temperature), 4),
+            "ece_before": round(ece(probs, labels), 4),
+            "ece_after": round(ece(probs, labels, temperature), 4),
+        }
+        print(f"   ✅ T={entry['temperature']} | NLL {entry['nll_before']} -> {entry['nll_after']} "
+              f"| ECE {entry['ece_before']} -> {entry['ece_after']}")
+        report[METRIC_KEYS[name]] = entry
+        write_report(report)
+
+    print(f"\n--- ✨ Temperatures written to {REPORT_PATH}; restart the app or reload models to apply ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,9 +5,150 @@ class Config:
     SECRET_KEY = 'final-year-project-key'
     SQLALCHEMY_DATABASE_URI = 'sqlite:///database.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+    # SQLite allows one writer at a time, so each process writes through a
+    # single pooled connection (threads queue for it instead of spinning on
+    # "database is locked") and plain reads go to the 'read' pool, which WAL
+    # lets run alongside a write. Remove the 'read' bind to use one pool.
+    SQLALCHEMY_ENGINE_OPTIONS = {'pool_size': 1, 'max_overflow': 0, 'pool_timeout': 30}
+    SQLALCHEMY_BINDS = {
+        'read': {'url': SQLALCHEMY_DATABASE_URI, 'pool_size': 8, 'max_overflow': 8, 'pool_timeout': 30},
+    }
+    # Applied to every new connection. busy_timeout (ms) covers writers in
+    # other processes; cache_size is negative KiB per connection.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        'cache_size': -16000,
+        'temp_store': 'MEMORY',
+    }
     UPLOAD_FOLDER = 'static/uploads'
     MODEL_FOLDER = 'MyModels'
 
+    # 'keras' runs the .h5/.keras graphs; 'tflite-fp16' / 'tflite-int8' load the
+    # quantized exports written by convert_tflite.py into MyModels/tflite/
+    MODEL_BACKEND = 'keras'
+
+    # Micro-batching for /recognize: concurrent uploads wait up to
+    # BATCH_MAX_WAIT_MS to share one forward pass of at most BATCH_MAX_SIZE images
+    BATCH_MAX_SIZE = 16
+    BATCH_MAX_WAIT_MS = 5
+
+    # Model registry: several MODEL_PATHS entries can stay resident until their
+    # estimated weight memory exceeds this budget (least recently used go first)
+    MODEL_MEMORY_BUDGET_MB = 1024
+    MODEL_PRELOAD = []  # e.g. ["ResNet50 (Fine-Tuned)", "MobileNetV2 (Fine-Tuned)"]
+
+    # Inference worker processes per resident model (0 = run inside the web
+    # process). Each worker holds its own copy of the weights and receives
+    # batches through shared memory; dead workers are restarted automatically.
+    # Pools are not shared between gunicorn workers: a host runs
+    # WEB_CONCURRENCY x INFERENCE_WORKERS processes per resident model, so
+    # INFERENCE_WORKERS is lowered until that product fits INFERENCE_MAX_PROCESSES.
+    INFERENCE_WORKERS = 0
+    INFERENCE_MAX_PROCESSES = os.cpu_count() or 4
+    INFERENCE_INTRA_OP_THREADS = 2
+    INFERENCE_INTER_OP_THREADS = 1
+    INFERENCE_WORKER_START_TIMEOUT = 120  # seconds
+
+    # Prediction cache keyed by image content hash + model name.
+    # Set PREDICTION_CACHE_DB to None to keep the cache in memory only.
+    PREDICTION_CACHE_SIZE = 1024
+    PREDICTION_CACHE_TTL = 24 * 3600  # seconds
+    PREDICTION_CACHE_DB = 'prediction_cache.db'  # relative to the instance folder
+    PREDICTION_CACHE_DB_MAX_ROWS = 100000
+
+    # Background InferenceLog writer: rows are bulk-inserted every
+    # LOG_WRITER_BATCH_SIZE rows or LOG_WRITER_FLUSH_INTERVAL seconds
+    LOG_WRITER_BATCH_SIZE = 100
+    LOG_WRITER_FLUSH_INTERVAL = 1.0
+    LOG_WRITER_MAX_QUEUE = 10000
+    LOG_WRITER_PUT_TIMEOUT = 2.0
+
+    # Bulk recognition API (/api/recognize/batch)
+    BATCH_API_CHUNK_SIZE = 64
+    BATCH_API_DECODE_WORKERS = 4
+    BATCH_API_MAX_IMAGE_BYTES = 25 * 1024 * 1024
+
+    # Recognized photos are written by a background thread to
+    # UPLOAD_FOLDER/<2 hex>/<2 hex>/<sha256>.<ext>. Shard files older than
+    # UPLOAD_RETENTION_DAYS, or the oldest beyond UPLOAD_MAX_TOTAL_MB, are pruned
+    # with their thumbnails every UPLOAD_PRUNE_INTERVAL seconds (0 disables either rule)
+    UPLOAD_WRITER_MAX_QUEUE = 256
+    UPLOAD_RETENTION_DAYS = 30
+    UPLOAD_MAX_TOTAL_MB = 2048
+    UPLOAD_PRUNE_INTERVAL = 3600
+
+    # Resized WebP/JPEG derivatives for the library and result pages, named by
+    # content hash and served with a one-year Cache-Control
+    THUMBNAIL_FOLDER = 'static/thumbs'
+    THUMBNAIL_WIDTHS = [160, 320, 640]
+    THUMBNAIL_WEBP_QUALITY = 80
+    THUMBNAIL_JPEG_QUALITY = 82
+    # source -> digest manifest shared by every worker, relative to the instance folder
+    THUMBNAIL_MANIFEST_DB = 'thumbnails.db'
+    # Uploads waiting for background generation; beyond this they are made on first view
+    THUMBNAIL_MAX_QUEUE = 64
+
+    # DelicacyInfo is served from memory; the CRUD routes touch this file in the
+    # instance folder so every process reloads. The rendered library page is
+    # cached per navbar state (LIBRARY_PAGE_CACHE_SIZE entries) with an ETag.
+    DELICACY_VERSION_FILE = 'delicacy.version'
+    LIBRARY_PAGE_CACHE_SIZE = 64
+
+    # wsgi.py / gunicorn: each worker activates SYSTEM_STATE's current model at
+    # boot so /readyz can pass without an admin pressing Start
+    WSGI_AUTOSTART = True
+
+    # Per-stage latency histograms (/metrics, Prometheus text format). The
+    # dashboard's live view uses the last METRICS_WINDOW samples per series.
+    # When METRICS_TOKEN is set, scrapers must send "Authorization: Bearer <token>".
+    METRICS_WINDOW = 512
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # Kiosk streaming (/ws/recognize, /kiosk): only the newest JPEG frame is
+    # classified, older ones are dropped. STREAM_SMOOTHING is the default EMA
+    # weight of each new frame (1 = no smoothing). The kiosk page captures at
+    # most STREAM_CLIENT_FPS frames per second, STREAM_FRAME_WIDTH pixels wide.
+    STREAM_SMOOTHING = 0.4
+    STREAM_IDLE_TIMEOUT = 30  # seconds without a frame before the server closes
+    STREAM_MAX_FRAME_BYTES = 2 * 1024 * 1024
+    STREAM_LOGIN_REQUIRED = False
+    STREAM_CLIENT_FPS = 8
+    STREAM_FRAME_WIDTH = 320
+    SOCK_SERVER_OPTIONS = {'ping_interval': 25}
+
+    # Penultimate-layer embeddings of every upload, per model, in memory-mapped
+    # float16 files under instance/EMBEDDING_INDEX_FOLDER. Features are projected
+    # to EMBEDDING_DIM (0 keeps the native size). A photo at least
+    # EMBEDDING_DUPLICATE_THRESHOLD cosine-similar to a stored one reuses its
+    # prediction. Once a store holds EMBEDDING_IVF_TRAIN_AT vectors, IVF lists are
+    # trained in the background (and retrained each time the store doubles);
+    # queries then scan EMBEDDING_IVF_PROBE lists instead of every vector.
+    # `flask build-embedding-index` retrains by hand. Similar-photo lists are
+    # reused for SIMILAR_PHOTOS_TTL seconds per stored row.
+    EMBEDDING_INDEX = True
+    EMBEDDING_INDEX_FOLDER = 'embeddings'
+    EMBEDDING_DIM = 256
+    EMBEDDING_DUPLICATE_THRESHOLD = 0.97
+    EMBEDDING_IVF_LISTS = 2048  # ~1M vectors: 3 ms p50 / 6 ms p95 per query at 256 dims
+    EMBEDDING_IVF_PROBE = 8
+    EMBEDDING_IVF_TRAIN_AT = 20000  # 0 disables automatic training
+    EMBEDDING_LIST_CACHE_MB = 64  # per model, IVF lists kept as float32
+    SIMILAR_PHOTOS = 6
+    SIMILAR_PHOTOS_TTL = 300
+
+    # system.log rotates at LOG_MAX_BYTES, keeping LOG_BACKUP_COUNT old files.
+    # LOG_JSON_FILE (None to disable) gets the same records as JSON lines, with
+    # the model name on inference results, for the dashboard console's filters.
+    LOG_FILE = 'system.log'
+    LOG_JSON_FILE = 'system.jsonl'
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    LOG_TAIL_LINES = 100
+    LOG_POLL_MAX_BYTES = 256 * 1024  # larger gaps re-send the tail instead
+
     # Ensure upload folder exists
     if not os.path.exists(UPLOAD_FOLDER):
         os.makedirs(UPLOAD_FOLDER)
\ No newline at end of file
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import random
+import argparse
+import numpy as np
+import tensorflow as tf
+
+from utils import MODEL_PATHS, METRIC_KEYS, IMAGE_EXTENSIONS, iter_labelled_images
+from preprocessing import prepare_image, prepare_batch, resolve_preprocess
+from backends import tflite_path, TFLiteModel
+
+# Configuration
+MODEL_FOLDER = 'MyModels'
+REPORT_PATH = os.path.join(MODEL_FOLDER, 'tflite', 'tflite_report.json')
+VARIANTS = ('fp16', 'int8')
+LATENCY_RUNS = 20
+
+
+def calibration_images(folder, limit, seed=42):
+    paths = []
+    for dirpath, _, filenames in os.walk(folder):
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                paths.append(os.path.join(dirpath, filename))
+    paths.sort()
+    random.Random(seed).shuffle(paths)
+    return paths[:limit]
+
+
+def convert(model, variant, calib_paths, preprocess):
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        # Full-integer weights and activations, calibrated on real photos;
+        # input/output stay float32 so the app's preprocessing is unchanged
+        def representative_dataset():
+            for path in calib_paths:
+                yield [prepare_image(path, preprocess)]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+    return converter.convert()
+
+
+def measure_latency(predict, sample):
+    for _ in range(3):
+        predict(sample)
+    times = []
+    for _ in range(LATENCY_RUNS):
+        start = time.perf_counter()
+        predict(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return round(float(np.median(times)), 2)
+
+
+def measure_accuracy(predict, eval_items, preprocess, batch_size=32):
+    if not eval_items:
+        return None
+    correct = 0
+    for i in range(0, len(eval_items), batch_size):
+        chunk = eval_items[i:i + batch_size]
+        batch = prepare_batch([p for p, _ in chunk], preprocess)
+        preds = np.argmax(predict(batch), axis=1)
+        correct += int(np.sum(preds == np.array([label for _, label in chunk])))
+    return round(correct / len(eval_items) * 100, 2)
+
+
+def write_report(report):
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    tmp_path = REPORT_PATH + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, REPORT_PATH)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export MODEL_PATHS entries to float16 / int8 TFLite models.")
+    parser.add_argument('--calibration-dir', required=True, help="Folder of sample photos for int8 calibration")
+    parser.add_argument('--eval-dir', help="Optional labelled test folder (one sub-folder per class)")
+    parser.add_argument('--calibration-samples', type=int, default=200)
+    parser.add_argument('--models', nargs='*', default=list(MODEL_PATHS.keys()))
+    args = parser.parse_args()
+
+    calib_paths = calibration_images(args.calibration_dir, args.calibration_samples)
+    if not calib_paths:
+        print(f"❌ Error: no images found in {args.calibration_dir}")
+        return
+    eval_items = list(iter_labelled_images(args.eval_dir)) if args.eval_dir else []
+    print(f"--- 🛠️ Converting {len(args.models)} model(s) | {len(calib_paths)} calibration images "
+          f"| {len(eval_items)} evaluation images ---")
+
+    report = {}
+    if os.path.exists(REPORT_PATH):
+        with open(REPORT_PATH) as f:
+            report = json.load(f)
+
+    for name in args.models:
+        model_path = os.path.join(MODEL_FOLDER, MODEL_PATHS[name])
+        if not os.path.exists(model_path):
+            print(f"   ⚠️ Skipped {name}: {model_path} not found")
+            continue
+
+        print(f"\n📦 {name}")
+        preprocess = resolve_preprocess(name)
+        sample = prepare_image(calib_paths[0], preprocess)
+        model = tf.keras.models.load_model(model_path)
+        entry = {
+            "model": name,
+            "keras": {
+                "size_mb": round(os.path.getsize(model_path) / (1024 * 1024), 2),
+                "latency_ms": measure_latency(model.predict_on_batch, sample),
+                "accuracy": measure_accuracy(model.predict_on_batch, eval_items, preprocess),
+            }
+        }
+        print(f"   keras: {entry['keras']}")
+
+        for variant in VARIANTS:
+            out_path = tflite_path(model_path, variant)
+            try:
+                os.makedirs(os.path.dirname(out_path), exist_ok=True)
+                with open(out_path, 'wb') as f:
+                    f.write(convert(model, variant, calib_paths, preprocess))
+                lite = TFLiteModel(out_path)
+                entry[variant] = {
+                    "size_mb": round(os.path.getsize(out_path) / (1024 * 1024), 2),
+                    "latency_ms": measure_latency(lite.predict_on_batch, sample),
+                    "accuracy": measure_accuracy(lite.predict_on_batch, eval_items, preprocess),
+                }
+                print(f"   ✅ {variant}: {entry[variant]}")
+            except Exception as e:
+                print(f"   ❌ {variant} conversion failed: {e}")
+
+        report[METRIC_KEYS[name]] = entry
+        write_report(report)
+        tf.keras.backend.clear_session()
+
+    print(f"\n--- ✨ Report written to {REPORT_PATH} ---")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import logging
+from sqlalchemy import event
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.sql.elements import TextClause
+from flask_sqlalchemy.session import Session
+
+# Bind key of the read-only pool (Config.SQLALCHEMY_BINDS)
+READ_BIND = 'read'
+
+
+class RoutingSession(Session):
+    """Sends plain reads to the 'read' pool and everything else to the default engine.
+
+    A session that has written in its current transaction keeps using the
+    writer until commit/rollback, so it reads its own uncommitted rows.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        engines = self._db.engines
+        if bind is not None or READ_BIND not in engines or engine is not engines.get(None):
+            return engine
+        if self._flushing or isinstance(clause, (UpdateBase, TextClause)) or self.info.get('wrote'):
+            self.info['wrote'] = True
+            return engine
+        return engines[READ_BIND]
+
+
+@event.listens_for(RoutingSession, 'after_transaction_end')
+def _end_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('wrote', None)
+
+
+# --- ENGINE SETUP ---
+def _pragma_hooks(engine, pragmas, writer):
+    @event.listens_for(engine, 'connect')
+    def _on_connect(dbapi_conn, record):
+        # pysqlite's implicit BEGIN is disabled; SQLAlchemy's 'begin' event below takes over
+        dbapi_conn.isolation_level = None
+        cursor = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            if name == 'journal_mode':
+                if not writer:
+                    continue  # persistent; set by the writer
+                # SQLite answers with the mode it ended up in (WAL is refused on some filesystems)
+                mode = cursor.execute(f"PRAGMA journal_mode={value}").fetchone()[0]
+                if mode.lower() != str(value).lower():
+                    logging.warning(f"SQLite journal_mode={value} not applied to {engine.url.database} (got {mode})")
+                continue
+            cursor.execute(f"PRAGMA {name}={value}")
+        if not writer:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+
+    if writer:
+        @event.listens_for(engine, 'begin')
+        def _on_begin(conn):
+            # Take the write lock up front: a deferred transaction that upgrades
+            # from read to write fails with SQLITE_BUSY without waiting
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def init_sqlite(app):
+    """Applies Config.SQLITE_PRAGMAS to every new connection of the app's SQLite engines."""
+    from models import db
+    pragmas = app.config.get('SQLITE_PRAGMAS') or {}
+    with app.app_context():
+        for key, engine in db.engines.items():
+            if engine.dialect.name != 'sqlite':
+                continue
+            _pragma_hooks(engine, pragmas, writer=key != READ_BIND)
+
+
+def dispose_engines(close=True):
+    """Drops pooled connections of every bind; call around fork (needs an app context)."""
+    from models import db
+    for engine in db.engines.values():
+        engine.dispose(close=close)
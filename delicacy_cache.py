@@ -0,0 +1,135 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from types import SimpleNamespace
+from collections import OrderedDict
+
+from models import DelicacyInfo
+from utils import CLASS_NAMES, DISPLAY_NAMES
+
+_FIELDS = ('id', 'name', 'description', 'history', 'ingredients', 'recipe', 'image_filename')
+
+
+def _normalize(name):
+    return ' '.join((name or '').lower().replace('-', ' ').split())
+
+
+class DelicacyCache:
+    """Read-through cache of the DelicacyInfo table.
+
+    Records are plain snapshots, safe to use outside a session. A version
+    file in the instance folder is touched by the admin CRUD routes and by
+    update_db.py, so every process sees a change with one stat() per request
+    and reloads on its next read. The library page's rendered HTML is kept per
+    (data version, thumbnail version, navbar state) together with its ETag.
+    """
+
+    def __init__(self):
+        self.version_path = None
+        self.max_pages = 64
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._records = []
+        self._by_name = {}
+        self._by_class = {}
+        self._pages = OrderedDict()
+
+    def init_app(self, app):
+        os.makedirs(app.instance_path, exist_ok=True)
+        self.version_path = os.path.join(app.instance_path, app.config['DELICACY_VERSION_FILE'])
+        self.max_pages = app.config['LIBRARY_PAGE_CACHE_SIZE']
+
+    # --- READS ---
+    def all(self):
+        """Every record, sorted by name."""
+        self._ensure_fresh()
+        return self._records
+
+    def get(self, name):
+        self._ensure_fresh()
+        return self._by_name.get(name)
+
+    def for_class(self, class_name):
+        """Record for a CLASS_NAMES entry or its display name, e.g. 'kuih_talam' -> 'Kuih Talam Pandan'."""
+        self._ensure_fresh()
+        return self._by_class.get(class_name) or self._by_name.get(class_name)
+
+    @property
+    def version(self):
+        self._ensure_fresh()
+        return self._stamp
+
+    # --- WRITES ---
+    def invalidate(self):
+        """Call after committing a DelicacyInfo change."""
+        if self.version_path:
+            with open(self.version_path, 'w') as f:
+                f.write(str(time.time_ns()))
+        with self._lock:
+            self._stamp = None
+
+    # --- RENDERED PAGES ---
+    def page(self, key, render):
+        """Returns (html, etag) for `key`, calling `render()` on a miss."""
+        with self._lock:
+            hit = self._pages.get(key)
+            if hit is not None:
+                self._pages.move_to_end(key)
+                return hit
+        html = render()
+        entry = (html, hashlib.sha1(html.encode('utf-8')).hexdigest())
+        with self._lock:
+            self._pages[key] = entry
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+        return entry
+
+    # --- LOADING ---
+    def _current_stamp(self):
+        try:
+            st = os.stat(self.version_path)
+            return st.st_mtime_ns, st.st_size
+        except (TypeError, FileNotFoundError):
+            return 0, 0
+
+    def _ensure_fresh(self):
+        stamp = self._current_stamp()
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            rows = DelicacyInfo.query.order_by(DelicacyInfo.name).all()
+            records = [SimpleNamespace(**{f: getattr(r, f) for f in _FIELDS}) for r in rows]
+            by_name = {r.name: r for r in records}
+            self._records = records
+            self._by_name = by_name
+            self._by_class = self._map_classes(records)
+            self._pages.clear()
+            self._stamp = stamp
+        logging.info(f"Delicacy cache loaded: {len(records)} records")
+
+    @staticmethod
+    def _map_classes(records):
+        # Exact display-name match first, then the shortest record name that
+        # starts with it ("Kuih Talam" -> "Kuih Talam Pandan")
+        normalized = [(_normalize(r.name), r) for r in records]
+        mapping = {}
+        for class_name in CLASS_NAMES:
+            display = DISPLAY_NAMES.get(class_name, class_name)
+            target = _normalize(display)
+            match = next((r for n, r in normalized if n == target), None)
+            if match is None:
+                prefixed = [r for n, r in normalized if n.startswith(target + ' ')]
+                match = min(prefixed, key=lambda r: len(r.name)) if prefixed else None
+            if match is None:
+                logging.warning(f"No DelicacyInfo record for class {class_name} ({display})")
+                continue
+            mapping[class_name] = match
+            mapping[display] = match
+        return mapping
+
+
+delicacy_cache = DelicacyCache()
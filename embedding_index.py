@@ -0,0 +1,500 @@
+import os
+import json
+import time
+import fcntl
+import logging
+import threading
+import click
+import numpy as np
+from collections import OrderedDict
+from flask import current_app
+from flask.cli import with_appcontext
+
+from utils import CLASS_NAMES, DISPLAY_NAMES, METRIC_KEYS
+
+# Stored upload names ("ab/cd/<sha256>.<ext>") are padded to this width
+NAME_BYTES = 80
+# Vectors per query block when scanning without IVF lists
+_BRUTE_BLOCK = 131072
+
+
+def _normalize(x):
+    x = np.asarray(x, dtype=np.float32)
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+class VectorShard:
+    """Append-only embedding store for one model, in fixed-width files:
+
+        vectors.f16   N x dim unit vectors (float16)
+        probs.f16     N x classes predictions stored with each vector
+        names.bin     N x NAME_BYTES upload names
+        lists.i32     IVF list of each row, once the lists are trained
+        ivf.npz       IVF centroids
+        meta.json     dim, native_dim, the random projection seed and the
+                      committed row count
+
+    Every file is memory-mapped read-only and re-mapped when meta.json
+    changes, so several processes can share one store. Appends take an
+    exclusive flock, write the row to every file and then replace meta.json
+    with the new count; readers never map past that count, and the next
+    append truncates whatever a crashed writer left beyond it.
+    """
+
+    def __init__(self, folder, dim=256, lists=2048, probe=8, list_cache_mb=64, train_at=20000):
+        self.folder = folder
+        self.target_dim = dim
+        self.n_lists = lists
+        self.probe = probe
+        # Lists are trained in the background at this many rows, then each time the store doubles
+        self.train_at = train_at
+        # float16 -> float32 conversion dominates a query, so recently probed
+        # lists are kept converted, up to list_cache_mb
+        self.list_cache_bytes = list_cache_mb * 1024 * 1024
+        self._list_cache = OrderedDict()
+        self._list_cache_used = 0
+        self.meta = None
+        self.projection = None
+        self._lock = threading.Lock()
+        self._rows = 0
+        self._meta_stamp = None
+        self._ivf_stamp = None
+        self._vectors = self._probs = self._names = None
+        self._centroids = None
+        self._lists = None
+        self._assigned = 0
+        self._ivf_rows = 0
+        self._training = False
+
+    def _path(self, name):
+        return os.path.join(self.folder, name)
+
+    @property
+    def count(self):
+        self._refresh()
+        return self._rows
+
+    # --- WRITES ---
+    def add(self, features, probs, name):
+        """Appends one image; returns its row number."""
+        vector = self._project(features)
+        with self._file_lock():
+            # Another process may have committed within the same mtime tick
+            self._meta_stamp = None
+            self._refresh()
+            row = self.count
+            self._truncate(row)
+            with open(self._path('vectors.f16'), 'ab') as f:
+                f.write(vector.astype(np.float16).tobytes())
+            with open(self._path('probs.f16'), 'ab') as f:
+                f.write(np.asarray(probs, dtype=np.float16).tobytes())
+            with open(self._path('names.bin'), 'ab') as f:
+                f.write(name.encode('utf-8')[:NAME_BYTES].ljust(NAME_BYTES, b'\0'))
+            if self._centroids is not None:
+                list_id = np.int32(np.argmax(self._centroids @ vector))
+                with open(self._path('lists.i32'), 'ab') as f:
+                    f.write(list_id.tobytes())
+            self._commit(row + 1)
+        if self.train_due():
+            self.train_async()
+        return row
+
+    def _truncate(self, rows):
+        """Drops bytes past the committed row count, left by a writer that died mid-append."""
+        widths = {'vectors.f16': self.meta['dim'] * 2, 'probs.f16': len(CLASS_NAMES) * 2,
+                  'names.bin': NAME_BYTES, 'lists.i32': 4}
+        for name, width in widths.items():
+            path = self._path(name)
+            try:
+                if os.path.getsize(path) > rows * width:
+                    os.truncate(path, rows * width)
+            except FileNotFoundError:
+                pass
+
+    def _commit(self, rows):
+        meta_path = self._path('meta.json')
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(dict(self.meta, rows=rows), f)
+        os.replace(meta_path + '.tmp', meta_path)
+
+    def build_ivf(self, n_lists=None, iterations=10, sample=None, seed=0):
+        """Trains spherical k-means centroids and assigns every stored row to a list.
+
+        Training reads committed rows only and runs without the file lock, so
+        uploads keep appending meanwhile; the rows they add are assigned under
+        the lock just before the new lists replace the old ones.
+        """
+        n_lists = n_lists or self.n_lists
+        self._refresh()
+        n, vectors = self.count, self._vectors
+        if n < n_lists:
+            raise ValueError(f"{n} vectors are too few for {n_lists} lists")
+        rng = np.random.default_rng(seed)
+        sample = min(n, sample or n_lists * 64)
+        train = np.asarray(vectors[np.sort(rng.choice(n, sample, replace=False))], dtype=np.float32)
+        centroids = train[rng.choice(sample, n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            labels = self._assign(train, centroids)
+            order = np.argsort(labels, kind='stable')
+            counts = np.bincount(labels, minlength=n_lists)
+            present = np.flatnonzero(counts)
+            sums = np.zeros_like(centroids)
+            sums[present] = np.add.reduceat(train[order], np.concatenate([[0], np.cumsum(counts)[:-1]])[present])
+            empty = counts == 0
+            # Re-seed empty lists with random training vectors
+            sums[empty] = train[rng.choice(sample, int(empty.sum()))]
+            centroids = _normalize(sums)
+        labels = [self._assign_rows(vectors, 0, n, centroids)]
+        with self._file_lock():
+            self._meta_stamp = None
+            self._refresh()
+            total = self.count
+            labels.append(self._assign_rows(self._vectors, n, total, centroids))
+            tmp = self._path('lists.i32.tmp')
+            np.concatenate(labels).tofile(tmp)
+            os.replace(tmp, self._path('lists.i32'))
+            tmp = self._path('ivf.tmp.npz')
+            np.savez(tmp, centroids=centroids.astype(np.float32), rows=np.int64(total))
+            os.replace(tmp, self._path('ivf.npz'))
+        self._ivf_stamp = None
+        return total
+
+    def train_due(self):
+        """True once the store holds `train_at` rows without lists, or has doubled since they were trained."""
+        n = self.count
+        if not self.train_at or n < self.train_at:
+            return False
+        return self._centroids is None or n >= 2 * self._ivf_rows
+
+    def train_async(self):
+        """Rebuilds the IVF lists on a background thread, at most once at a time across processes."""
+        with self._lock:
+            if self._training:
+                return
+            self._training = True
+        threading.Thread(target=self._train, name=f"ivf-{os.path.basename(self.folder)}", daemon=True).start()
+
+    def _train(self):
+        try:
+            with _FileLock(self._path('.train.lock'), blocking=False):
+                if not self.train_due():
+                    return  # another process finished training first
+                started = time.perf_counter()
+                # About 4 * sqrt(N) lists keeps both the probed lists and the centroid scan small
+                n_lists = min(self.n_lists, int(4 * np.sqrt(self.count)))
+                count = self.build_ivf(n_lists)
+                logging.info(f"Embedding IVF trained for {os.path.basename(self.folder)}: "
+                             f"{count} vectors in {n_lists} lists ({time.perf_counter() - started:.1f}s)")
+        except BlockingIOError:
+            pass  # another process is training
+        except Exception as e:
+            logging.warning(f"Embedding IVF training failed ({self.folder}): {e}")
+        finally:
+            self._training = False
+
+    def _assign_rows(self, vectors, start, end, centroids):
+        if end <= start:
+            return np.empty(0, dtype=np.int32)
+        return np.concatenate([self._assign(np.asarray(vectors[i:min(i + _BRUTE_BLOCK, end)], dtype=np.float32), centroids)
+                               for i in range(start, end, _BRUTE_BLOCK)]).astype(np.int32)
+
+    @staticmethod
+    def _assign(vectors, centroids):
+        return np.argmax(vectors @ centroids.T, axis=1)
+
+    # --- READS ---
+    def search(self, features=None, k=10, row=None, vector=None):
+        """Top-k rows by cosine similarity to `features` (or to stored `row`).
+
+        Returns `(rows, scores)`, best first. With IVF lists only the `probe`
+        nearest lists are scanned, plus any rows appended without a list.
+        """
+        self._refresh()
+        n = self.count
+        if n == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        if vector is None:
+            vector = np.asarray(self._vectors[row], dtype=np.float32) if row is not None else self._project(features)
+
+        if self._centroids is not None:
+            probe = np.argpartition(-(self._centroids @ vector), min(self.probe, len(self._centroids) - 1))[:self.probe]
+            blocks = [self._list_block(int(p)) for p in probe]
+            if self._assigned < n:
+                blocks.append((np.arange(self._assigned, n),
+                               np.asarray(self._vectors[self._assigned:n], dtype=np.float32)))
+            ids = np.concatenate([b[0] for b in blocks])
+            scores = np.concatenate([b[1] @ vector for b in blocks])
+        else:
+            ids = None
+            scores = np.concatenate([np.asarray(self._vectors[i:i + _BRUTE_BLOCK], dtype=np.float32) @ vector
+                                     for i in range(0, n, _BRUTE_BLOCK)])
+
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        rows = ids[top] if ids is not None else top
+        return rows.astype(np.int64), scores[top]
+
+    def _list_block(self, list_id):
+        with self._lock:
+            block = self._list_cache.get(list_id)
+            if block is not None:
+                self._list_cache.move_to_end(list_id)
+                return block
+            ids = self._lists[list_id]
+        block = (ids, np.asarray(self._vectors[ids], dtype=np.float32))
+        with self._lock:
+            self._list_cache[list_id] = block
+            self._list_cache_used += block[1].nbytes
+            while self._list_cache_used > self.list_cache_bytes and len(self._list_cache) > 1:
+                _, (_, old) = self._list_cache.popitem(last=False)
+                self._list_cache_used -= old.nbytes
+        return block
+
+    def probs(self, row):
+        self._refresh()
+        return np.asarray(self._probs[row], dtype=np.float32)
+
+    def name(self, row):
+        self._refresh()
+        return self._names[row].tobytes().rstrip(b'\0').decode('utf-8')
+
+    # --- LOADING ---
+    def _project(self, features):
+        features = np.asarray(features, dtype=np.float32).reshape(-1)
+        if self.meta is None:
+            self._init_meta(len(features))
+        if self.projection is not None:
+            features = features @ self.projection
+        return _normalize(features)
+
+    def _init_meta(self, native_dim):
+        os.makedirs(self.folder, exist_ok=True)
+        meta_path = self._path('meta.json')
+        with self._file_lock():
+            if not os.path.exists(meta_path):
+                dim = self.target_dim if 0 < self.target_dim < native_dim else native_dim
+                with open(meta_path + '.tmp', 'w') as f:
+                    json.dump({"dim": dim, "native_dim": native_dim, "seed": 0, "created": time.time(), "rows": 0}, f)
+                os.replace(meta_path + '.tmp', meta_path)
+        self._load_meta()
+
+    def _load_meta(self):
+        with open(self._path('meta.json')) as f:
+            meta = json.load(f)
+        if 'rows' not in meta:
+            # Stores written before the count was kept in meta.json: the shortest file wins
+            sizes = [self._stamp(name) for name in ('vectors.f16', 'probs.f16', 'names.bin')]
+            widths = (meta['dim'] * 2, len(CLASS_NAMES) * 2, NAME_BYTES)
+            meta['rows'] = min((s[2] if s else 0) // w for s, w in zip(sizes, widths))
+        if self.projection is None and meta['dim'] != meta['native_dim']:
+            # Random Gaussian projection: cosine similarities survive, storage shrinks
+            rng = np.random.default_rng(meta['seed'])
+            self.projection = (rng.standard_normal((meta['native_dim'], meta['dim'])) /
+                               np.sqrt(meta['dim'])).astype(np.float32)
+        self.meta = meta
+
+    def _file_lock(self):
+        os.makedirs(self.folder, exist_ok=True)
+        return _FileLock(self._path('.lock'))
+
+    def _refresh(self):
+        meta_stamp = self._stamp('meta.json')
+        ivf_stamp = self._stamp('ivf.npz')
+        if meta_stamp is None or (meta_stamp == self._meta_stamp and ivf_stamp == self._ivf_stamp):
+            return
+        with self._lock:
+            if meta_stamp != self._meta_stamp:
+                self._load_meta()
+            dim = self.meta['dim']
+            n = self.meta['rows']
+            if n and n != self._rows:
+                self._vectors = np.memmap(self._path('vectors.f16'), dtype=np.float16, mode='r', shape=(n, dim))
+                self._probs = np.memmap(self._path('probs.f16'), dtype=np.float16, mode='r',
+                                        shape=(n, len(CLASS_NAMES)))
+                self._names = np.memmap(self._path('names.bin'), dtype=np.uint8, mode='r', shape=(n, NAME_BYTES))
+            self._load_lists(n, ivf_stamp)
+            self._rows = n
+            self._meta_stamp = meta_stamp
+
+    def _load_lists(self, n, ivf_stamp):
+        if ivf_stamp is None:
+            self._centroids, self._lists, self._assigned, self._ivf_stamp = None, None, 0, None
+            return
+        if ivf_stamp != self._ivf_stamp:
+            with np.load(self._path('ivf.npz')) as data:
+                self._centroids = data['centroids']
+                # Lists built before auto-training count as trained on the current store
+                self._ivf_rows = int(data['rows']) if 'rows' in data.files else n
+            self._lists, self._assigned = [np.empty(0, dtype=np.int64)] * len(self._centroids), 0
+            self._ivf_stamp = ivf_stamp
+            self._list_cache.clear()
+            self._list_cache_used = 0
+        stamp = self._stamp('lists.i32')
+        available = min(n, stamp[2] // 4) if stamp else 0
+        if available <= self._assigned:
+            return
+        labels = np.fromfile(self._path('lists.i32'), dtype=np.int32, count=available - self._assigned,
+                             offset=self._assigned * 4)
+        # Only the lists that received rows are rebuilt
+        order = np.argsort(labels, kind='stable')
+        bounds = np.searchsorted(labels[order], np.arange(len(self._centroids) + 1))
+        lists = list(self._lists)
+        for list_id in np.flatnonzero(np.diff(bounds)):
+            new_rows = order[bounds[list_id]:bounds[list_id + 1]] + self._assigned
+            lists[list_id] = np.concatenate([lists[list_id], new_rows])
+            stale = self._list_cache.pop(int(list_id), None)
+            if stale is not None:
+                self._list_cache_used -= stale[1].nbytes
+        self._lists, self._assigned = lists, available
+
+    def _stamp(self, name):
+        try:
+            st = os.stat(self._path(name))
+            return st.st_ino, st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+
+class _FileLock:
+    def __init__(self, path, blocking=True):
+        self.path = path
+        self.blocking = blocking
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(self._fd, fcntl.LOCK_EX if self.blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(self._fd)
+            raise
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        return False
+
+
+class EmbeddingIndex:
+    """Per-model VectorShards under the instance folder.
+
+    /recognize stores every new upload's penultimate-layer embedding with its
+    prediction. A new photo whose nearest stored neighbour is at least
+    `duplicate_threshold` cosine-similar reuses that prediction without the
+    classifier head, and the result page lists its most similar photos.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.root = None
+        self.dim = 256
+        self.lists = 2048
+        self.probe = 8
+        self.list_cache_mb = 64
+        self.duplicate_threshold = 0.97
+        self.train_at = 20000
+        self.similar_ttl = 300
+        self.similar_cache_size = 4096
+        self._shards = {}
+        self._similar = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.enabled = app.config['EMBEDDING_INDEX']
+        self.root = os.path.join(app.instance_path, app.config['EMBEDDING_INDEX_FOLDER'])
+        self.dim = app.config['EMBEDDING_DIM']
+        self.lists = app.config['EMBEDDING_IVF_LISTS']
+        self.probe = app.config['EMBEDDING_IVF_PROBE']
+        self.list_cache_mb = app.config['EMBEDDING_LIST_CACHE_MB']
+        self.duplicate_threshold = app.config['EMBEDDING_DUPLICATE_THRESHOLD']
+        self.train_at = app.config['EMBEDDING_IVF_TRAIN_AT']
+        self.similar_ttl = app.config['SIMILAR_PHOTOS_TTL']
+
+    def shard(self, model_name):
+        with self._lock:
+            shard = self._shards.get(model_name)
+            if shard is None:
+                folder = os.path.join(self.root, METRIC_KEYS.get(model_name, model_name))
+                shard = self._shards[model_name] = VectorShard(folder, self.dim, self.lists, self.probe, self.list_cache_mb,
+                                                          self.train_at)
+            return shard
+
+    def duplicate(self, model_name, features):
+        """(row, similarity, probs) of a stored near-duplicate of `features`, or None."""
+        rows, scores = self.shard(model_name).search(features, k=1)
+        if len(rows) and scores[0] >= self.duplicate_threshold:
+            return int(rows[0]), float(scores[0]), self.shard(model_name).probs(rows[0])
+        return None
+
+    def add(self, model_name, features, probs, name):
+        try:
+            return self.shard(model_name).add(features, probs, name)
+        except Exception as e:
+            logging.warning(f"Embedding index append failed ({model_name}): {e}")
+            return None
+
+    def similar(self, model_name, row, k=6):
+        """Most similar stored photos to a stored row, excluding itself.
+
+        Results are kept per (model, row) for `similar_ttl` seconds, so
+        reloading a result page does not search again.
+        """
+        shard = self.shard(model_name)
+        if row is None or row >= shard.count:
+            return []
+        key = (model_name, row, k)
+        now = time.monotonic()
+        with self._lock:
+            item = self._similar.get(key)
+            if item is not None and item[0] > now:
+                self._similar.move_to_end(key)
+                return item[1]
+        rows, scores = shard.search(row=row, k=k + 1)
+        results = []
+        seen = {shard.name(row)}
+        for r, score in zip(rows, scores):
+            image = shard.name(r)
+            if image in seen:
+                continue
+            seen.add(image)
+            best = int(np.argmax(shard.probs(r)))
+            results.append({"image": image, "similarity": round(float(score), 3),
+                            "class": DISPLAY_NAMES.get(CLASS_NAMES[best], CLASS_NAMES[best])})
+        results = results[:k]
+        with self._lock:
+            self._similar[key] = (now + self.similar_ttl, results)
+            self._similar.move_to_end(key)
+            while len(self._similar) > self.similar_cache_size:
+                self._similar.popitem(last=False)
+        return results
+
+
+embedding_index = EmbeddingIndex()
+
+
+@click.command('build-embedding-index')
+@click.option('--model', 'model_name', help="MODEL_PATHS name; defaults to every model with stored vectors")
+@click.option('--lists', type=int, default=None, help="IVF lists (default EMBEDDING_IVF_LISTS)")
+@with_appcontext
+def build_embedding_index_command(model_name, lists):
+    """Train IVF lists so similar-photo queries stay fast on large stores."""
+    names = [model_name] if model_name else [m for m in METRIC_KEYS
+                                             if os.path.isdir(os.path.join(embedding_index.root, METRIC_KEYS[m]))]
+    lists = lists or current_app.config['EMBEDDING_IVF_LISTS']
+    for name in names:
+        shard = embedding_index.shard(name)
+        started = time.perf_counter()
+        try:
+            count = shard.build_ivf(lists)
+        except ValueError as e:
+            click.echo(f"{name}: skipped ({e})")
+            continue
+        elapsed = time.perf_counter() - started
+        query_started = time.perf_counter()
+        for row in range(0, count, max(1, count // 100)):
+            shard.search(row=row, k=10)
+        query_ms = (time.perf_counter() - query_started) * 1000 / len(range(0, count, max(1, count // 100)))
+        click.echo(f"{name}: {count} vectors in {lists} lists ({elapsed:.1f}s), query {query_ms:.2f} ms")
@@ -0,0 +1,105 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from preprocessing import IMG_SIZE
+from postprocess import apply_temperature
+from utils import MODEL_PATHS, METRIC_KEYS
+
+MAX_TTA_VIEWS = 8
+WEIGHTINGS = ('accuracy', 'mean')
+
+# Crops keep 87.5% of each side, like the usual 224-from-256 evaluation crop
+_CROP = int(IMG_SIZE[0] * 0.875)
+_MARGIN = IMG_SIZE[0] - _CROP
+
+
+def _crop_index(top, left):
+    # Nearest-neighbour resize of the crop back to full size, matching decode_image
+    scale = _CROP / IMG_SIZE[0]
+    rows = (top + np.arange(IMG_SIZE[1]) * scale).astype(np.intp)
+    cols = (left + np.arange(IMG_SIZE[0]) * scale).astype(np.intp)
+    return np.ix_(rows, cols)
+
+
+# View order matters: asking for K views takes the first K
+_VIEWS = (
+    (None, False),                                    # original
+    (None, True),                                     # horizontal flip
+    (_crop_index(_MARGIN // 2, _MARGIN // 2), False),  # centre crop
+    (_crop_index(_MARGIN // 2, _MARGIN // 2), True),   # centre crop, flipped
+    (_crop_index(0, 0), False),                       # corner crops
+    (_crop_index(0, _MARGIN), False),
+    (_crop_index(_MARGIN, 0), False),
+    (_crop_index(_MARGIN, _MARGIN), False),
+)
+
+# One thread per model so ensemble members run their batches side by side
+_executor = ThreadPoolExecutor(max_workers=len(MODEL_PATHS), thread_name_prefix="ensemble")
+
+
+def tta_views(pixels, k):
+    """Stacks `k` flipped/cropped copies of one decoded, unscaled HxWx3 image."""
+    k = max(1, min(int(k), MAX_TTA_VIEWS))
+    out = np.empty((k,) + pixels.shape, dtype=np.float32)
+    for i, (index, flip) in enumerate(_VIEWS[:k]):
+        view = pixels[index] if index is not None else pixels
+        out[i] = view[:, ::-1] if flip else view
+    return out
+
+
+def model_weights(names, metrics, weighting='accuracy'):
+    """Per-model weights, from model_metrics.json accuracy when asked and available."""
+    if weighting != 'accuracy':
+        return np.ones(len(names))
+    weights = []
+    for name in names:
+        accuracy = metrics.get(METRIC_KEYS.get(name, name), {}).get('accuracy')
+        weights.append(float(accuracy) if accuracy else np.nan)
+    weights = np.asarray(weights)
+    if np.isnan(weights).all():
+        return np.ones(len(names))
+    # Models without a metrics entry get the average weight
+    weights[np.isnan(weights)] = np.nanmean(weights)
+    return weights
+
+
+def predict(pixels, residents, views=1, weighting='accuracy', metrics=None):
+    """Runs `views` augmented copies of `pixels` through every resident model.
+
+    Each model receives one stacked batch through its own BatchScheduler and
+    all models run concurrently. TTA outputs are temperature-scaled and averaged
+    per model, then the models are combined with `model_weights`. Returns `(probs, stats)`, where
+    stats carries `forward_passes` (images run through a network).
+    """
+    stack = tta_views(pixels, views)
+
+    def _run(resident):
+        batch = resident.preprocess(stack.copy())
+        preds, batch_stats = resident.batcher.submit(batch)
+        return apply_temperature(preds, resident.temperature).mean(axis=0), batch_stats
+
+    if len(residents) == 1:
+        results = [_run(residents[0])]
+    else:
+        results = list(_executor.map(_run, residents))
+
+    weights = model_weights([r.name for r in residents], metrics or {}, weighting)
+    outputs = np.stack([probs for probs, _ in results])
+    combined = (outputs * weights[:, None]).sum(axis=0) / weights.sum()
+
+    all_stats = [s for _, s in results]
+    stats = {
+        "forward_passes": len(stack) * len(residents),
+        "batch_size": max(s.get('batch_size') or 0 for s in all_stats) or None,
+        "queue_wait_ms": max(s.get('queue_wait_ms') or 0 for s in all_stats),
+        "forward_time_ms": max(s.get('forward_time_ms') or 0 for s in all_stats),
+    }
+    return combined, stats
+
+
+def mode_key(residents, views, weighting):
+    """Prediction-cache key component: different modes give different outputs."""
+    if len(residents) == 1 and views == 1:
+        return residents[0].name
+    names = "+".join(sorted(r.name for r in residents))
+    return f"{names}|tta{views}|{weighting}"
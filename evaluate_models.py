@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from utils import MODEL_PATHS, METRIC_KEYS, CLASS_NAMES, iter_labelled_images
+from preprocessing import IMG_SIZE, decode_into, resolve_preprocess
+
+# Configuration
+MODEL_FOLDER = 'MyModels'
+REPORT_PATH = 'model_metrics.json'
+
+
+# --- DATA ---
+def _decode_row(path, out):
+    """Decodes one image into its batch row; returns the decode time in ms, or None if unreadable."""
+    started = time.perf_counter()
+    try:
+        decode_into(path, out)
+    except Exception as e:
+        print(f"   ⚠️ Skipped {path}: {e}")
+        return None
+    return (time.perf_counter() - started) * 1000
+
+
+def stream_batches(items, batch_size, workers):
+    """Yields (pixels, labels, decode_ms) per batch of unscaled float32 pixels.
+
+    Rows are decoded on a thread pool, and the next batch is decoded while the
+    caller runs the models on the current one. The two buffers are reused, so
+    a batch is only valid until the next one is requested.
+    """
+    shape = (batch_size,) + IMG_SIZE[::-1] + (3,)
+    buffers = [np.empty(shape, dtype=np.float32), np.empty(shape, dtype=np.float32)]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=1) as loader:
+        def load(start, buf):
+            chunk = items[start:start + batch_size]
+            times = list(pool.map(_decode_row, [p for p, _ in chunk], buf[:len(chunk)]))
+            ok = np.array([t is not None for t in times], dtype=bool)
+            pixels = buf[:len(chunk)][ok] if not ok.all() else buf[:len(chunk)]
+            labels = np.array([label for _, label in chunk], dtype=np.int64)[ok]
+            return pixels, labels, np.array([t for t in times if t is not None], dtype=np.float64)
+
+        starts = range(0, len(items), batch_size)
+        pending = loader.submit(load, starts[0], buffers[0]) if starts else None
+        for i in range(len(starts)):
+            batch = pending.result()
+            pending = loader.submit(load, starts[i + 1], buffers[(i + 1) % 2]) if i + 1 < len(starts) else None
+            yield batch
+
+
+# --- METRICS ---
+def confusion_matrix(labels, predicted, num_classes=len(CLASS_NAMES)):
+    """Rows are the true class, columns the predicted one, both in CLASS_NAMES order."""
+    return np.bincount(labels * num_classes + predicted, minlength=num_classes * num_classes).reshape(num_classes, num_classes)
+
+
+def classification_metrics(matrix):
+    """Per-class precision/recall/F1 from a confusion matrix, plus support-weighted averages."""
+    tp = np.diag(matrix).astype(np.float64)
+    support = matrix.sum(axis=1).astype(np.float64)
+    predicted = matrix.sum(axis=0).astype(np.float64)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall, out=np.zeros_like(tp), where=(precision + recall) > 0)
+    weights = support / max(support.sum(), 1)
+    return precision, recall, f1, support, {
+        "precision": float((precision * weights).sum()),
+        "recall": float((recall * weights).sum()),
+        "f1_score": float((f1 * weights).sum()),
+    }
+
+
+class ModelTally:
+    """Running predictions and timings for one model over the streamed batches."""
+
+    def __init__(self, name, model):
+        self.name = name
+        self.model = model
+        self.preprocess = resolve_preprocess(name)
+        self.labels, self.predicted, self.true_probs = [], [], []
+        self.image_ms = []  # decode + this model's share of the batch forward, per image
+        self.forward_ms = 0.0
+
+    def run(self, pixels, labels, decode_ms, work):
+        # preprocess scales in place, so each model gets its own copy of the decoded batch
+        batch = work[:len(pixels)]
+        np.copyto(batch, pixels)
+        batch = self.preprocess(batch)
+        started = time.perf_counter()
+        probs = np.asarray(self.model.predict_on_batch(batch), dtype=np.float32)
+        elapsed = (time.perf_counter() - started) * 1000
+        self.forward_ms += elapsed
+        self.labels.append(labels)
+        self.predicted.append(probs.argmax(axis=1))
+        self.true_probs.append(probs[np.arange(len(labels)), labels])
+        self.image_ms.append(decode_ms + elapsed / len(labels))
+
+    def report(self, backend):
+        labels = np.concatenate(self.labels)
+        predicted = np.concatenate(self.predicted)
+        image_ms = np.concatenate(self.image_ms)
+        matrix = confusion_matrix(labels, predicted)
+        precision, recall, f1, support, averages = classification_metrics(matrix)
+        per_class = {}
+        for idx, class_name in enumerate(CLASS_NAMES):
+            mask = labels == idx
+            per_class[class_name] = {
+                "precision": round(float(precision[idx]) * 100, 2),
+                "recall": round(float(recall[idx]) * 100, 2),
+                "f1_score": round(float(f1[idx]) * 100, 2),
+                "support": int(support[idx]),
+                "latency_ms": round(float(image_ms[mask].mean()), 2) if mask.any() else None,
+            }
+        return {
+            # Same top-level fields as the original hand-written file
+            "accuracy": round(float(np.mean(predicted == labels)) * 100, 2),
+            "precision": round(averages["precision"] * 100, 2),
+            "recall": round(averages["recall"] * 100, 2),
+            "f1_score": round(averages["f1_score"] * 100, 2),
+            "loss": round(float(-np.mean(np.log(np.maximum(np.concatenate(self.true_probs), 1e-12)))), 4),
+            "samples": int(len(labels)),
+            "backend": backend,
+            "forward_ms_per_image": round(self.forward_ms / max(len(labels), 1), 2),
+            "latency_ms": round(float(image_ms.mean()), 2),
+            "classes": CLASS_NAMES,
+            "confusion_matrix": matrix.tolist(),
+            "per_class": per_class,
+            "evaluated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+
+
+def write_report(report, path=REPORT_PATH):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-evaluate MODEL_PATHS entries on a labelled test folder and rewrite model_metrics.json.")
+    parser.add_argument('--data-dir', required=True, help="Labelled test folder (one sub-folder per class in CLASS_NAMES)")
+    parser.add_argument('--models', nargs='*', default=list(MODEL_PATHS.keys()))
+    parser.add_argument('--backend', default='keras', choices=['keras', 'tflite-fp16', 'tflite-int8'])
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 4, help="Decode threads")
+    parser.add_argument('--output', default=REPORT_PATH)
+    args = parser.parse_args()
+
+    from backends import load_inference_model
+
+    items = list(iter_labelled_images(args.data_dir))
+    if not items:
+        print(f"❌ Error: no labelled images found in {args.data_dir}")
+        return
+
+    # Every model is loaded up front so each image is decoded once for all of them
+    tallies = []
+    for name in args.models:
+        model_path = os.path.join(MODEL_FOLDER, MODEL_PATHS[name])
+        if not os.path.exists(model_path):
+            print(f"   ⚠️ Skipped {name}: {model_path} not found")
+            continue
+        print(f"📦 Loading {name}")
+        tallies.append(ModelTally(name, load_inference_model(model_path, args.backend)))
+    if not tallies:
+        print("❌ Error: none of the requested models were found")
+        return
+
+    print(f"--- 🧪 Evaluating {len(tallies)} model(s) on {len(items)} images "
+          f"({args.backend}, batch {args.batch_size}, {args.workers} decode threads) ---")
+    work = np.empty((args.batch_size,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    started = time.perf_counter()
+    done = 0
+    for pixels, labels, decode_ms in stream_batches(items, args.batch_size, args.workers):
+        if len(labels):
+            for tally in tallies:
+                tally.run(pixels, labels, decode_ms, work)
+        done += args.batch_size
+        print(f"   {min(done, len(items))}/{len(items)} images ({time.perf_counter() - started:.0f}s)", end='\r')
+    print()
+
+    report = {}
+    if os.path.exists(args.output):
+        with open(args.output) as f:
+            report = json.load(f)
+
+    for tally in tallies:
+        if not tally.labels:
+            continue
+        entry = tally.report(args.backend)
+        report[METRIC_KEYS[tally.name]] = entry
+        print(f"   ✅ {METRIC_KEYS[tally.name]}: acc {entry['accuracy']}% | F1 {entry['f1_score']}% "
+              f"| loss {entry['loss']} | {entry['latency_ms']} ms/image")
+
+    write_report(report, args.output)
+    print(f"\n--- ✨ Metrics for {len(tallies)} model(s) written to {args.output} in {time.perf_counter() - started:.0f}s ---")
+
+
+if __name__ == "__main__":
+    main()
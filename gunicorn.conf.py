@@ -0,0 +1,53 @@
+import os
+import signal
+import logging
+
+# --- SERVER ---
+bind = os.environ.get('BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# The app sizes its inference pools by the number of web workers
+os.environ['WEB_CONCURRENCY'] = str(workers)
+# Threads per worker give the micro-batcher concurrent requests to group
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+# Import the app (and read shareable weights) once in the master before forking
+preload_app = True
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+accesslog = '-'
+
+
+# --- HOOKS ---
+def when_ready(server):
+    import wsgi
+    logging.info(f"Master listening on {', '.join(server.cfg.bind)} after {wsgi._master_ready_s:.1f}s, "
+                 f"forking {server.cfg.workers} worker(s)")
+
+
+def post_fork(server, worker):
+    import wsgi
+    wsgi.init_worker()
+
+
+def post_worker_init(worker):
+    # Gunicorn's own SIGTERM handler stops the accept loop; fail readiness first
+    import wsgi
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def _term(signum, frame):
+        wsgi.drain()
+        if callable(previous):
+            previous(signum, frame)
+
+    signal.signal(signal.SIGTERM, _term)
+
+
+def worker_int(worker):
+    import wsgi
+    wsgi.drain()
+
+
+def worker_exit(server, worker):
+    import wsgi
+    wsgi.shutdown()
@@ -0,0 +1,140 @@
+import queue
+import threading
+import time
+import logging
+import numpy as np
+
+
+class _PendingRequest:
+    __slots__ = ('array', 'enqueued_at', 'done', 'result', 'error', 'stats')
+
+    def __init__(self, array):
+        self.array = array
+        self.enqueued_at = time.perf_counter()
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.stats = None
+
+
+class BatchScheduler:
+    """Collects concurrent prediction requests and runs them as one forward pass.
+
+    A request waits at most `max_wait_ms` for others to join its batch, and a
+    batch never holds more than `max_batch_size` image rows. With
+    `concurrency` > 1, that many collector threads form and run batches in
+    parallel, which keeps a pool of inference worker processes busy.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_ms=5, name="model", concurrency=1):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, max_wait_ms / 1000.0)
+        self.name = name
+        self._queue = queue.Queue()
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"batcher-{name}-{i}", daemon=True)
+            for i in range(max(1, int(concurrency)))
+        ]
+        for t in self._threads:
+            t.start()
+
+    def submit(self, img_arr):
+        """Blocks until the rows of `img_arr` have been predicted.
+
+        Returns `(preds, stats)` where `preds` holds one output row per input
+        row and `stats` has `batch_size`, `queue_wait_ms` and `forward_time_ms`.
+        """
+        if self._stopped:
+            raise RuntimeError(f"Batch scheduler for {self.name} is stopped")
+        if img_arr.shape[0] > self.max_batch_size:
+            raise ValueError(f"{img_arr.shape[0]} rows exceed max batch size {self.max_batch_size}")
+        pending = _PendingRequest(img_arr)
+        self._queue.put(pending)
+        while not pending.done.wait(0.5):
+            if self._stopped and not any(t.is_alive() for t in self._threads):
+                raise RuntimeError(f"Batch scheduler for {self.name} is stopped")
+        if pending.error is not None:
+            raise pending.error
+        return pending.result, pending.stats
+
+    def stop(self):
+        self._stopped = True
+        for _ in self._threads:
+            self._queue.put(None)
+
+    # --- WORKER THREADS ---
+    def _run(self):
+        buffer = None
+        carry = None
+        stopping = False
+        while True:
+            first = carry if carry is not None else self._queue.get()
+            carry = None
+            if first is None:
+                break
+
+            batch = [first]
+            rows = first.array.shape[0]
+            deadline = time.perf_counter() + self.max_wait
+            while rows < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                try:
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    stopping = True
+                    break
+                if rows + nxt.array.shape[0] > self.max_batch_size:
+                    carry = nxt
+                    break
+                batch.append(nxt)
+                rows += nxt.array.shape[0]
+
+            buffer = self._execute(batch, rows, buffer)
+            if stopping:
+                if carry is not None:
+                    self._execute([carry], carry.array.shape[0], buffer)
+                break
+
+    def _stack(self, batch, rows, buffer):
+        if len(batch) == 1:
+            return batch[0].array, buffer
+        sample = batch[0].array
+        shape = (self.max_batch_size,) + sample.shape[1:]
+        if buffer is None or buffer.shape != shape or buffer.dtype != sample.dtype:
+            buffer = np.empty(shape, dtype=sample.dtype)
+        offset = 0
+        for pending in batch:
+            n = pending.array.shape[0]
+            buffer[offset:offset + n] = pending.array
+            offset += n
+        return buffer[:rows], buffer
+
+    def _execute(self, batch, rows, buffer):
+        started = time.perf_counter()
+        try:
+            stacked, buffer = self._stack(batch, rows, buffer)
+            preds = np.asarray(self.predict_fn(stacked))
+        except Exception as e:
+            logging.error(f"Batch Inference Fail ({self.name}): {e}")
+            for pending in batch:
+                pending.error = e
+                pending.done.set()
+            return buffer
+        forward_ms = round((time.perf_counter() - started) * 1000, 2)
+
+        offset = 0
+        for pending in batch:
+            n = pending.array.shape[0]
+            pending.result = preds[offset:offset + n].copy()
+            pending.stats = {
+                "batch_size": rows,
+                "queue_wait_ms": round((started - pending.enqueued_at) * 1000, 2),
+                "forward_time_ms": forward_ms,
+            }
+            offset += n
+            pending.done.set()
+        return buffer
@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import threading
+import multiprocessing as mp
+from datetime import datetime, timedelta
+import numpy as np
+from flask import Flask
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+
+from config import Config
+from models import db, InferenceLog
+from database import init_sqlite
+from migrations import upgrade
+from pagination import filter_logs, paginate_logs
+import stats
+
+# Configuration
+MODELS = ['ResNet50 (Fine-Tuned)', 'MobileNetV2 (Fine-Tuned)', 'EfficientNetB0 (Fine-Tuned)']
+CLASSES = ['Kuih Lapis', 'Kuih Talam', 'Onde Onde', 'Kuih Seri Muka']
+
+
+# --- SETUP ---
+def make_app(db_path, legacy=False):
+    """App bound to a scratch database; `legacy` keeps the old single pool and default pragmas."""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+    if legacy:
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {}
+        app.config['SQLALCHEMY_BINDS'] = {}
+        app.config['SQLITE_PRAGMAS'] = {}
+    else:
+        app.config['SQLALCHEMY_BINDS'] = {key: dict(options, url=f'sqlite:///{db_path}')
+                                          for key, options in Config.SQLALCHEMY_BINDS.items()}
+    db.init_app(app)
+    if not legacy:
+        init_sqlite(app)
+    return app
+
+
+def log_rows(count, start=None):
+    start = start or datetime.utcnow()
+    return [{
+        "timestamp": start - timedelta(seconds=i),
+        "filename": f"load_{random.getrandbits(32):08x}.jpg",
+        "model_used": random.choice(MODELS),
+        "predicted_class": random.choice(CLASSES),
+        "confidence_score": random.random(),
+        "inference_time_ms": random.uniform(20, 200),
+        "is_cached": False,
+        "forward_passes": 1,
+    } for i in range(count)]
+
+
+def seed(app, rows):
+    with app.app_context():
+        db.create_all()
+        upgrade(db.engine)
+        for i in range(0, rows, 5000):
+            chunk = log_rows(min(5000, rows - i), datetime.utcnow() - timedelta(hours=1, seconds=i))
+            db.session.execute(insert(InferenceLog), chunk)
+            stats.record(chunk)
+        db.session.commit()
+
+
+# --- WORKLOAD ---
+class Counters:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.read_ms, self.read_errors = [], 0
+
+
+def reader(app, stop, counters):
+    """Dashboard-shaped reads: rollup totals, a filtered keyset page and the first page."""
+    with app.app_context():
+        while not stop.is_set():
+            started = time.perf_counter()
+            try:
+                stats.summary()
+                paginate_logs(filter_logs(InferenceLog.query, model=random.choice(MODELS)), per_page=10)
+                paginate_logs(InferenceLog.query, per_page=10)
+            except OperationalError:
+                db.session.rollback()
+                with counters.lock:
+                    counters.read_errors += 1
+                continue
+            finally:
+                db.session.remove()
+            elapsed = (time.perf_counter() - started) * 1000
+            with counters.lock:
+                counters.read_ms.append(elapsed)
+
+
+def writer(db_path, legacy, stop, written, errors, batch_size, interval):
+    """Log-writer-shaped writes from another process, like a second gunicorn worker:
+    a batch of InferenceLog rows plus the rollup, one commit."""
+    app = make_app(db_path, legacy)
+    with app.app_context():
+        while not stop.is_set():
+            rows = log_rows(batch_size)
+            try:
+                db.session.execute(insert(InferenceLog), rows)
+                stats.record(rows)
+                db.session.commit()
+                with written.get_lock():
+                    written.value += len(rows)
+            except OperationalError:
+                db.session.rollback()
+                with errors.get_lock():
+                    errors.value += 1
+            finally:
+                db.session.remove()
+            if interval:
+                time.sleep(interval)
+
+
+def run_phase(app, db_path, legacy, readers, writers, duration, batch_size, interval):
+    counters, stop = Counters(), threading.Event()
+    ctx = mp.get_context('spawn')
+    write_stop, written, write_errors = ctx.Event(), ctx.Value('q', 0), ctx.Value('q', 0)
+    processes = [ctx.Process(target=writer, args=(db_path, legacy, write_stop, written, write_errors, batch_size, interval),
+                             daemon=True) for _ in range(writers)]
+    for p in processes:
+        p.start()
+    if processes:
+        time.sleep(1.0)  # let the writers import and connect before timing starts
+    with written.get_lock():
+        written.value = 0
+
+    threads = [threading.Thread(target=reader, args=(app, stop, counters), daemon=True) for _ in range(readers)]
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    rows_written = written.value
+    write_stop.set()
+    for p in processes:
+        p.join()
+
+    read_ms = np.asarray(counters.read_ms or [0.0])
+    return {
+        "reads_per_s": round(len(counters.read_ms) / duration, 1),
+        "read_p50_ms": round(float(np.percentile(read_ms, 50)), 2),
+        "read_p95_ms": round(float(np.percentile(read_ms, 95)), 2),
+        "rows_written_per_s": round(rows_written / duration, 1),
+        "read_errors": counters.read_errors,
+        "write_errors": write_errors.value,
+    }
+
+
+def write_report(report, path):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(report, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure dashboard read throughput on SQLite with and without concurrent log writes.")
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=2, help="Writer processes")
+    parser.add_argument('--duration', type=float, default=10, help="Seconds per phase")
+    parser.add_argument('--rows', type=int, default=50000, help="InferenceLog rows seeded before the run")
+    parser.add_argument('--batch-size', type=int, default=20, help="Rows per write transaction")
+    parser.add_argument('--write-interval', type=float, default=0.0, help="Pause between a writer's commits (s)")
+    parser.add_argument('--legacy', action='store_true', help="Old setup: rollback journal, one pool, no pragmas")
+    parser.add_argument('--min-ratio', type=float, default=0.0,
+                        help="Exit 1 if reads/s under writes falls below this fraction of reads/s alone")
+    parser.add_argument('--output', help="Also write the results as JSON")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='delicacy-loadtest-')
+    try:
+        db_path = os.path.join(workdir, 'database.db')
+        app = make_app(db_path, args.legacy)
+        setup = 'legacy' if args.legacy else 'WAL + read/write pools'
+        print(f"--- 🗄️ SQLite load test ({setup}) | {args.readers} reader threads, {args.writers} writer processes, "
+              f"{args.duration:g}s per phase ---")
+        seed(app, args.rows)
+        print(f"   🌱 Seeded {args.rows} log rows")
+
+        reads_only = run_phase(app, db_path, args.legacy, args.readers, 0, args.duration, args.batch_size, args.write_interval)
+        print(f"   📖 Reads only:   {reads_only['reads_per_s']} reads/s | p50 {reads_only['read_p50_ms']} ms "
+              f"| p95 {reads_only['read_p95_ms']} ms")
+        mixed = run_phase(app, db_path, args.legacy, args.readers, args.writers, args.duration, args.batch_size, args.write_interval)
+        print(f"   ✍️ With writes:  {mixed['reads_per_s']} reads/s | p50 {mixed['read_p50_ms']} ms "
+              f"| p95 {mixed['read_p95_ms']} ms | {mixed['rows_written_per_s']} rows/s written")
+        if mixed['read_errors'] or mixed['write_errors']:
+            print(f"   ⚠️ {mixed['read_errors']} read / {mixed['write_errors']} write errors (database is locked)")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    ratio = mixed['reads_per_s'] / reads_only['reads_per_s'] if reads_only['reads_per_s'] else 0.0
+    print(f"\n--- ✨ Read throughput under writes: {ratio:.0%} of reads alone ---")
+
+    if args.output:
+        write_report({
+            "generated_at": time.strftime('%Y-%m-%dT%H:%M:%S'),
+            "setup": setup,
+            "readers": args.readers,
+            "writers": args.writers,
+            "rows": args.rows,
+            "reads_only": reads_only,
+            "with_writes": mixed,
+            "read_ratio": round(ratio, 3),
+        }, args.output)
+
+    if ratio < args.min_ratio:
+        print(f"❌ Below --min-ratio {args.min_ratio:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import queue
+import atexit
+import logging
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+
+from models import db, InferenceLog
+from metrics import metrics
+import stats
+
+
+class InferenceLogWriter:
+    """Queues InferenceLog rows and writes them with one bulk INSERT per flush.
+
+    A flush happens when LOG_WRITER_BATCH_SIZE rows are waiting or
+    LOG_WRITER_FLUSH_INTERVAL seconds have passed. When the queue is full,
+    `submit()` blocks for up to LOG_WRITER_PUT_TIMEOUT seconds and then writes
+    the row itself, so a stalled database slows requests down instead of
+    growing memory without bound.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.batch_size = 100
+        self.flush_interval = 1.0
+        self.put_timeout = 2.0
+        self._queue = queue.Queue(maxsize=10000)
+        self._thread = None
+        self._write_lock = threading.Lock()
+        self.written = 0
+        self.overflows = 0
+
+    def init_app(self, app):
+        self.app = app
+        self.batch_size = app.config['LOG_WRITER_BATCH_SIZE']
+        self.flush_interval = app.config['LOG_WRITER_FLUSH_INTERVAL']
+        self.put_timeout = app.config['LOG_WRITER_PUT_TIMEOUT']
+        self._queue = queue.Queue(maxsize=app.config['LOG_WRITER_MAX_QUEUE'])
+        if not app.config.get('PREFORK'):
+            self.start()
+
+    def start(self):
+        """Starts the writer thread (in each worker when running under a pre-fork server)."""
+        self._thread = threading.Thread(target=self._run, name="inference-log-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def submit(self, **fields):
+        fields.setdefault('timestamp', datetime.utcnow())
+        row = {c.name: fields.get(c.name) for c in InferenceLog.__table__.columns if c.name != 'id'}
+        if self._thread is None or not self._thread.is_alive():
+            self._write([row])
+            return
+        try:
+            self._queue.put(row, timeout=self.put_timeout)
+        except queue.Full:
+            self.overflows += 1
+            logging.warning("Inference log queue full, writing synchronously.")
+            self._write([row])
+
+    def pending(self):
+        return self._queue.qsize()
+
+    def flush(self):
+        """Writes everything queued so far from the calling thread."""
+        rows = []
+        while True:
+            try:
+                row = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if row is not None:
+                rows.append(row)
+        if rows:
+            self._write(rows)
+
+    def stop(self, timeout=5.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+        self.flush()
+
+    # --- WORKER THREAD ---
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            rows = [first]
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(rows) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    row = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if row is None:
+                    stopping = True
+                    break
+                rows.append(row)
+            self._write(rows)
+            if stopping:
+                return
+
+    def _write(self, rows):
+        with self._write_lock, self.app.app_context():
+            try:
+                with metrics.timer('db_write', 'all'):
+                    db.session.execute(insert(InferenceLog), rows)
+                    stats.record(rows)
+                    db.session.commit()
+                self.written += len(rows)
+            except Exception as e:
+                db.session.rollback()
+                logging.error(f"Inference log flush failed ({len(rows)} rows dropped): {e}")
+
+
+log_writer = InferenceLogWriter()
@@ -0,0 +1,133 @@
+import os
+import json
+import fcntl
+import logging
+from datetime import datetime
+from logging.handlers import RotatingFileHandler
+
+LEVELS = ('DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL')
+
+
+# --- WRITING ---
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that several processes (gunicorn workers) can share.
+
+    Rollover happens under an flock on `<file>.lock` and only if the file on
+    disk is still over the limit; the other processes notice the new inode on
+    their next record and reopen instead of writing into the rotated file.
+    """
+
+    def emit(self, record):
+        if self.stream is not None and self._rotated_elsewhere():
+            self.stream.close()
+            self.stream = self._open()
+        super().emit(record)
+
+    def _rotated_elsewhere(self):
+        try:
+            return os.stat(self.baseFilename).st_ino != os.fstat(self.stream.fileno()).st_ino
+        except OSError:
+            return True
+
+    def doRollover(self):
+        with open(self.baseFilename + '.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if not self._rotated_elsewhere() and os.path.getsize(self.baseFilename) >= self.maxBytes:
+                    super().doRollover()
+                elif self.stream is not None:
+                    self.stream.close()
+                    self.stream = self._open()
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One JSON object per record; `extra={'model': ...}` becomes a filterable field."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).strftime('%Y-%m-%d %H:%M:%S'),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        model = getattr(record, 'model', None)
+        if model:
+            entry["model"] = model
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def configure_logging(path, max_bytes=0, backups=0, json_path=None, level=logging.INFO):
+    """Root logging: rotating text log, optional rotating JSON-lines log, console."""
+    root = logging.getLogger('')
+    root.setLevel(level)
+    text = SharedRotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+    text.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'))
+    root.addHandler(text)
+    if json_path:
+        structured = SharedRotatingFileHandler(json_path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        structured.setFormatter(JsonLinesFormatter())
+        root.addHandler(structured)
+    console = logging.StreamHandler()
+    console.setLevel(level)
+    root.addHandler(console)
+
+
+# --- READING ---
+def tail(path, lines=100, block_size=8192):
+    """Last `lines` lines of `path`, reading backwards from the end in blocks.
+
+    Returns `(text, offset, inode)`; pass offset and inode to `read_since` for
+    what gets written afterwards.
+    """
+    with open(path, 'rb') as f:
+        inode = os.fstat(f.fileno()).st_ino
+        end = f.seek(0, os.SEEK_END)
+        pos, data = end, b''
+        # One extra newline: the file normally ends with one
+        while pos > 0 and data.count(b'\n') <= lines:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    kept = data.split(b'\n')[-(lines + 1):]
+    return b'\n'.join(kept).decode('utf-8', 'replace'), end, inode
+
+
+def read_since(path, offset, inode=None, max_bytes=256 * 1024, lines=100):
+    """Complete lines written after byte `offset`.
+
+    Returns `(text, offset, inode, reset)`. `reset` is True when the file was
+    rotated or truncated since `offset`, or when more than `max_bytes` arrived;
+    `text` then holds the last `lines` lines instead, and the caller should
+    replace its view rather than append.
+    """
+    with open(path, 'rb') as f:
+        st = os.fstat(f.fileno())
+        if (inode is not None and inode != st.st_ino) or offset > st.st_size or st.st_size - offset > max_bytes:
+            text, end, current = tail(path, lines)
+            return text, end, current, True
+        f.seek(offset)
+        data = f.read(st.st_size - offset)
+    # A half-written last line is left for the next poll
+    complete = data[:data.rfind(b'\n') + 1]
+    return complete.decode('utf-8', 'replace'), offset + len(complete), st.st_ino, False
+
+
+def filter_entries(text, min_level=None, model=None):
+    """Parses JSON-lines text, keeping records at or above `min_level` and for `model`."""
+    floor = LEVELS.index(min_level) if min_level in LEVELS else 0
+    entries = []
+    for line in text.splitlines():
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        if entry.get('level') in LEVELS and LEVELS.index(entry['level']) < floor:
+            continue
+        if model and entry.get('model') != model:
+            continue
+        entries.append(entry)
+    return entries
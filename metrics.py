@@ -0,0 +1,158 @@
+import time
+import logging
+import threading
+from bisect import bisect_left
+from collections import deque
+import numpy as np
+
+# Pipeline stages timed per request; the order is the order shown on the dashboard
+STAGES = ('upload_save', 'cache_lookup', 'decode', 'preprocess', 'queue_wait', 'forward', 'embedding_index',
+          'db_write', 'similar_search', 'render', 'total', 'stream_frame')
+
+# Upper bounds in seconds, Prometheus-style (+Inf is implicit)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Series:
+    __slots__ = ('counts', 'sum', 'count', 'recent')
+
+    def __init__(self, n_buckets, window):
+        self.counts = [0] * (n_buckets + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+
+class _Timer:
+    __slots__ = ('metrics', 'stage', 'model', 'start')
+
+    def __init__(self, metrics, stage, model):
+        self.metrics = metrics
+        self.stage = stage
+        self.model = model
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe(self.stage, self.model, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """In-process latency histograms labelled by (stage, model).
+
+    `observe()` is one bisect plus a few integer updates under a lock, so it
+    is safe to call on every request. Each series also keeps its last
+    METRICS_WINDOW samples so the dashboard can show current percentiles
+    rather than lifetime ones. The cost of `observe()` itself is measured at
+    startup and published as a gauge.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, window=512):
+        self.buckets = tuple(buckets)
+        self.window = window
+        self.overhead_ns = None
+        self._lock = threading.Lock()
+        self._series = {}
+        self._gauges = []
+
+    def init_app(self, app):
+        self.window = app.config['METRICS_WINDOW']
+        self.overhead_ns = self.calibrate()
+        logging.info(f"Metrics: observe() costs {self.overhead_ns:.0f} ns per call")
+
+    # --- RECORDING ---
+    def observe(self, stage, model, seconds):
+        i = bisect_left(self.buckets, seconds)
+        key = (stage, model or '')
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series(len(self.buckets), self.window)
+            series.counts[i] += 1
+            series.sum += seconds
+            series.count += 1
+            series.recent.append(seconds)
+
+    def observe_ms(self, stage, model, ms):
+        if ms is not None:
+            self.observe(stage, model, ms / 1000.0)
+
+    def timer(self, stage, model=''):
+        """`with metrics.timer('decode', name):` records the block's wall time."""
+        return _Timer(self, stage, model)
+
+    def gauge(self, name, help_text, fn):
+        """Registers a value that is read at scrape time, e.g. a queue length."""
+        self._gauges.append((name, help_text, fn))
+
+    def calibrate(self, iterations=5000):
+        scratch = Metrics(self.buckets, self.window)
+        start = time.perf_counter()
+        for i in range(iterations):
+            with scratch.timer('calibration', 'none'):
+                pass
+        return (time.perf_counter() - start) / iterations * 1e9
+
+    # --- READING ---
+    def snapshot(self, model=None):
+        """Recent p50/p95/p99 in ms per stage, for the dashboard's live view."""
+        with self._lock:
+            items = [(stage, m, list(s.recent), s.count) for (stage, m), s in self._series.items()
+                     if model is None or m == model]
+        merged = {}
+        for stage, _, recent, count in items:
+            entry = merged.setdefault(stage, {"samples": [], "count": 0})
+            entry["samples"].extend(recent)
+            entry["count"] += count
+        stages = []
+        for stage in STAGES:
+            entry = merged.get(stage)
+            if not entry or not entry["samples"]:
+                continue
+            p50, p95, p99 = np.percentile(np.asarray(entry["samples"]) * 1000, [50, 95, 99])
+            stages.append({"stage": stage, "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+                           "p99": round(float(p99), 2), "count": entry["count"]})
+        return {
+            "stages": stages,
+            "models": sorted({m for _, m, _, _ in items if m}),
+            "overhead_ns": round(self.overhead_ns or 0, 1),
+        }
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        with self._lock:
+            series = sorted((key, list(s.counts), s.sum, s.count) for key, s in self._series.items())
+        name = 'delicacy_stage_latency_seconds'
+        lines = [f"# HELP {name} Time spent in each recognition pipeline stage.", f"# TYPE {name} histogram"]
+        for (stage, model), counts, total, count in series:
+            labels = f'stage="{stage}",model="{_escape(model)}"'
+            cumulative = 0
+            for bound, c in zip(self.buckets, counts):
+                cumulative += c
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {count}')
+            lines.append(f"{name}_sum{{{labels}}} {total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {count}")
+
+        lines.append("# HELP delicacy_metrics_observe_seconds Measured cost of one metrics observation.")
+        lines.append("# TYPE delicacy_metrics_observe_seconds gauge")
+        lines.append(f"delicacy_metrics_observe_seconds {(self.overhead_ns or 0) / 1e9:.9f}")
+        for gauge_name, help_text, fn in self._gauges:
+            try:
+                value = float(fn())
+            except Exception:
+                continue
+            lines.append(f"# HELP {gauge_name} {help_text}")
+            lines.append(f"# TYPE {gauge_name} gauge")
+            lines.append(f"{gauge_name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+metrics = Metrics()
@@ -0,0 +1,99 @@
+import logging
+import click
+from flask.cli import with_appcontext
+
+# Schema changes made after the first release, applied in order on top of
+# db.create_all(). The applied version is stored in SQLite's PRAGMA
+# user_version. Steps check the live schema first, because databases created
+# after a change already have it and older ones may have been patched by hand.
+# Append new versions at the end; never edit or renumber a released one.
+
+
+def add_column(table, column, col_type):
+    def step(conn):
+        columns = [row[1] for row in conn.exec_driver_sql(f"PRAGMA table_info({table})")]
+        if column not in columns:
+            conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN {column} {col_type}")
+    step.label = f"{table}.{column}"
+    return step
+
+
+def create_index(name, table, columns):
+    def step(conn):
+        conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
+    step.label = name
+    return step
+
+
+MIGRATIONS = [
+    (1, "Delicacy images", [
+        add_column("delicacy_info", "image_filename", "VARCHAR(255)"),
+    ]),
+    (2, "Micro-batching timings", [
+        add_column("inference_log", "batch_size", "INTEGER"),
+        add_column("inference_log", "queue_wait_ms", "FLOAT"),
+        add_column("inference_log", "forward_time_ms", "FLOAT"),
+    ]),
+    (3, "Prediction cache hits", [
+        add_column("inference_log", "is_cached", "BOOLEAN DEFAULT 0"),
+    ]),
+    (4, "Inference log keyset indexes", [
+        create_index("ix_inference_log_ts_id", "inference_log", "timestamp, id"),
+        create_index("ix_inference_log_model_ts_id", "inference_log", "model_used, timestamp, id"),
+        create_index("ix_inference_log_class_ts_id", "inference_log", "predicted_class, timestamp, id"),
+        create_index("ix_inference_log_user_ts_id", "inference_log", "user_id, timestamp, id"),
+    ]),
+    (5, "TTA / ensemble forward passes", [
+        add_column("inference_log", "forward_passes", "INTEGER DEFAULT 1"),
+    ]),
+    (6, "Calibrated confidence", [
+        add_column("inference_log", "calibrated_confidence", "FLOAT"),
+        add_column("inference_log", "scores", "BLOB"),
+        add_column("inference_summary", "calibrated_count", "INTEGER NOT NULL DEFAULT 0"),
+        add_column("inference_summary", "calibrated_sum", "FLOAT NOT NULL DEFAULT 0.0"),
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(engine):
+    # A raw connection: engine.connect() would open a write transaction on the writer
+    conn = engine.raw_connection()
+    try:
+        return conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def upgrade(engine):
+    """Applies pending migrations in one write transaction; returns the (version, description) pairs applied.
+
+    Run after db.create_all(). Concurrent callers serialize on SQLite's write
+    lock, and the second one finds nothing left to do.
+    """
+    applied = []
+    with engine.begin() as conn:
+        current = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        for version, description, steps in MIGRATIONS:
+            if version <= current:
+                continue
+            for step in steps:
+                step(conn)
+            conn.exec_driver_sql(f"PRAGMA user_version = {version}")
+            applied.append((version, description))
+    for version, description in applied:
+        logging.info(f"Schema migrated to v{version}: {description}")
+    return applied
+
+
+@click.command('upgrade-db')
+@with_appcontext
+def upgrade_db_command():
+    """Create missing tables and apply pending schema migrations."""
+    from models import db
+    db.create_all()
+    applied = upgrade(db.engine)
+    for version, description in applied:
+        click.echo(f"Applied v{version}: {description}")
+    click.echo(f"Schema at v{schema_version(db.engine)} (latest v{LATEST_VERSION}).")
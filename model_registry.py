@@ -0,0 +1,337 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+from flask import g
+
+from backends import load_inference_model, model_size_bytes, read_model_content, split_classifier
+from inference import BatchScheduler
+from worker_pool import InferencePool
+from preprocessing import IMG_SIZE, resolve_preprocess
+from utils import MODEL_PATHS, METRIC_KEYS, load_calibration_report
+
+
+class ResidentModel:
+    """A model held in memory together with its own batch scheduler.
+
+    `predict` runs one stacked batch, either on the in-process Keras model or
+    on an InferencePool when worker processes are enabled. In-process Keras
+    classifiers also get `embedder`, a scheduler over the backbone that returns
+    penultimate-layer features, and `head`, which turns features into
+    probabilities; both are None when the model can't be split.
+    """
+
+    def __init__(self, name, predict, batcher, size_bytes, load_time_s, model=None, pool=None, temperature=1.0,
+                 embedder=None, head=None):
+        self.name = name
+        self.model = model
+        self.pool = pool
+        self.predict = predict
+        self.preprocess = resolve_preprocess(name)
+        self.batcher = batcher
+        self.embedder = embedder
+        self.head = head
+        self.size_bytes = size_bytes
+        self.load_time_s = load_time_s
+        self.warmup_ms = None
+        # Softmax temperature fitted by calibrate.py (1.0 = uncalibrated)
+        self.temperature = temperature
+        self.last_used = time.time()
+        # Requests holding this model; eviction only retires it, the last holder closes it
+        self.leases = 0
+        self.retired = False
+        self.closed = False
+        self._lease_lock = threading.Lock()
+
+    @property
+    def size_mb(self):
+        return round(self.size_bytes / (1024 * 1024), 1)
+
+    @property
+    def warm(self):
+        return self.warmup_ms is not None
+
+    def warm_up(self):
+        """One throwaway forward pass so graph tracing isn't paid by the first request."""
+        started = time.perf_counter()
+        sample = np.zeros((1,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+        self.predict(sample)
+        if self.embedder:
+            self.head(self.embedder.predict_fn(sample))
+        self.warmup_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    # --- LEASES ---
+    def acquire(self):
+        with self._lease_lock:
+            self.leases += 1
+
+    def release(self):
+        with self._lease_lock:
+            self.leases -= 1
+            close_now = self.retired and self.leases == 0
+        if close_now:
+            self.close()
+
+    def retire(self):
+        """Closes now if unused, otherwise when the last lease is released."""
+        with self._lease_lock:
+            self.retired = True
+            close_now = self.leases == 0
+        if close_now:
+            self.close()
+
+    def close(self):
+        with self._lease_lock:
+            if self.closed:
+                return
+            self.closed = True
+        self.batcher.stop()
+        if self.embedder:
+            self.embedder.stop()
+        if self.pool:
+            self.pool.close()
+
+
+class ModelRegistry:
+    """Keeps several MODEL_PATHS entries resident, evicting least recently used ones
+    once the estimated weight memory exceeds the configured budget.
+
+    The active model is swapped by replacing a single reference, so a request
+    that has called `active()` keeps a usable model even while another one loads.
+    Requests take models through `lease()`/`acquire()`: an evicted or unloaded
+    model leaves the registry at once but is only closed after its last lease.
+    """
+
+    def __init__(self):
+        self.app_root = '.'
+        self.model_folder = 'MyModels'
+        self.backend = 'keras'
+        self.memory_budget = 1024 * 1024 * 1024
+        self.max_batch_size = 16
+        self.max_wait_ms = 5
+        self.workers = 0
+        self.intra_threads = 2
+        self.inter_threads = 1
+        self.pool_max_batch = 64
+        self.worker_start_timeout = 120
+        self._resident = OrderedDict()
+        self._active = None
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+        self._loading = set()
+        self._shared = {}
+        self._preload = []
+
+    def init_app(self, app):
+        self.app_root = app.root_path
+        self.model_folder = app.config['MODEL_FOLDER']
+        self.backend = app.config['MODEL_BACKEND']
+        self.memory_budget = app.config['MODEL_MEMORY_BUDGET_MB'] * 1024 * 1024
+        self.max_batch_size = app.config['BATCH_MAX_SIZE']
+        self.max_wait_ms = app.config['BATCH_MAX_WAIT_MS']
+        self.workers = self._pool_workers(app)
+        self.intra_threads = app.config['INFERENCE_INTRA_OP_THREADS']
+        self.inter_threads = app.config['INFERENCE_INTER_OP_THREADS']
+        self.pool_max_batch = max(self.max_batch_size, app.config['BATCH_API_CHUNK_SIZE'])
+        self.worker_start_timeout = app.config['INFERENCE_WORKER_START_TIMEOUT']
+        self._preload = [n for n in app.config.get('MODEL_PRELOAD', []) if n in MODEL_PATHS]
+        app.teardown_request(self._release_leases)
+        if not app.config.get('PREFORK'):
+            self.start()
+
+    @staticmethod
+    def _pool_workers(app):
+        """INFERENCE_WORKERS, lowered so every web worker's pool fits INFERENCE_MAX_PROCESSES."""
+        workers = app.config['INFERENCE_WORKERS']
+        web_workers = int(os.environ.get('WEB_CONCURRENCY', 1)) if app.config.get('PREFORK') else 1
+        limit = app.config['INFERENCE_MAX_PROCESSES']
+        if workers > 0 and limit and workers * web_workers > limit:
+            capped = max(1, limit // web_workers)
+            logging.warning(f"INFERENCE_WORKERS={workers} x {web_workers} web workers exceeds "
+                            f"INFERENCE_MAX_PROCESSES={limit}; using {capped} per web worker")
+            return capped
+        return workers
+
+    def start(self):
+        if self._preload:
+            self.preload(self._preload)
+
+    def share_before_fork(self, names):
+        """Reads model weights in a pre-fork master so every worker maps the same pages.
+
+        Only backends that can build a model from a byte buffer (TFLite) take
+        part; Keras models are loaded after fork in each worker.
+        """
+        for name in names:
+            if name not in MODEL_PATHS:
+                continue
+            path = os.path.join(self.model_folder, MODEL_PATHS[name])
+            try:
+                content = read_model_content(path, self.backend)
+            except Exception as e:
+                logging.error(f"Pre-fork read failed ({name}): {e}")
+                continue
+            if content is None:
+                logging.info(f"{name}: {self.backend} models load after fork, weights are not shared")
+                continue
+            self._shared[name] = content
+            logging.info(f"{name}: {len(content) / (1024 * 1024):.1f} MB read before fork, shared copy-on-write")
+
+    # --- LOOKUP ---
+    def active(self):
+        return self._active
+
+    def get(self, name):
+        with self._lock:
+            entry = self._resident.get(name)
+            if entry:
+                self._resident.move_to_end(name)
+                entry.last_used = time.time()
+            return entry
+
+    def acquire(self, name=None):
+        """Like `get(name)` (or `active()` without a name), holding a lease the caller must `release()`."""
+        with self._lock:
+            entry = self.get(name) if name else self._active
+            if entry is not None:
+                entry.acquire()
+            return entry
+
+    def lease(self, name=None):
+        """`acquire()` released automatically when the current request ends (streamed responses included)."""
+        entry = self.acquire(name)
+        if entry is not None:
+            g.setdefault('model_leases', []).append(entry)
+        return entry
+
+    @staticmethod
+    def _release_leases(exc=None):
+        for entry in g.pop('model_leases', []):
+            entry.release()
+
+    def resident(self):
+        with self._lock:
+            return list(self._resident.values())
+
+    def loading(self):
+        with self._lock:
+            return sorted(self._loading)
+
+    def used_bytes(self):
+        with self._lock:
+            return sum(e.size_bytes for e in self._resident.values())
+
+    # --- LOADING ---
+    def load(self, name):
+        if name not in MODEL_PATHS:
+            raise KeyError(f"Unknown model: {name}")
+        entry = self.get(name)
+        if entry:
+            return entry
+
+        with self._load_lock:
+            entry = self.get(name)
+            if entry:
+                return entry
+            with self._lock:
+                self._loading.add(name)
+            try:
+                path = os.path.join(self.model_folder, MODEL_PATHS[name])
+                logging.info(f"Loading {path}...")
+                started = time.time()
+                model = pool = embedder = head = None
+                if self.workers > 0:
+                    pool = InferencePool(
+                        name, path, workers=self.workers, backend=self.backend,
+                        intra_threads=self.intra_threads, inter_threads=self.inter_threads,
+                        max_batch=self.pool_max_batch, start_timeout=self.worker_start_timeout
+                    )
+                    predict = pool.predict
+                    size_bytes = pool.size_bytes * self.workers
+                else:
+                    model = load_inference_model(path, self.backend, model_content=self._shared.get(name))
+                    predict = model.predict_on_batch
+                    size_bytes = model_size_bytes(model, path)
+                    split = split_classifier(model)
+                    if split:
+                        backbone, head = split
+                        embedder = BatchScheduler(backbone.predict_on_batch, max_batch_size=self.max_batch_size,
+                                                  max_wait_ms=self.max_wait_ms, name=f"{name}-embed")
+                load_time = time.time() - started
+                batcher = BatchScheduler(
+                    predict,
+                    max_batch_size=self.max_batch_size,
+                    max_wait_ms=self.max_wait_ms,
+                    name=name,
+                    concurrency=max(1, self.workers)
+                )
+                calibration = load_calibration_report(self.app_root, self.model_folder).get(METRIC_KEYS.get(name, name), {})
+                entry = ResidentModel(name, predict, batcher, size_bytes, load_time, model=model, pool=pool,
+                                      temperature=calibration.get('temperature', 1.0), embedder=embedder, head=head)
+                try:
+                    entry.warm_up()
+                except Exception as e:
+                    entry.close()
+                    raise RuntimeError(f"Warm-up failed for {name}: {e}") from e
+                with self._lock:
+                    self._resident[name] = entry
+                    # Never the entry just loaded: activate() may be about to switch to it
+                    self._evict(exempt=name)
+                logging.info(f"Resident: {name} [{self.backend}] ({entry.size_mb} MB, loaded in {load_time:.1f}s, "
+                             f"warm-up {entry.warmup_ms} ms, T={entry.temperature:.2f})")
+                return entry
+            finally:
+                with self._lock:
+                    self._loading.discard(name)
+
+    def preload(self, names):
+        """Loads models on a background thread without touching the active one."""
+        def _worker():
+            for name in names:
+                try:
+                    self.load(name)
+                except Exception as e:
+                    logging.error(f"Preload Error ({name}): {e}")
+
+        threading.Thread(target=_worker, name="model-preload", daemon=True).start()
+
+    def activate(self, name):
+        while True:
+            entry = self.load(name)
+            with self._lock:
+                # A concurrent load may have evicted it before the switch; load it again then
+                if self._resident.get(name) is entry:
+                    self._active = entry
+                    self._resident.move_to_end(name)
+                    # The previous active model is evictable from here on
+                    self._evict()
+                    return entry
+
+    def unload(self, name):
+        with self._lock:
+            if self._active and self._active.name == name:
+                raise ValueError("Cannot unload the active model")
+            entry = self._resident.pop(name, None)
+        if entry:
+            entry.retire()
+            logging.info(f"Unloaded: {name}" + (f" (closes after {entry.leases} in-flight request(s))" if entry.leases else ""))
+
+    # --- EVICTION ---
+    def _evict(self, exempt=None):
+        total = sum(e.size_bytes for e in self._resident.values())
+        for name in list(self._resident.keys()):
+            if total <= self.memory_budget:
+                break
+            if name == exempt or (self._active and self._active.name == name):
+                continue
+            if len(self._resident) <= 1:
+                break
+            entry = self._resident.pop(name)
+            total -= entry.size_bytes
+            entry.retire()
+            logging.info(f"Evicted: {name} (LRU, budget {self.memory_budget // (1024 * 1024)} MB)")
+
+
+registry = ModelRegistry()
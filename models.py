@@ -1,7 +1,8 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -20,6 +21,15 @@ class DelicacyInfo(db.Model):
     image_filename = db.Column(db.String(255), nullable=True)
 
 class InferenceLog(db.Model):
+    # Every admin filter is an equality on one column plus the (timestamp, id)
+    # keyset order, so each gets its own composite index ending in that key
+    __table_args__ = (
+        db.Index('ix_inference_log_ts_id', 'timestamp', 'id'),
+        db.Index('ix_inference_log_model_ts_id', 'model_used', 'timestamp', 'id'),
+        db.Index('ix_inference_log_class_ts_id', 'predicted_class', 'timestamp', 'id'),
+        db.Index('ix_inference_log_user_ts_id', 'user_id', 'timestamp', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     filename = db.Column(db.String(120))
@@ -27,8 +37,28 @@ class InferenceLog(db.Model):
     predicted_class = db.Column(db.String(50))
     confidence_score = db.Column(db.Float)
     inference_time_ms = db.Column(db.Float)
+    batch_size = db.Column(db.Integer, nullable=True)
+    queue_wait_ms = db.Column(db.Float, nullable=True)
+    forward_time_ms = db.Column(db.Float, nullable=True)
+    is_cached = db.Column(db.Boolean, default=False)
+    forward_passes = db.Column(db.Integer, default=1)
+    # Temperature-scaled top-1 probability, and postprocess.pack()'s float32 blob
+    # (raw class probabilities + temperature, entropy, margin)
+    calibrated_confidence = db.Column(db.Float, nullable=True)
+    scores = db.Column(db.LargeBinary, nullable=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
 
+class InferenceSummary(db.Model):
+    # Running per-model totals of InferenceLog, updated in the same transaction
+    # as each log flush so landing/dashboard stats never scan the log table
+    id = db.Column(db.Integer, primary_key=True)
+    model_used = db.Column(db.String(50), unique=True)
+    total_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_count = db.Column(db.Integer, nullable=False, default=0)
+    confidence_sum = db.Column(db.Float, nullable=False, default=0.0)
+    calibrated_count = db.Column(db.Integer, nullable=False, default=0)
+    calibrated_sum = db.Column(db.Float, nullable=False, default=0.0)
+
 class Feedback(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
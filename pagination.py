@@ -0,0 +1,68 @@
+import base64
+from datetime import datetime
+from sqlalchemy import tuple_
+
+from models import InferenceLog
+
+
+class KeysetPage:
+    """One page of InferenceLog rows plus opaque cursors for the neighbouring pages."""
+
+    def __init__(self, items, has_next, has_prev):
+        self.items = items
+        self.has_next = has_next and bool(items)
+        self.has_prev = has_prev and bool(items)
+        self.next_cursor = encode_cursor(items[-1]) if self.has_next else None
+        self.prev_cursor = encode_cursor(items[0]) if self.has_prev else None
+
+
+def encode_cursor(log):
+    raw = f"{log.timestamp.isoformat()}|{log.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        ts, log_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(ts), int(log_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def filter_logs(query, model=None, predicted_class=None, user_id=None, date_from=None, date_to=None):
+    """Applies the admin log filters. `user_id='guest'` selects anonymous scans."""
+    if model:
+        query = query.filter(InferenceLog.model_used == model)
+    if predicted_class:
+        query = query.filter(InferenceLog.predicted_class == predicted_class)
+    if user_id == 'guest':
+        query = query.filter(InferenceLog.user_id.is_(None))
+    elif user_id:
+        query = query.filter(InferenceLog.user_id == int(user_id))
+    if date_from:
+        query = query.filter(InferenceLog.timestamp >= date_from)
+    if date_to:
+        query = query.filter(InferenceLog.timestamp < date_to)
+    return query
+
+
+def paginate_logs(query, cursor=None, direction='next', per_page=10):
+    """Seeks on (timestamp, id) instead of OFFSET, so every page costs one index range scan."""
+    key = tuple_(InferenceLog.timestamp, InferenceLog.id)
+    position = decode_cursor(cursor)
+
+    if position and direction == 'prev':
+        rows = (query.filter(key > position)
+                .order_by(InferenceLog.timestamp.asc(), InferenceLog.id.asc())
+                .limit(per_page + 1).all())
+        has_prev = len(rows) > per_page
+        return KeysetPage(rows[:per_page][::-1], has_next=True, has_prev=has_prev)
+
+    if position:
+        query = query.filter(key < position)
+    rows = (query.order_by(InferenceLog.timestamp.desc(), InferenceLog.id.desc())
+            .limit(per_page + 1).all())
+    return KeysetPage(rows[:per_page], has_next=len(rows) > per_page, has_prev=position is not None)
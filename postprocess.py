@@ -0,0 +1,100 @@
+import numpy as np
+
+from utils import CLASS_NAMES, DISPLAY_NAMES
+
+# Stored per InferenceLog row as float32: the raw probabilities followed by
+# these fields, so the blob is always (len(CLASS_NAMES) + 3) * 4 bytes
+BLOB_FIELDS = ('temperature', 'entropy', 'margin')
+BLOB_BYTES = (len(CLASS_NAMES) + len(BLOB_FIELDS)) * 4
+
+_EPS = 1e-12
+
+
+def apply_temperature(probs, temperature=1.0):
+    """Rescales softmax outputs as softmax(log(p) / T), row by row."""
+    probs = np.asarray(probs, dtype=np.float32)
+    if not temperature or temperature == 1.0:
+        return probs
+    logits = np.log(np.maximum(probs, _EPS)) / np.float32(temperature)
+    logits -= logits.max(axis=-1, keepdims=True)
+    np.exp(logits, out=logits)
+    logits /= logits.sum(axis=-1, keepdims=True)
+    return logits
+
+
+def summarize(probs, temperature=1.0, k=3):
+    """Post-processes an NxC batch of softmax outputs in one vectorized pass.
+
+    Returns arrays with one row per image: `indices`/`scores` (top-k class
+    indices and calibrated probabilities, best first), `confidence` (raw top-1
+    probability), `calibrated` (top-1 after temperature scaling), `entropy`
+    (nats, of the calibrated distribution) and `margin` (top-1 minus top-2).
+    """
+    raw = np.asarray(probs, dtype=np.float32)
+    if raw.ndim == 1:
+        raw = raw[None]
+    n, c = raw.shape
+    k = max(1, min(int(k), c))
+    calibrated = apply_temperature(raw, temperature)
+
+    # argpartition finds the k best in O(C); only those k get sorted
+    top = np.argpartition(-calibrated, k - 1, axis=1)[:, :k] if k < c else np.tile(np.arange(c), (n, 1))
+    top_scores = np.take_along_axis(calibrated, top, axis=1)
+    order = np.argsort(-top_scores, axis=1)
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+
+    if c > 1:
+        best_two = -np.partition(-calibrated, 1, axis=1)[:, :2]
+        margin = best_two[:, 0] - best_two[:, 1]
+    else:
+        margin = np.ones(n, dtype=np.float32)
+    entropy = -(calibrated * np.log(np.maximum(calibrated, _EPS))).sum(axis=1)
+
+    return {
+        "indices": top,
+        "scores": top_scores,
+        "confidence": raw[np.arange(n), top[:, 0]],
+        "calibrated": top_scores[:, 0],
+        "entropy": entropy,
+        "margin": margin,
+        "probs": raw,
+        "temperature": float(temperature or 1.0),
+    }
+
+
+def top_k_list(summary, row=0):
+    """JSON-friendly top-k for one row of `summarize()`."""
+    return [
+        {"class": DISPLAY_NAMES.get(CLASS_NAMES[i], CLASS_NAMES[i]), "confidence": round(float(p), 4)}
+        for i, p in zip(summary["indices"][row], summary["scores"][row])
+    ]
+
+
+def row_fields(summary, row=0):
+    """InferenceLog columns for one row of `summarize()`."""
+    best = int(summary["indices"][row, 0])
+    return {
+        "predicted_class": DISPLAY_NAMES.get(CLASS_NAMES[best], CLASS_NAMES[best]),
+        "confidence_score": float(summary["confidence"][row]),
+        "calibrated_confidence": float(summary["calibrated"][row]),
+        "scores": pack(summary, row),
+    }
+
+
+# --- STORAGE ---
+def pack(summary, row=0):
+    """Fixed-width float32 blob for InferenceLog.scores."""
+    out = np.empty(len(CLASS_NAMES) + len(BLOB_FIELDS), dtype=np.float32)
+    out[:len(CLASS_NAMES)] = summary["probs"][row]
+    out[len(CLASS_NAMES):] = (summary["temperature"], summary["entropy"][row], summary["margin"][row])
+    return out.tobytes()
+
+
+def unpack(blob):
+    """Inverse of `pack`: (raw probabilities, {'temperature', 'entropy', 'margin'}) or None."""
+    if not blob or len(blob) != BLOB_BYTES:
+        return None
+    values = np.frombuffer(blob, dtype=np.float32)
+    return values[:len(CLASS_NAMES)], dict(zip(BLOB_FIELDS, values[len(CLASS_NAMES):].tolist()))
+
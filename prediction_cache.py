@@ -0,0 +1,169 @@
+import os
+import time
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class PredictionCache:
+    """Caches softmax rows keyed by image content hash + model name.
+
+    Each entry also carries the image's embedding-index row, when it has one,
+    so a repeat upload finds its similar photos without a search by name.
+
+    The in-process tier is an LRU bounded by entry count and TTL. When
+    PREDICTION_CACHE_DB is set, entries are also written to a SQLite file so
+    they survive restarts and are shared between worker processes.
+    """
+
+    def __init__(self):
+        self.max_entries = 1024
+        self.ttl = 24 * 3600
+        self.db_path = None
+        self.db_max_rows = 100000
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._puts = 0
+
+    def init_app(self, app):
+        self.max_entries = app.config['PREDICTION_CACHE_SIZE']
+        self.ttl = app.config['PREDICTION_CACHE_TTL']
+        self.db_max_rows = app.config['PREDICTION_CACHE_DB_MAX_ROWS']
+        db_path = app.config.get('PREDICTION_CACHE_DB')
+        if db_path and not os.path.isabs(db_path):
+            db_path = os.path.join(app.instance_path, db_path)
+        self.db_path = db_path
+        if not app.config.get('PREFORK'):
+            self.start()
+
+    def start(self):
+        """Opens the SQLite tier; SQLite connections must not cross a fork."""
+        if self.db_path:
+            self._open_db(self.db_path)
+
+    def _open_db(self, db_path):
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "key TEXT PRIMARY KEY, probs BLOB NOT NULL, expires_at REAL NOT NULL, embedding_row INTEGER)"
+            )
+            if 'embedding_row' not in [row[1] for row in conn.execute("PRAGMA table_info(predictions)")]:
+                conn.execute("ALTER TABLE predictions ADD COLUMN embedding_row INTEGER")
+            conn.commit()
+            self._conn = conn
+            self.db_path = db_path
+        except Exception as e:
+            logging.error(f"Prediction cache DB disabled: {e}")
+
+    @staticmethod
+    def _key(digest, model_name):
+        return f"{model_name}:{digest}"
+
+    # --- LOOKUP ---
+    def get(self, digest, model_name):
+        entry = self.lookup(digest, model_name)
+        return entry[0] if entry else None
+
+    def lookup(self, digest, model_name):
+        """(probs, embedding_row) of a cached prediction, or None."""
+        key = self._key(digest, model_name)
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                expires_at, probs, embedding_row = item
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return probs, embedding_row
+                del self._memory[key]
+
+            entry = self._db_get(key, now)
+            if entry is not None:
+                self._remember(key, *entry, now)
+                self.hits += 1
+                self.disk_hits += 1
+                return entry
+
+            self.misses += 1
+            return None
+
+    def put(self, digest, model_name, probs, embedding_row=None):
+        key = self._key(digest, model_name)
+        probs = np.asarray(probs, dtype=np.float32).copy()
+        now = time.time()
+        with self._lock:
+            self._remember(key, probs, embedding_row, now)
+            self._db_put(key, probs, embedding_row, now)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._conn:
+                self._conn.execute("DELETE FROM predictions")
+                self._conn.commit()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else 0.0,
+            "entries": len(self._memory),
+            "persistent": self._conn is not None,
+        }
+
+    # --- INTERNALS (caller holds the lock) ---
+    def _remember(self, key, probs, embedding_row, now):
+        self._memory[key] = (now + self.ttl, probs, embedding_row)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def _db_get(self, key, now):
+        if not self._conn:
+            return None
+        try:
+            row = self._conn.execute(
+                "SELECT probs, embedding_row FROM predictions WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logging.error(f"Prediction cache read failed: {e}")
+            return None
+        return (np.frombuffer(row[0], dtype=np.float32), row[1]) if row else None
+
+    def _db_put(self, key, probs, embedding_row, now):
+        if not self._conn:
+            return
+        try:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO predictions (key, probs, expires_at, embedding_row) VALUES (?, ?, ?, ?)",
+                (key, probs.tobytes(), now + self.ttl, embedding_row)
+            )
+            self._puts += 1
+            if self._puts % 500 == 0:
+                self._conn.execute("DELETE FROM predictions WHERE expires_at <= ?", (now,))
+                self._conn.execute(
+                    "DELETE FROM predictions WHERE key NOT IN ("
+                    "SELECT key FROM predictions ORDER BY expires_at DESC LIMIT ?)", (self.db_max_rows,)
+                )
+            self._conn.commit()
+        except sqlite3.Error as e:
+            logging.error(f"Prediction cache write failed: {e}")
+
+
+prediction_cache = PredictionCache()
@@ -0,0 +1,105 @@
+import io
+import threading
+import numpy as np
+from PIL import Image
+
+IMG_SIZE = (224, 224)
+
+# ImageNet channel means used by ResNet50's "caffe" preprocessing (BGR order)
+_CAFFE_MEAN = np.array([103.939, 116.779, 123.68], dtype=np.float32)
+
+_local = threading.local()
+
+
+# --- PER-MODEL SCALING (in place, float32) ---
+def _rescale(x):
+    x *= 1.0 / 255.0
+    return x
+
+
+def _caffe(x):
+    x[...] = x[..., ::-1]
+    x -= _CAFFE_MEAN
+    return x
+
+
+def _tf(x):
+    x *= 1.0 / 127.5
+    x -= 1.0
+    return x
+
+
+def _passthrough(x):
+    # EfficientNet models include their own Rescaling/Normalization layers
+    return x
+
+
+def resolve_preprocess(model_name):
+    """Picks the scaling function for a MODEL_PATHS entry. Call once at model load."""
+    if "AlexNet" in model_name:
+        return _rescale
+    elif "ResNet50" in model_name:
+        return _caffe
+    elif "MobileNetV2" in model_name:
+        return _tf
+    elif "EfficientNetB0" in model_name:
+        return _passthrough
+    else:
+        return _rescale
+
+
+# --- DECODING ---
+def decode_image(source, size=IMG_SIZE):
+    """Decodes bytes, a file-like object or a path into an RGB image of `size`.
+
+    JPEGs are decoded with libjpeg's DCT scaling (draft mode), so a 12 MP photo
+    is only expanded to the smallest power-of-two reduction that still covers
+    `size` before the final resize.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    img = Image.open(source)
+    img.draft('RGB', size)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+    # Nearest matches keras load_img / ImageDataGenerator used during training
+    return img.resize(size, Image.NEAREST)
+
+
+def request_buffer():
+    """Returns this thread's reusable 1x224x224x3 float32 input buffer."""
+    buf = getattr(_local, 'buffer', None)
+    if buf is None:
+        buf = _local.buffer = np.empty((1,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    return buf
+
+
+def decode_into(source, out):
+    """Writes the decoded, unscaled pixels of `source` into one 224x224x3 row."""
+    np.copyto(out, np.asarray(decode_image(source)), casting='unsafe')
+    return out
+
+
+def prepare_image(source, preprocess, out=None):
+    """Decodes `source` and writes the model-ready pixels into `out` (1x224x224x3)."""
+    if out is None:
+        out = np.empty((1,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    decode_into(source, out[0] if out.ndim == 4 else out)
+    return preprocess(out)
+
+
+def prepare_batch(sources, preprocess, out=None, executor=None):
+    """Fills an Nx224x224x3 float32 array in place, one row per source.
+
+    Pass a thread pool as `executor` to decode rows in parallel; PIL releases
+    the GIL while decoding.
+    """
+    n = len(sources)
+    if out is None:
+        out = np.empty((n,) + IMG_SIZE[::-1] + (3,), dtype=np.float32)
+    if executor is not None:
+        list(executor.map(decode_into, sources, out[:n]))
+    else:
+        for i, source in enumerate(sources):
+            decode_into(source, out[i])
+    return preprocess(out[:n])
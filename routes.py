@@ -1,17 +1,34 @@
 import os
 import time
 import logging
-import numpy as np
-from flask import Blueprint, render_template, request, redirect, url_for, session, flash, current_app
-from werkzeug.utils import secure_filename
-from sqlalchemy import func
-from tensorflow.keras.models import load_model
+import mimetypes
+from datetime import datetime, timedelta
+from flask import (
+    Blueprint, render_template, request, redirect, url_for, session, flash, current_app,
+    jsonify, Response, stream_with_context, send_from_directory, abort
+)
+from werkzeug.utils import secure_filename, safe_join
 
 from models import db, User, InferenceLog, Feedback, DelicacyInfo
+from model_registry import registry
+from prediction_cache import prediction_cache, content_hash
+from log_writer import log_writer
+from metrics import metrics
+from upload_store import upload_store
+from thumbnails import thumbnails
+from delicacy_cache import delicacy_cache
+from embedding_index import embedding_index
+import stats
+import logs
+from pagination import filter_logs, paginate_logs
+from batch_api import open_archive, iter_uploads, stream_predictions
+import ensemble
+import postprocess
 from utils import (
-    MODEL_PATHS, CLASS_NAMES, DISPLAY_NAMES, SYSTEM_STATE,
-    prepare_image, load_model_metrics
+    MODEL_PATHS, CLASS_NAMES, DISPLAY_NAMES, SYSTEM_STATE, SERVING_STATE, process_memory,
+    load_model_metrics, load_quantization_report, load_benchmark_report
 )
+from preprocessing import decode_into, request_buffer
 
 # Create a Blueprint
 main = Blueprint('main', __name__)
@@ -19,17 +36,26 @@ main = Blueprint('main', __name__)
 
 @main.route('/')
 def landing():
-    total = InferenceLog.query.count()
-    avg_val = db.session.query(func.avg(InferenceLog.confidence_score)).scalar()
-    avg_acc = round(avg_val * 100, 1) if avg_val else 0.0
-    return render_template('landing.html', avg_accuracy=avg_acc)
+    return render_template('landing.html', avg_accuracy=stats.summary()['avg_accuracy'])
 
 
 @main.route('/library')
 def library():
-    all_delicacies = DelicacyInfo.query.all()
-    all_delicacies.sort(key=lambda x: x.name)
-    return render_template('library.html', delicacies=all_delicacies)
+    def _render():
+        return render_template('library.html', delicacies=delicacy_cache.all())
+
+    # Pending flash messages are shown once, so that render can't be reused
+    if session.get('_flashes'):
+        return _render()
+    # The navbar is the only per-visitor part of the page
+    key = (delicacy_cache.version, thumbnails.library_version,
+           session.get('is_admin'), session.get('user_id'), session.get('username'))
+    html, etag = delicacy_cache.page(key, _render)
+    response = current_app.make_response(html)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
 
 
 @main.route('/login', methods=['GET', 'POST'])
@@ -78,13 +104,11 @@ def admin_dashboard():
 
     if request.method == 'POST':
         action = request.form.get('action')
+        selected_name = request.form.get('model_select')
         if action == 'start_system':
-            selected_name = request.form.get('model_select')
             if selected_name in MODEL_PATHS:
                 try:
-                    path = os.path.join(current_app.config['MODEL_FOLDER'], MODEL_PATHS[selected_name])
-                    logging.info(f"Loading {path}...")
-                    SYSTEM_STATE['loaded_model'] = load_model(path)
+                    registry.activate(selected_name)
                     SYSTEM_STATE['is_active'] = True
                     SYSTEM_STATE['current_model_name'] = selected_name
                     flash(f'Started with {selected_name}', 'success')
@@ -93,31 +117,63 @@ def admin_dashboard():
                     flash(f"Error loading model: {e}", 'error')
         elif action == 'stop_system':
             SYSTEM_STATE['is_active'] = False
-            SYSTEM_STATE['loaded_model'] = None
             flash('System Stopped', 'warning')
+        elif action == 'preload_model':
+            if selected_name in MODEL_PATHS:
+                registry.preload([selected_name])
+                flash(f'Preloading {selected_name} in the background', 'success')
+        elif action == 'set_inference_mode':
+            SYSTEM_STATE['tta_views'] = max(1, min(request.form.get('tta_views', 1, type=int), ensemble.MAX_TTA_VIEWS))
+            SYSTEM_STATE['ensemble_models'] = [n for n in request.form.getlist('ensemble_models') if n in MODEL_PATHS]
+            weighting = request.form.get('ensemble_weighting')
+            if weighting in ensemble.WEIGHTINGS:
+                SYSTEM_STATE['ensemble_weighting'] = weighting
+            flash('Inference mode updated', 'success')
+        elif action == 'unload_model':
+            try:
+                registry.unload(request.form.get('resident_name'))
+                flash('Model unloaded', 'success')
+            except ValueError as e:
+                flash(str(e), 'error')
 
-    page = request.args.get('page', 1, type=int)
     per_page = 10  # Number of logs per page
 
-    # Use .paginate() instead of .limit().all()
-    pagination = InferenceLog.query.order_by(InferenceLog.timestamp.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    # Keyset pagination on (timestamp, id) with optional filters
+    log_filters = {k: request.args.get(k, '').strip() for k in ('model', 'cls', 'user', 'date_from', 'date_to')}
+    log_filters = {k: v for k, v in log_filters.items() if v}
+    try:
+        date_from = datetime.strptime(log_filters['date_from'], '%Y-%m-%d') if 'date_from' in log_filters else None
+        date_to = datetime.strptime(log_filters['date_to'], '%Y-%m-%d') + timedelta(days=1) if 'date_to' in log_filters else None
+        log_query = filter_logs(InferenceLog.query, model=log_filters.get('model'),
+                                predicted_class=log_filters.get('cls'), user_id=log_filters.get('user'),
+                                date_from=date_from, date_to=date_to)
+    except ValueError:
+        flash('Invalid log filter.', 'error')
+        log_filters = {}
+        log_query = InferenceLog.query
+
+    pagination = paginate_logs(log_query, cursor=request.args.get('cursor'),
+                               direction=request.args.get('dir', 'next'), per_page=per_page)
 
     logs = pagination.items  # Get the list of logs for current page
+    # Temperature, entropy and margin come from each row's float32 score blob
+    log_scores = {}
+    for log in logs:
+        unpacked = postprocess.unpack(log.scores)
+        if unpacked:
+            log_scores[log.id] = unpacked[1]
 
     # Other Data
     feedbacks = Feedback.query.order_by(Feedback.timestamp.desc()).limit(20).all()
-    delicacies = DelicacyInfo.query.all()
-    total_inferences = InferenceLog.query.count()
+    delicacies = delicacy_cache.all()
 
-    # Avg Accuracy Calculation
-    avg_val = db.session.query(func.avg(InferenceLog.confidence_score)).scalar()
-    avg_accuracy = round(avg_val * 100, 1) if avg_val else 0.0
+    # Totals, average confidence and per-model usage come from the rollup table
+    summary = stats.summary()
+    total_inferences = summary['total_inferences']
+    avg_accuracy = summary['avg_accuracy']
 
     # Graph Data
-    usage_data = db.session.query(InferenceLog.model_used, func.count(InferenceLog.id)).group_by(
-        InferenceLog.model_used).all()
+    usage_data = summary['usage']
     graph_labels = [d[0] for d in usage_data] if usage_data else ['No Data']
     graph_values = [d[1] for d in usage_data] if usage_data else [0]
 
@@ -125,13 +181,23 @@ def admin_dashboard():
                            state=SYSTEM_STATE,
                            logs=logs,
                            pagination=pagination,  # Pass pagination object
+                           log_filters=log_filters,
+                           class_names=sorted(DISPLAY_NAMES.values()),
                            feedbacks=feedbacks,
                            delicacies=delicacies,
                            avg_accuracy=avg_accuracy,
+                           avg_calibrated_confidence=summary['avg_calibrated_confidence'],
+                           calibrated_count=summary['calibrated_count'],
+                           log_scores=log_scores,
                            total_inferences=total_inferences,
                            graph_labels=graph_labels,
                            graph_values=graph_values,
-                           available_models=MODEL_PATHS.keys())
+                           available_models=MODEL_PATHS.keys(),
+                           resident_models=registry.resident(),
+                           loading_models=registry.loading(),
+                           memory_used_mb=round(registry.used_bytes() / (1024 * 1024), 1),
+                           memory_budget_mb=current_app.config['MODEL_MEMORY_BUDGET_MB'],
+                           cache_stats=prediction_cache.stats())
 
 # --- CRUD ROUTES ---
 @main.route('/admin/delicacy/add', methods=['POST'])
@@ -146,6 +212,7 @@ def add_delicacy():
         if file and file.filename != '':
             filename = secure_filename(file.filename)
             file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+            thumbnails.generate_async('uploads/' + filename)
 
         new_d = DelicacyInfo(
             name=name,
@@ -157,6 +224,7 @@ def add_delicacy():
         )
         db.session.add(new_d)
         db.session.commit()
+        delicacy_cache.invalidate()
         flash('Added!', 'success')
     return redirect(url_for('main.admin_dashboard'))
 
@@ -170,6 +238,7 @@ def edit_delicacy(id):
     if file and file.filename != '':
         filename = secure_filename(file.filename)
         file.save(os.path.join(current_app.config['UPLOAD_FOLDER'], filename))
+        thumbnails.generate_async('uploads/' + filename)
         d.image_filename = filename
 
     d.name = request.form.get('name')
@@ -179,6 +248,7 @@ def edit_delicacy(id):
     d.recipe = request.form.get('recipe')
 
     db.session.commit()
+    delicacy_cache.invalidate()
     flash('Updated!', 'success')
     return redirect(url_for('main.admin_dashboard'))
 
@@ -189,18 +259,85 @@ def delete_delicacy(id):
     d = DelicacyInfo.query.get_or_404(id)
     db.session.delete(d)
     db.session.commit()
+    delicacy_cache.invalidate()
     flash('Deleted!', 'success')
     return redirect(url_for('main.admin_dashboard'))
 
 
 @main.route('/admin/get_logs')
 def get_logs():
+    """Console feed. Without parameters: the last lines as plain text.
+
+    ?format=text returns the same tail as JSON with the file's end offset and
+    inode; passing those back as ?offset=N&inode=I returns only the lines written
+    since (`reset` tells the client to replace its view, e.g. after a rotation).
+    ?format=json reads the JSON-lines log instead and accepts ?level= and ?model=.
+    """
     if not session.get('is_admin'): return "Access Denied", 403
+    cfg = current_app.config
+    structured = request.args.get('format') == 'json'
+    path = cfg['LOG_JSON_FILE'] if structured else cfg['LOG_FILE']
+    lines = max(1, min(request.args.get('lines', cfg['LOG_TAIL_LINES'], type=int), 1000))
+    offset = request.args.get('offset', type=int)
+
+    if 'format' not in request.args and offset is None:
+        try:
+            return logs.tail(path, lines)[0]
+        except OSError:
+            return "No logs."
+
     try:
-        with open('system.log', 'r') as f:
-            return "".join(f.readlines()[-100:])
-    except:
-        return "No logs."
+        if offset is None:
+            # Filters may drop most lines, so the first JSON read looks further back
+            text, offset, inode = logs.tail(path, lines * 10 if structured else lines)
+            reset = True
+        else:
+            text, offset, inode, reset = logs.read_since(path, offset, request.args.get('inode', type=int),
+                                                         max_bytes=cfg['LOG_POLL_MAX_BYTES'], lines=lines)
+    except (OSError, TypeError):
+        return jsonify(text="", entries=[], offset=0, inode=None, reset=True)
+
+    if structured:
+        entries = logs.filter_entries(text, request.args.get('level'), request.args.get('model') or None)
+        return jsonify(entries=entries[-lines:] if reset else entries, offset=offset, inode=inode, reset=reset)
+    return jsonify(text=text, offset=offset, inode=inode, reset=reset)
+
+
+@main.route('/admin/latency')
+def admin_latency():
+    # Live per-stage percentiles for the dashboard (recent window, not lifetime)
+    if not session.get('is_admin'): return jsonify(error="Admin only"), 403
+    return jsonify(metrics.snapshot(model=request.args.get('model') or None))
+
+
+@main.route('/healthz')
+def healthz():
+    # Liveness: the process answers requests
+    return jsonify(status="ok", pid=os.getpid(), uptime_s=round(time.time() - SERVING_STATE['started_at'], 1),
+                   **process_memory())
+
+
+@main.route('/readyz')
+def readyz():
+    # Readiness: the active model is loaded and warmed, and we're not shutting down
+    active = registry.active()
+    ready = (SYSTEM_STATE['is_active'] and active is not None and active.warm
+             and not SERVING_STATE['draining'])
+    body = {
+        "ready": bool(ready),
+        "model": active.name if active else None,
+        "warmup_ms": active.warmup_ms if active else None,
+        "draining": SERVING_STATE['draining'],
+    }
+    return jsonify(body), 200 if ready else 503
+
+
+@main.route('/metrics')
+def prometheus_metrics():
+    token = current_app.config['METRICS_TOKEN']
+    if token and request.headers.get('Authorization') != f"Bearer {token}":
+        return Response("Unauthorized\n", status=401, mimetype='text/plain')
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 
 @main.route('/admin/evaluation')
@@ -208,60 +345,202 @@ def admin_evaluation():
     if not session.get('is_admin'): return redirect(url_for('main.login'))
     current_metrics = load_model_metrics(current_app.root_path)
     if not current_metrics:
-        flash("No evaluation data found. Please upload model_metrics.json.", "warning")
+        flash("No evaluation data found. Run evaluate_models.py or upload model_metrics.json.", "warning")
     models = list(current_metrics.keys())
     accuracies = [m.get('accuracy', 0) for m in current_metrics.values()]
     losses = [m.get('loss', 0) for m in current_metrics.values()]
-    return render_template('evaluation.html', metrics=current_metrics, chart_labels=models, chart_accuracies=accuracies, chart_losses=losses)
+
+    # Quantized exports: accuracy delta vs model_metrics.json, speed/size vs the Keras graph
+    quantized = {}
+    report = load_quantization_report(current_app.root_path, current_app.config['MODEL_FOLDER'])
+    for key, entry in report.items():
+        base = entry.get('keras', {})
+        rows = []
+        for variant in ('fp16', 'int8'):
+            v = entry.get(variant)
+            if not v:
+                continue
+            reference = current_metrics.get(key, {}).get('accuracy')
+            rows.append({
+                "variant": variant,
+                "accuracy": v.get('accuracy'),
+                "acc_delta": round(v['accuracy'] - reference, 2) if v.get('accuracy') is not None and reference is not None else None,
+                "latency_ms": v['latency_ms'],
+                "speedup": round(base['latency_ms'] / v['latency_ms'], 1) if base.get('latency_ms') and v['latency_ms'] else None,
+                "size_mb": v['size_mb'],
+                "size_pct": round(v['size_mb'] / base['size_mb'] * 100) if base.get('size_mb') else None,
+            })
+        quantized[key] = {"keras": base, "variants": rows}
+
+    # Speed next to accuracy: single-image p50 and best throughput from benchmark.py
+    benchmark = load_benchmark_report(current_app.root_path, current_app.config['MODEL_FOLDER']).get('models', {})
+    speed_points = []
+    for key in models:
+        batches = benchmark.get(key, {}).get('batches', {})
+        if '1' in batches:
+            speed_points.append({
+                "label": key,
+                "x": batches['1']['total_ms']['p50'],
+                "y": current_metrics[key].get('accuracy', 0),
+                "throughput": max(b['images_per_s'] for b in batches.values()),
+            })
+
+    return render_template('evaluation.html', metrics=current_metrics, chart_labels=models, chart_accuracies=accuracies, chart_losses=losses,
+                           quantized=quantized, benchmark=benchmark, speed_points=speed_points)
 
 
 @main.route('/admin/graph/<path:filename>')
 def get_graph(filename):
     if not session.get('is_admin'): return "Access Denied", 403
     directory = os.path.join(current_app.root_path, 'MyModels', 'graphs')
-    from flask import send_from_directory
     return send_from_directory(directory, filename)
 
 
 # --- RECOGNITION ---
+def inference_mode(resident):
+    """Resolves TTA views, ensemble members and weighting for one recognition request.
+
+    ?tta=K overrides the dashboard's view count; ?ensemble=0 disables the
+    ensemble, ?ensemble=1 uses the dashboard's list (or every resident model)
+    and ?ensemble=A,B names the members. Members that are not loaded are skipped.
+    """
+    views = request.values.get('tta', SYSTEM_STATE['tta_views'], type=int) or 1
+    views = max(1, min(views, ensemble.MAX_TTA_VIEWS))
+
+    # The recognize form sends a hidden '0' before its checkbox, so the last value wins
+    choice = (request.values.getlist('ensemble') or [None])[-1]
+    if choice is None:
+        names = SYSTEM_STATE['ensemble_models']
+    elif choice in ('', '0'):
+        names = []
+    elif choice == '1':
+        names = SYSTEM_STATE['ensemble_models'] or [r.name for r in registry.resident()]
+    else:
+        names = [n.strip() for n in choice.split(',')]
+
+    members = [resident]
+    for name in dict.fromkeys(names):
+        other = registry.lease(name) if name != resident.name else None
+        if other is not None:
+            members.append(other)
+
+    weighting = request.values.get('weighting', SYSTEM_STATE['ensemble_weighting'])
+    if weighting not in ensemble.WEIGHTINGS:
+        weighting = SYSTEM_STATE['ensemble_weighting']
+    return members, views, weighting
+
+
 @main.route('/recognize', methods=['GET', 'POST'])
 def recognize():
     if not SYSTEM_STATE['is_active']: return render_template('unavailable.html')
 
     if request.method == 'POST':
+        # Callers may pick any resident model per request, e.g. ?model=MobileNetV2 (Fine-Tuned)
+        requested = request.args.get('model') or request.form.get('model')
+        resident = registry.lease(requested)
+        if resident is None:
+            flash(f"Model '{requested}' is not loaded." if requested else "No model loaded.", "error")
+            return redirect(url_for('main.recognize'))
+
         file = request.files['image']
         if file:
+            request_started = time.perf_counter()
             filename = secure_filename(file.filename)
-            path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-            file.save(path)
+            data = file.read()
 
             try:
                 start = time.time()
-                img_arr = prepare_image(path, SYSTEM_STATE['current_model_name'])
-                preds = SYSTEM_STATE['loaded_model'].predict(img_arr)
-                idx = np.argmax(preds[0])
-                conf = float(preds[0][idx])
-
-                raw_name = CLASS_NAMES[idx]
-                display_name = DISPLAY_NAMES.get(raw_name, raw_name)
+                members, views, weighting = inference_mode(resident)
+                mode = ensemble.mode_key(members, views, weighting)
+                with metrics.timer('cache_lookup', resident.name):
+                    digest = content_hash(data)
+                    cached = prediction_cache.lookup(digest, mode)
+                if cached is None:
+                    buf = request_buffer()
+                    try:
+                        with metrics.timer('decode', resident.name):
+                            decode_into(data, buf[0])
+                    except Exception as e:
+                        logging.warning(f"Rejected upload {filename}: {e}", extra={'model': resident.name})
+                        flash("Invalid image file.", "error")
+                        return redirect(url_for('main.recognize'))
+                # Only bytes that decoded are stored (a cache hit decoded before);
+                # classification runs from `data`, the disk write happens in the background
+                with metrics.timer('upload_save', resident.name):
+                    stored_name = upload_store.put(digest, data, filename)
+                thumbnails.generate_async('uploads/' + stored_name, data)
+                embedding_row = duplicate = None
+                if cached is not None:
+                    preds, batch_stats = cached[0][None], {}
+                    embedding_row = cached[1]
+                else:
+                    if mode == resident.name and resident.embedder and embedding_index.enabled:
+                        # Backbone only; a near-duplicate reuses its stored prediction, otherwise the head runs
+                        with metrics.timer('preprocess', resident.name):
+                            img_arr = resident.preprocess(buf)
+                        features, batch_stats = resident.embedder.submit(img_arr)
+                        with metrics.timer('embedding_index', resident.name):
+                            duplicate = embedding_index.duplicate(resident.name, features[0])
+                        if duplicate:
+                            embedding_row, similarity, stored_probs = duplicate
+                            preds = stored_probs[None]
+                            logging.info(f"Near-duplicate of row {embedding_row} ({similarity:.3f}), head skipped",
+                                         extra={'model': resident.name})
+                        else:
+                            preds = resident.head(features)
+                            with metrics.timer('embedding_index', resident.name):
+                                embedding_row = embedding_index.add(resident.name, features[0], preds[0], stored_name)
+                        batch_stats['forward_passes'] = 1
+                    elif mode == resident.name:
+                        with metrics.timer('preprocess', resident.name):
+                            img_arr = resident.preprocess(buf)
+                        preds, batch_stats = resident.batcher.submit(img_arr)
+                        batch_stats['forward_passes'] = 1
+                    else:
+                        # TTA views and/or several models, one stacked batch per model
+                        weights_from = load_model_metrics(current_app.root_path) if weighting == 'accuracy' and len(members) > 1 else None
+                        probs, batch_stats = ensemble.predict(buf[0], members, views, weighting, metrics=weights_from)
+                        preds = probs[None]
+                    metrics.observe_ms('queue_wait', resident.name, batch_stats.get('queue_wait_ms'))
+                    metrics.observe_ms('forward', resident.name, batch_stats.get('forward_time_ms'))
+                    prediction_cache.put(digest, mode, preds[0], embedding_row)
+                # Ensemble outputs are combined from already-calibrated members
+                temperature = resident.temperature if mode == resident.name else 1.0
+                summary = postprocess.summarize(preds[:1], temperature, k=3)
+                fields = postprocess.row_fields(summary)
+                display_name = fields['predicted_class']
+                conf = fields['calibrated_confidence']
                 time_ms = round((time.time() - start) * 1000, 2)
 
-                logging.info(f"Result: {display_name} ({conf:.2f})")
-
-                log_entry = InferenceLog(
-                    filename=filename, model_used=SYSTEM_STATE['current_model_name'],
-                    predicted_class=display_name, confidence_score=conf,
-                    inference_time_ms=time_ms, user_id=session.get('user_id')
+                logging.info(f"Result: {display_name} ({conf:.2f}) via {mode}{' [cached]' if cached is not None else ''}",
+                             extra={'model': resident.name})
+
+                log_writer.submit(
+                    filename=filename, model_used=resident.name,
+                    inference_time_ms=time_ms, user_id=session.get('user_id'),
+                    batch_size=batch_stats.get('batch_size'),
+                    queue_wait_ms=batch_stats.get('queue_wait_ms'),
+                    forward_time_ms=batch_stats.get('forward_time_ms'),
+                    is_cached=cached is not None,
+                    forward_passes=batch_stats.get('forward_passes', 0),
+                    **fields
                 )
-                db.session.add(log_entry)
-                db.session.commit()
 
                 session['last_result'] = {
                     "class": display_name,
                     "confidence": f"{conf * 100:.1f}%",
+                    "raw_confidence": f"{fields['confidence_score'] * 100:.1f}%",
+                    "top_k": postprocess.top_k_list(summary),
+                    "entropy": round(float(summary['entropy'][0]), 3),
+                    "margin": round(float(summary['margin'][0]), 3),
                     "time": f"{time_ms} ms",
-                    "image": filename
+                    "image": stored_name,
+                    "model": resident.name,
+                    "mode": mode,
+                    "embedding_row": embedding_row,
+                    "near_duplicate": duplicate is not None
                 }
+                metrics.observe('total', resident.name, time.perf_counter() - request_started)
                 return redirect(url_for('main.show_result'))
 
             except Exception as e:
@@ -269,7 +548,80 @@ def recognize():
                 flash("Analysis Failed. Check logs.", "error")
                 return redirect(url_for('main.recognize'))
 
-    return render_template('recognize.html')
+    return render_template('recognize.html', state=SYSTEM_STATE, max_views=ensemble.MAX_TTA_VIEWS,
+                           residents=[r.name for r in registry.resident()])
+
+
+@main.route('/kiosk')
+def kiosk():
+    # Camera page for market-stall kiosks; frames go over /ws/recognize (streaming.py)
+    if not SYSTEM_STATE['is_active']: return render_template('unavailable.html')
+    cfg = current_app.config
+    return render_template('kiosk.html', fps=cfg['STREAM_CLIENT_FPS'], frame_width=cfg['STREAM_FRAME_WIDTH'],
+                           smoothing=cfg['STREAM_SMOOTHING'])
+
+
+@main.route('/api/recognize/batch', methods=['POST'])
+def recognize_batch():
+    # Accepts many 'images' files and/or one zip/tar 'archive'; streams NDJSON back
+    if not session.get('user_id'): return jsonify(error="Login required"), 401
+    if not SYSTEM_STATE['is_active']: return jsonify(error="System offline"), 503
+
+    requested = request.args.get('model')
+    resident = registry.lease(requested)
+    if resident is None:
+        return jsonify(error=f"Model '{requested}' is not loaded." if requested else "No model loaded."), 409
+
+    top_k = max(1, min(request.args.get('top_k', 3, type=int), len(CLASS_NAMES)))
+    cfg = current_app.config
+    # Reject unreadable archives here: once streaming starts the status is already 200
+    try:
+        archive = open_archive(request.files.get('archive'))
+    except ValueError as e:
+        return jsonify(error=str(e)), 400
+    items = iter_uploads(request.files.getlist('images'), archive, cfg['BATCH_API_MAX_IMAGE_BYTES'])
+    lines = stream_predictions(resident, items, top_k=top_k,
+                               chunk_size=cfg['BATCH_API_CHUNK_SIZE'],
+                               workers=cfg['BATCH_API_DECODE_WORKERS'],
+                               max_bytes=cfg['BATCH_API_MAX_IMAGE_BYTES'],
+                               user_id=session.get('user_id'))
+    return Response(stream_with_context(lines), mimetype='application/x-ndjson')
+
+
+@main.route('/uploads/<path:name>')
+def uploaded_image(name):
+    # Served from memory until the background writer has stored it
+    data = upload_store.pending(name)
+    if data is not None:
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+        return Response(data, mimetype=mimetype)
+    return send_from_directory(upload_store.root, name, max_age=31536000)
+
+
+@main.route('/thumbs/<name>')
+def thumbnail(name):
+    # Content-hashed names never change meaning, so caches may keep them forever
+    response = send_from_directory(thumbnails.folder, name, max_age=31536000)
+    response.cache_control.immutable = True
+    return response
+
+
+@main.route('/thumbs/lazy/<path:source>')
+def lazy_thumbnail(source):
+    # First request for an image without derivatives yet: build them, then redirect
+    width = request.args.get('w', 320, type=int)
+    ext = 'jpg' if request.args.get('ext') == 'jpg' else 'webp'
+    data = None
+    if source.startswith('uploads/'):
+        data = upload_store.pending(source[len('uploads/'):])
+    if data is None and not os.path.isfile(safe_join(current_app.static_folder, source) or ''):
+        abort(404)
+    try:
+        thumbnails.generate(source, data)
+    except Exception as e:
+        logging.warning(f"Thumbnail generation failed for {source}: {e}")
+        abort(404)
+    return redirect(thumbnails.url(source, width, ext))
 
 
 @main.route('/result')
@@ -277,10 +629,19 @@ def show_result():
     result = session.get('last_result')
     if not result:
         return redirect(url_for('main.recognize'))
-    info = DelicacyInfo.query.filter_by(name=result['class']).first()
+    info = delicacy_cache.for_class(result['class'])
     if not info:
         info = DelicacyInfo(name=result['class'], description="Info loading...", history="", ingredients="", recipe="")
-    return render_template('result.html', result=result, info=info)
+    similar = []
+    if embedding_index.enabled and result.get('mode', result.get('model')) == result.get('model'):
+        with metrics.timer('similar_search', result['model']):
+            similar = embedding_index.similar(result['model'], result.get('embedding_row'),
+                                              k=current_app.config['SIMILAR_PHOTOS'])
+        # Pruned uploads drop out of the list
+        similar = [p for p in similar
+                   if upload_store.pending(p['image']) is not None or os.path.exists(upload_store.path(p['image']))]
+    with metrics.timer('render', result.get('model', '')):
+        return render_template('result.html', result=result, info=info, similar=similar)
 
 
 @main.route('/feedback', methods=['POST'])
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import argparse
+import subprocess
+import numpy as np
+
+# Modules that must never be imported just to serve pages
+HEAVY_MODULES = ('tensorflow', 'keras', 'tflite_runtime', 'cv2', 'pandas', 'sklearn')
+
+# Runs in a fresh interpreter: time the app import, create_app() and one page
+_PROBE = r"""
+import sys, time, json
+t0 = time.perf_counter()
+from app import create_app
+t1 = time.perf_counter()
+app = create_app()
+t2 = time.perf_counter()
+response = app.test_client().get('/login')
+t3 = time.perf_counter()
+import resource
+print(json.dumps({
+    "import_s": t1 - t0,
+    "create_app_s": t2 - t1,
+    "first_request_s": t3 - t2,
+    "total_s": t3 - t0,
+    "status": response.status_code,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": sorted(m for m in HEAVY if m in sys.modules),
+}))
+"""
+
+
+def run_probe():
+    code = f"HEAVY = {HEAVY_MODULES!r}\n{_PROBE}"
+    proc = subprocess.run([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                          text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if proc.returncode != 0:
+        raise RuntimeError(f"probe exited with code {proc.returncode}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(limit):
+    """Modules with the largest self import time, from -X importtime."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from app import create_app'],
+                          stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)))
+    rows = []
+    for line in proc.stderr.splitlines():
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        self_us = int(parts[0].split(':')[-1])
+        rows.append((self_us / 1e6, parts[2].strip()))
+    return sorted(rows, reverse=True)[:limit]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure web-process cold start (no model loaded).")
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--max-seconds', type=float, default=1.0,
+                        help="Fail if median import + create_app + first request exceeds this")
+    parser.add_argument('--output', help="Write the results as JSON")
+    args = parser.parse_args()
+
+    print(f"--- 🚀 Cold start benchmark ({args.runs} runs) ---")
+    runs = [run_probe() for _ in range(args.runs)]
+    summary = {key: round(float(np.median([r[key] for r in runs])), 3)
+               for key in ('import_s', 'create_app_s', 'first_request_s', 'total_s', 'peak_rss_mb')}
+    heavy = sorted({m for r in runs for m in r['heavy_modules']})
+    summary["heavy_modules"] = heavy
+    summary["slowest_imports"] = [{"module": m, "seconds": round(s, 3)} for s, m in slowest_imports(8)]
+
+    print(f"   import {summary['import_s']}s | create_app {summary['create_app_s']}s | "
+          f"first request {summary['first_request_s']}s | total {summary['total_s']}s")
+    print(f"   peak RSS {summary['peak_rss_mb']} MB")
+    for row in summary["slowest_imports"]:
+        print(f"   {row['seconds']:>6.3f}s  {row['module']}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=4)
+
+    failed = False
+    if heavy:
+        print(f"❌ Heavy modules imported at startup: {', '.join(heavy)}")
+        failed = True
+    if summary['total_s'] > args.max_seconds:
+        print(f"❌ Cold start {summary['total_s']}s exceeds {args.max_seconds}s")
+        failed = True
+    if failed:
+        sys.exit(1)
+    print("✅ Cold start within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import logging
+from collections import defaultdict
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, insert, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from models import db, InferenceLog, InferenceSummary
+
+
+def record(rows):
+    """Adds freshly written InferenceLog rows to the per-model totals.
+
+    Runs inside the caller's transaction so totals and logs commit together.
+    """
+    totals = defaultdict(lambda: [0, 0, 0.0, 0, 0.0])
+    for row in rows:
+        t = totals[row.get('model_used')]
+        t[0] += 1
+        if row.get('confidence_score') is not None:
+            t[1] += 1
+            t[2] += row['confidence_score']
+        if row.get('calibrated_confidence') is not None:
+            t[3] += 1
+            t[4] += row['calibrated_confidence']
+
+    for model_used, (count, conf_count, conf_sum, cal_count, cal_sum) in totals.items():
+        stmt = sqlite_insert(InferenceSummary).values(
+            model_used=model_used, total_count=count,
+            confidence_count=conf_count, confidence_sum=conf_sum,
+            calibrated_count=cal_count, calibrated_sum=cal_sum
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=['model_used'],
+            set_={
+                'total_count': InferenceSummary.total_count + stmt.excluded.total_count,
+                'confidence_count': InferenceSummary.confidence_count + stmt.excluded.confidence_count,
+                'confidence_sum': InferenceSummary.confidence_sum + stmt.excluded.confidence_sum,
+                'calibrated_count': InferenceSummary.calibrated_count + stmt.excluded.calibrated_count,
+                'calibrated_sum': InferenceSummary.calibrated_sum + stmt.excluded.calibrated_sum,
+            }
+        )
+        db.session.execute(stmt)
+
+
+def summary():
+    """Totals for the landing page and dashboard, read from at most one row per model."""
+    rows = InferenceSummary.query.order_by(InferenceSummary.model_used).all()
+    total = sum(r.total_count for r in rows)
+    conf_count = sum(r.confidence_count for r in rows)
+    conf_sum = sum(r.confidence_sum for r in rows)
+    avg_val = conf_sum / conf_count if conf_count else None
+    # Temperature-scaled mean over the rows logged since calibration, kept apart
+    # so avg_accuracy stays comparable with figures from before it
+    cal_count = sum(r.calibrated_count for r in rows)
+    cal_val = sum(r.calibrated_sum for r in rows) / cal_count if cal_count else None
+    return {
+        "total_inferences": total,
+        "avg_accuracy": round(avg_val * 100, 1) if avg_val else 0.0,
+        "avg_calibrated_confidence": round(cal_val * 100, 1) if cal_val is not None else None,
+        "calibrated_count": cal_count,
+        "usage": [(r.model_used, r.total_count) for r in rows if r.total_count],
+    }
+
+
+def rebuild():
+    """Recomputes every per-model total from the full InferenceLog table."""
+    db.session.execute(delete(InferenceSummary))
+    grouped = db.session.query(
+        InferenceLog.model_used,
+        func.count(InferenceLog.id),
+        func.count(InferenceLog.confidence_score),
+        func.coalesce(func.sum(InferenceLog.confidence_score), 0.0),
+        func.count(InferenceLog.calibrated_confidence),
+        func.coalesce(func.sum(InferenceLog.calibrated_confidence), 0.0)
+    ).group_by(InferenceLog.model_used).all()
+    if grouped:
+        db.session.execute(insert(InferenceSummary), [
+            {"model_used": m, "total_count": n, "confidence_count": cn, "confidence_sum": cs,
+             "calibrated_count": kn, "calibrated_sum": ks}
+            for m, n, cn, cs, kn, ks in grouped
+        ])
+    db.session.commit()
+    return len(grouped)
+
+
+def ensure_backfilled():
+    if InferenceSummary.query.first() is None and InferenceLog.query.first() is not None:
+        logging.info("Inference summary empty, backfilling from InferenceLog...")
+        rebuild()
+
+
+@click.command('rebuild-stats')
+@with_appcontext
+def rebuild_stats_command():
+    """Backfill the dashboard rollup table from existing inference logs."""
+    models = rebuild()
+    click.echo(f"Rebuilt inference summary for {models} model(s).")
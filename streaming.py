@@ -0,0 +1,202 @@
+import json
+import time
+import logging
+import threading
+import numpy as np
+from flask import request, current_app, session
+from flask_sock import Sock
+from simple_websocket import ConnectionClosed
+
+from model_registry import registry
+from metrics import metrics
+import postprocess
+from preprocessing import decode_into, request_buffer
+from utils import CLASS_NAMES, SYSTEM_STATE
+
+sock = Sock()
+
+# Frame slots of the open connections, for the /metrics gauge
+_open_slots = set()
+
+
+def open_streams():
+    return len(_open_slots)
+
+
+class FrameSlot:
+    """Single-frame mailbox between the socket reader and the inference thread.
+
+    `put()` replaces whatever is waiting, so inference always starts on the
+    newest frame and a slow model drops frames instead of building a backlog.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._frame = None
+        self._closed = False
+        self.dropped = 0
+
+    def put(self, frame):
+        with self._cond:
+            if self._frame is not None:
+                self.dropped += 1
+            self._frame = frame
+            self._cond.notify()
+
+    def take(self):
+        """Blocks for the next frame; returns None once closed."""
+        with self._cond:
+            while self._frame is None and not self._closed:
+                self._cond.wait()
+            frame, self._frame = self._frame, None
+            return frame
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+
+class Smoother:
+    """Exponential moving average over class probabilities.
+
+    alpha=1 shows every frame as is; lower values steady the displayed class
+    while the camera or the tray moves. The average restarts when the model changes.
+    """
+
+    def __init__(self, alpha):
+        self.alpha = alpha
+        self.model = None
+        self._state = None
+
+    def update(self, probs, model):
+        if self._state is None or model != self.model or self.alpha >= 1:
+            self._state = probs.astype(np.float32, copy=True)
+            self.model = model
+        else:
+            self._state *= 1.0 - self.alpha
+            self._state += self.alpha * probs
+        return self._state
+
+
+def _stream_options(source, cfg, options=None):
+    options = dict(options or {})
+    if 'top_k' in source:
+        options['top_k'] = max(1, min(int(source['top_k']), len(CLASS_NAMES)))
+    if 'smoothing' in source:
+        options['smoothing'] = min(max(float(source['smoothing']), 0.0), 1.0)
+    if 'model' in source:
+        options['model'] = source['model'] or None
+    options.setdefault('top_k', 3)
+    options.setdefault('smoothing', cfg['STREAM_SMOOTHING'])
+    options.setdefault('model', None)
+    return options
+
+
+def _process(ws, slot, options, max_bytes):
+    try:
+        _process_frames(ws, slot, options, max_bytes)
+    except ConnectionClosed:
+        slot.close()
+
+
+def _process_frames(ws, slot, options, max_bytes):
+    """Inference thread: newest frame in, one JSON message out."""
+    buf = request_buffer()
+    smoother = Smoother(options['smoothing'])
+    frames = 0
+    while True:
+        frame = slot.take()
+        if frame is None:
+            return
+        seq, received, data = frame
+        requested = options['model']
+        # Looked up per frame so an admin switching or unloading models takes effect
+        if len(data) > max_bytes:
+            ws.send(json.dumps({"seq": seq, "error": "Frame too large."}))
+            continue
+        # Held for one frame only; the connection itself never pins a model
+        resident = registry.acquire(requested) if SYSTEM_STATE['is_active'] else None
+        if resident is None:
+            ws.send(json.dumps({"seq": seq, "error": "No model loaded."}))
+            continue
+        try:
+            with metrics.timer('decode', resident.name):
+                decode_into(data, buf[0])
+            with metrics.timer('preprocess', resident.name):
+                batch = resident.preprocess(buf)
+            preds, batch_stats = resident.batcher.submit(batch)
+        except Exception as e:
+            logging.warning(f"Stream frame {seq} failed: {e}")
+            ws.send(json.dumps({"seq": seq, "error": "Could not read frame."}))
+            continue
+        finally:
+            resident.release()
+
+        smoother.alpha = options['smoothing']
+        probs = smoother.update(postprocess.apply_temperature(preds[0], resident.temperature), resident.name)
+        summary = postprocess.summarize(probs, k=options['top_k'])
+        latency_ms = (time.perf_counter() - received) * 1000
+        metrics.observe_ms('queue_wait', resident.name, batch_stats.get('queue_wait_ms'))
+        metrics.observe_ms('forward', resident.name, batch_stats.get('forward_time_ms'))
+        metrics.observe_ms('stream_frame', resident.name, latency_ms)
+        frames += 1
+        ws.send(json.dumps({
+            "seq": seq,
+            "model": resident.name,
+            "top_k": postprocess.top_k_list(summary),
+            "raw_class": postprocess.top_k_list(postprocess.summarize(preds[:1], k=1))[0]["class"],
+            "margin": round(float(summary["margin"][0]), 4),
+            "latency_ms": round(latency_ms, 1),
+            "forward_ms": batch_stats.get('forward_time_ms'),
+            "processed": frames,
+            "dropped": slot.dropped,
+        }))
+
+
+@sock.route('/ws/recognize')
+def recognize_stream(ws):
+    """Binary messages are JPEG frames; text messages are JSON option updates
+    (top_k, smoothing, model). Options may also be given in the query string.
+
+    Each connection holds one server thread for its lifetime, plus one
+    inference thread that always works on the newest frame received.
+    """
+    cfg = current_app.config
+    if cfg['STREAM_LOGIN_REQUIRED'] and not session.get('user_id'):
+        ws.send(json.dumps({"error": "Login required"}))
+        return
+    try:
+        options = _stream_options(request.args, cfg)
+    except ValueError:
+        ws.send(json.dumps({"error": "Invalid stream options"}))
+        return
+
+    slot = FrameSlot()
+    worker = threading.Thread(target=_process, args=(ws, slot, options, cfg['STREAM_MAX_FRAME_BYTES']),
+                              name="stream-inference", daemon=True)
+    worker.start()
+    _open_slots.add(slot)
+    seq = 0
+    logging.info(f"Stream opened from {request.remote_addr}")
+    try:
+        while worker.is_alive():
+            message = ws.receive(timeout=cfg['STREAM_IDLE_TIMEOUT'])
+            if message is None:
+                logging.info("Stream idle, closing")
+                break
+            if isinstance(message, str):
+                try:
+                    options.update(_stream_options(json.loads(message), cfg, options))
+                except (ValueError, TypeError, AttributeError):
+                    logging.warning("Ignoring malformed stream options")
+                continue
+            seq += 1
+            slot.put((seq, time.perf_counter(), message))
+    except ConnectionClosed:
+        pass
+    finally:
+        slot.close()
+        worker.join(timeout=5)
+        _open_slots.discard(slot)
+        logging.info(f"Stream closed after {seq} frames ({slot.dropped} dropped)")
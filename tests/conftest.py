@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from load_test_db import make_app
+from models import db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / 'database.db')
+
+
+@pytest.fixture
+def app(db_path):
+    """App on a scratch SQLite file with the production pools and pragmas, inside an app context."""
+    app = make_app(db_path)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
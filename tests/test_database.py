@@ -0,0 +1,52 @@
+from sqlalchemy import event, select, text
+
+from database import READ_BIND
+from models import db, InferenceLog
+
+
+def _bind(session):
+    return session.get_bind(InferenceLog.__mapper__, clause=select(InferenceLog))
+
+
+def test_session_routes_reads_to_read_pool_until_it_writes(app):
+    db.create_all()
+    session = db.session()
+    writer, reader = db.engines[None], db.engines[READ_BIND]
+    assert reader is not writer
+
+    assert _bind(session) is reader
+
+    session.add(InferenceLog(model_used='M', predicted_class='c', confidence_score=0.5))
+    session.flush()
+    # Reads after a flush must see the uncommitted row, so they stay on the writer
+    assert _bind(session) is writer
+    assert session.execute(select(InferenceLog)).scalars().one().model_used == 'M'
+
+    session.commit()
+    assert _bind(session) is reader
+    assert InferenceLog.query.count() == 1
+
+
+def test_flush_statements_run_on_writer(app):
+    db.create_all()
+    statements = {None: [], READ_BIND: []}
+    for key, log in statements.items():
+        event.listen(db.engines[key], 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args, log=log: log.append(statement))
+
+    session = db.session()
+    # RoutingSession relies on SQLAlchemy's private Session._flushing flag
+    assert hasattr(session, '_flushing')
+    session.add(InferenceLog(model_used='M', predicted_class='c', confidence_score=0.5))
+    session.commit()
+    InferenceLog.query.all()
+
+    assert any(s.startswith('INSERT INTO inference_log') for s in statements[None])
+    assert not any(s.startswith('INSERT') for s in statements[READ_BIND])
+    assert any(s.startswith('SELECT') for s in statements[READ_BIND])
+
+
+def test_text_statements_run_on_writer(app):
+    db.create_all()
+    session = db.session()
+    assert session.get_bind(clause=text("DELETE FROM inference_log")) is db.engines[None]
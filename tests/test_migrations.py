@@ -0,0 +1,72 @@
+import sqlite3
+
+from load_test_db import make_app
+from models import db
+from migrations import MIGRATIONS, LATEST_VERSION, upgrade, schema_version
+
+# Tables as the first release created them, before any migration
+BASELINE_SCHEMA = """
+CREATE TABLE user (
+    id INTEGER PRIMARY KEY, username VARCHAR(80) NOT NULL UNIQUE,
+    password VARCHAR(120) NOT NULL, is_admin BOOLEAN
+);
+CREATE TABLE delicacy_info (
+    id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL UNIQUE, description TEXT NOT NULL,
+    history TEXT NOT NULL, ingredients TEXT, recipe TEXT NOT NULL
+);
+CREATE TABLE inference_log (
+    id INTEGER PRIMARY KEY, timestamp DATETIME, filename VARCHAR(120), model_used VARCHAR(50),
+    predicted_class VARCHAR(50), confidence_score FLOAT, inference_time_ms FLOAT,
+    user_id INTEGER REFERENCES user (id)
+);
+CREATE TABLE feedback (
+    id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL REFERENCES user (id),
+    rating INTEGER, comment TEXT, timestamp DATETIME
+);
+INSERT INTO inference_log (timestamp, model_used, predicted_class, confidence_score)
+VALUES ('2024-01-01 00:00:00', 'M', 'c', 0.9);
+"""
+
+
+def _columns(conn, table):
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def test_upgrade_baseline_schema_is_idempotent(db_path):
+    with sqlite3.connect(db_path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+
+    app = make_app(db_path)
+    with app.app_context():
+        db.create_all()
+        assert schema_version(db.engine) == 0
+
+        applied = upgrade(db.engine)
+        assert [version for version, _ in applied] == [version for version, _, _ in MIGRATIONS]
+        assert schema_version(db.engine) == LATEST_VERSION
+
+        # A second run (another worker, or the next deploy) finds nothing to do
+        assert upgrade(db.engine) == []
+        assert schema_version(db.engine) == LATEST_VERSION
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+    with sqlite3.connect(db_path) as conn:
+        assert {'batch_size', 'queue_wait_ms', 'forward_time_ms', 'is_cached', 'forward_passes',
+                'calibrated_confidence', 'scores'} <= _columns(conn, 'inference_log')
+        assert 'image_filename' in _columns(conn, 'delicacy_info')
+        assert {'calibrated_count', 'calibrated_sum'} <= _columns(conn, 'inference_summary')
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert 'ix_inference_log_ts_id' in indexes
+        # Existing rows survive and pick up the column defaults
+        assert conn.execute("SELECT is_cached, forward_passes FROM inference_log").fetchall() == [(0, 1)]
+
+
+def test_upgrade_fresh_database_only_stamps_version(app):
+    db.create_all()
+    applied = upgrade(db.engine)
+    # create_all already built the current schema; every step is a no-op
+    assert len(applied) == len(MIGRATIONS)
+    assert upgrade(db.engine) == []
+    assert schema_version(db.engine) == LATEST_VERSION
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+import model_registry
+from model_registry import ModelRegistry
+from utils import CLASS_NAMES
+
+OLD, NEW = "ResNet50 (Fine-Tuned)", "MobileNetV2 (Fine-Tuned)"
+MB = 1024 * 1024
+
+
+class FakeModel:
+    def predict_on_batch(self, batch):
+        return np.full((len(batch), len(CLASS_NAMES)), 1.0 / len(CLASS_NAMES), dtype=np.float32)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registry whose models are 600 MB fakes under a 1000 MB budget: no two fit together."""
+    monkeypatch.setattr(model_registry, 'load_inference_model', lambda path, backend, model_content=None: FakeModel())
+    monkeypatch.setattr(model_registry, 'model_size_bytes', lambda model, path: 600 * MB)
+    monkeypatch.setattr(model_registry, 'split_classifier', lambda model: None)
+    monkeypatch.setattr(model_registry, 'load_calibration_report', lambda root, folder: {})
+    registry = ModelRegistry()
+    registry.memory_budget = 1000 * MB
+    yield registry
+    for entry in registry.resident():
+        entry.close()
+
+
+def test_switching_to_a_model_that_does_not_fit_evicts_the_old_one(registry):
+    old = registry.activate(OLD)
+
+    new = registry.activate(NEW)
+
+    assert registry.active() is new
+    assert not new.retired and not new.closed
+    assert [e.name for e in registry.resident()] == [NEW]
+    assert old.retired and old.closed
+    preds, _ = new.batcher.submit(np.zeros((1, 224, 224, 3), dtype=np.float32))
+    assert preds.shape == (1, len(CLASS_NAMES))
+
+
+def test_evicted_model_stays_open_until_its_lease_is_released(registry):
+    old = registry.activate(OLD)
+    held = registry.acquire()
+    assert held is old
+
+    registry.activate(NEW)
+    assert old.retired and not old.closed
+
+    held.release()
+    assert old.closed
+
+
+def test_loading_over_budget_keeps_the_new_entry(registry):
+    registry.activate(OLD)
+
+    entry = registry.load(NEW)
+
+    # Both stay resident until the switch; the active model is never evicted
+    assert not entry.retired
+    assert {e.name for e in registry.resident()} == {OLD, NEW}
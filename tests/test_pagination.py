@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from sqlalchemy import insert
+
+from models import db, InferenceLog
+from pagination import encode_cursor, decode_cursor, paginate_logs
+
+
+def test_cursor_round_trip():
+    log = SimpleNamespace(timestamp=datetime(2024, 5, 17, 13, 45, 9, 123456), id=98765)
+    assert decode_cursor(encode_cursor(log)) == (log.timestamp, log.id)
+
+
+def test_cursor_rejects_garbage():
+    assert decode_cursor(None) is None
+    assert decode_cursor('') is None
+    assert decode_cursor('not-a-cursor!') is None
+
+
+def _seed(count, tied):
+    """`count` rows one second apart, except the `tied` newest which share a timestamp."""
+    start = datetime(2024, 1, 1, 12, 0, 0)
+    rows = [{"timestamp": start if i < tied else start - timedelta(seconds=i), "model_used": "M",
+             "predicted_class": "c", "confidence_score": 0.5} for i in range(count)]
+    db.create_all()
+    db.session.execute(insert(InferenceLog), rows)
+    db.session.commit()
+    return [log.id for log in InferenceLog.query.order_by(InferenceLog.timestamp.desc(), InferenceLog.id.desc())]
+
+
+def test_pages_break_timestamp_ties_by_id(app):
+    expected = _seed(count=13, tied=5)
+
+    seen, cursors, page = [], [], paginate_logs(InferenceLog.query, per_page=2)
+    while True:
+        seen.extend(log.id for log in page.items)
+        cursors.append(page)
+        if not page.has_next:
+            break
+        page = paginate_logs(InferenceLog.query, cursor=page.next_cursor, per_page=2)
+
+    # Every row exactly once, in (timestamp, id) descending order, across the tied block
+    assert seen == expected
+    assert len(cursors) == 7
+
+
+def test_prev_page_returns_the_same_rows(app):
+    _seed(count=9, tied=4)
+    first = paginate_logs(InferenceLog.query, per_page=3)
+    second = paginate_logs(InferenceLog.query, cursor=first.next_cursor, per_page=3)
+    back = paginate_logs(InferenceLog.query, cursor=second.prev_cursor, direction='prev', per_page=3)
+
+    assert [log.id for log in back.items] == [log.id for log in first.items]
+    assert not back.has_prev
+    assert back.has_next
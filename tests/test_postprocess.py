@@ -0,0 +1,28 @@
+import numpy as np
+
+import postprocess
+from utils import CLASS_NAMES
+
+
+def _probs(rows=2, seed=0):
+    logits = np.random.default_rng(seed).standard_normal((rows, len(CLASS_NAMES)))
+    return (np.exp(logits) / np.exp(logits).sum(axis=1, keepdims=True)).astype(np.float32)
+
+
+def test_pack_unpack_round_trip():
+    summary = postprocess.summarize(_probs(), temperature=1.7, k=3)
+    for row in range(2):
+        blob = postprocess.pack(summary, row)
+        assert len(blob) == postprocess.BLOB_BYTES
+
+        probs, fields = postprocess.unpack(blob)
+        np.testing.assert_array_equal(probs, np.asarray(summary['probs'][row], dtype=np.float32))
+        assert fields['temperature'] == np.float32(summary['temperature'])
+        assert fields['entropy'] == np.float32(summary['entropy'][row])
+        assert fields['margin'] == np.float32(summary['margin'][row])
+
+
+def test_unpack_rejects_other_sizes():
+    assert postprocess.unpack(None) is None
+    assert postprocess.unpack(b'') is None
+    assert postprocess.unpack(b'\0' * (postprocess.BLOB_BYTES - 4)) is None
@@ -0,0 +1,72 @@
+import threading
+import numpy as np
+
+from streaming import FrameSlot, Smoother
+
+
+def test_newest_frame_wins_and_stale_ones_count_as_dropped():
+    slot = FrameSlot()
+    for frame in (b'1', b'2', b'3'):
+        slot.put(frame)
+
+    assert slot.take() == b'3'
+    assert slot.dropped == 2
+
+    slot.put(b'4')
+    assert slot.take() == b'4'
+    assert slot.dropped == 2
+
+
+def test_take_waits_for_a_frame_and_returns_none_once_closed():
+    slot = FrameSlot()
+    taken = []
+    reader = threading.Thread(target=lambda: taken.extend([slot.take(), slot.take()]))
+    reader.start()
+
+    slot.put(b'frame')
+    # A frame already waiting is still handed out; the next take() sees the close
+    slot.close()
+    reader.join(5)
+
+    assert not reader.is_alive()
+    assert taken == [b'frame', None]
+
+
+def _onehot(index, n=4, weight=0.9):
+    probs = np.full(n, (1 - weight) / (n - 1), dtype=np.float32)
+    probs[index] = weight
+    return probs
+
+
+def test_ema_keeps_top_class_through_a_noisy_frame():
+    smoother = Smoother(alpha=0.3)
+    for _ in range(5):
+        smoother.update(_onehot(0), 'A')
+
+    # One frame voting for another class does not flip the displayed one
+    state = smoother.update(_onehot(2), 'A')
+    assert int(np.argmax(state)) == 0
+    np.testing.assert_allclose(state.sum(), 1.0, rtol=1e-5)
+
+    # A sustained change does
+    for _ in range(5):
+        state = smoother.update(_onehot(2), 'A')
+    assert int(np.argmax(state)) == 2
+
+
+def test_ema_resets_on_model_change_and_with_alpha_one():
+    smoother = Smoother(alpha=0.3)
+    smoother.update(_onehot(0), 'A')
+    np.testing.assert_array_equal(smoother.update(_onehot(1), 'B'), _onehot(1))
+    assert smoother.model == 'B'
+
+    passthrough = Smoother(alpha=1.0)
+    passthrough.update(_onehot(0), 'A')
+    np.testing.assert_array_equal(passthrough.update(_onehot(3), 'A'), _onehot(3))
+
+
+def test_ema_does_not_alias_the_caller_array():
+    probs = _onehot(0)
+    state = Smoother(alpha=0.5).update(probs, 'A')
+    state *= 0
+    assert probs[0] == np.float32(0.9)
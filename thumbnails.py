@@ -0,0 +1,324 @@
+import os
+import io
+import re
+import json
+import time
+import queue
+import sqlite3
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from flask import url_for
+from PIL import Image
+
+# (extension, PIL format, save options)
+_FORMATS = (
+    ('webp', 'WEBP', {'method': 4}),
+    ('jpg', 'JPEG', {'optimize': True, 'progressive': True}),
+)
+# prune() leaves derivatives this young alone: another worker may have written
+# them and not recorded them in the manifest yet
+_PRUNE_GRACE_S = 600
+# Manifest rows kept in memory per process; older ones are re-read from SQLite
+_MEMORY_ENTRIES = 4096
+
+
+class ThumbnailCache:
+    """Resized WebP/JPEG derivatives of images under the static folder.
+
+    Derivatives are named `<sha256[:16] of the source>_<width>.<ext>`, so their
+    URLs change whenever the source changes and can be cached for a year.
+    The manifest, a SQLite table shared by every worker, maps a source path
+    (relative to static/) to its digest and the mtime/size it was generated
+    from, which lets templates build URLs with one stat() per image instead
+    of hashing the file. Recently used rows are kept in memory.
+
+    Uploads are converted on a background thread as soon as they arrive. Its
+    queue is bounded: when it is full the job is dropped, and the image gets
+    a `/thumbs/lazy/...` URL like any source not seen yet, which generates the
+    set on the first request and redirects to the hashed file.
+    """
+
+    def __init__(self):
+        self.static_folder = 'static'
+        self.folder = 'static/thumbs'
+        self.widths = (160, 320, 640)
+        self.webp_quality = 80
+        self.jpeg_quality = 82
+        self.db_path = None
+        self.max_queue = 64
+        self._manifest = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight = set()
+        self._queue = None
+        self._thread = None
+        self._conn = None
+        self.dropped = 0
+        # Content-addressed recognition uploads ("<uploads>/ab/cd/<sha256>.<ext>")
+        self._upload_pattern = re.compile(r'uploads/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+')
+        # Bumped when any other source (library images) gets a new derivative
+        # set, so the cached library page re-renders; recognition uploads never
+        # appear on a cached page and leave it alone
+        self.library_version = 0
+
+    def init_app(self, app):
+        self.static_folder = app.static_folder
+        self.folder = os.path.join(app.root_path, app.config['THUMBNAIL_FOLDER'])
+        self.widths = tuple(sorted(app.config['THUMBNAIL_WIDTHS']))
+        self.webp_quality = app.config['THUMBNAIL_WEBP_QUALITY']
+        self.jpeg_quality = app.config['THUMBNAIL_JPEG_QUALITY']
+        self.db_path = os.path.join(app.instance_path, app.config['THUMBNAIL_MANIFEST_DB'])
+        self.max_queue = app.config['THUMBNAIL_MAX_QUEUE']
+        uploads = os.path.relpath(os.path.join(app.root_path, app.config['UPLOAD_FOLDER']), self.static_folder)
+        self._upload_pattern = re.compile(re.escape(uploads.replace(os.sep, '/')) +
+                                          r'/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.\w+')
+        os.makedirs(self.folder, exist_ok=True)
+        app.jinja_env.globals.update(thumb_url=self.url, thumb_srcset=self.srcset)
+        if not app.config.get('PREFORK'):
+            self.start()
+
+    def start(self):
+        """Opens the manifest and starts the generator thread; SQLite connections must not cross a fork."""
+        self._open_db(self.db_path)
+        self._queue = queue.Queue(maxsize=self.max_queue)
+        self._thread = threading.Thread(target=self._run, name="thumbnails", daemon=True)
+        self._thread.start()
+
+    # --- GENERATION ---
+    def generate(self, source, data=None):
+        """Writes every width/format for `source` (path relative to static/). Returns the digest.
+
+        Pass `data` for images whose file is not on disk yet (pending uploads).
+        """
+        path = os.path.join(self.static_folder, *source.split('/'))
+        if data is None:
+            with open(path, 'rb') as f:
+                data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:16]
+
+        missing = [(w, ext, fmt, opts) for w in self.widths for ext, fmt, opts in _FORMATS
+                   if not os.path.exists(self._path(digest, w, ext))]
+        if missing:
+            img = Image.open(io.BytesIO(data))
+            img.draft('RGB', (self.widths[-1], self.widths[-1]))
+            img = img.convert('RGB')
+            for width, ext, fmt, opts in missing:
+                thumb = img.copy()
+                # thumbnail() never upscales; small sources keep their size
+                thumb.thumbnail((width, width * 4), Image.LANCZOS)
+                quality = self.webp_quality if fmt == 'WEBP' else self.jpeg_quality
+                out_path = self._path(digest, width, ext)
+                tmp_path = f"{out_path}.{threading.get_ident()}.tmp"
+                thumb.save(tmp_path, fmt, quality=quality, **opts)
+                os.replace(tmp_path, out_path)
+
+        try:
+            st = os.stat(path)
+            stamp = [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            stamp = [0, len(data)]
+        entry = stamp + [digest]
+        with self._lock:
+            if self._lookup(source) != entry:
+                self._remember(source, entry)
+                self._db_write("INSERT OR REPLACE INTO manifest (source, mtime_ns, size, digest) VALUES (?, ?, ?, ?)",
+                               [(source, *entry)])
+                if not self._upload_pattern.fullmatch(source):
+                    self.library_version += 1
+        return digest
+
+    def generate_async(self, source, data=None):
+        """Queues `source` for the generator thread; dropped when the queue is full."""
+        if self._queue is None:
+            return
+        with self._lock:
+            if source in self._inflight:
+                return
+            self._inflight.add(source)
+        try:
+            self._queue.put_nowait((source, data))
+        except queue.Full:
+            # The page falls back to the lazy URL, which generates on first request
+            with self._lock:
+                self._inflight.discard(source)
+                self.dropped += 1
+
+    def _run(self):
+        while True:
+            source, data = self._queue.get()
+            try:
+                self.generate(source, data)
+            except Exception as e:
+                logging.warning(f"Thumbnail generation failed for {source}: {e}")
+            finally:
+                with self._lock:
+                    self._inflight.discard(source)
+
+    # --- TEMPLATE HELPERS ---
+    def digest_for(self, source):
+        """Digest of an up-to-date derivative set for `source`, or None."""
+        with self._lock:
+            entry = self._lookup(source)
+        if entry is None:
+            return None
+        try:
+            st = os.stat(os.path.join(self.static_folder, *source.split('/')))
+        except FileNotFoundError:
+            # Pending upload: derivatives were made from its bytes
+            return entry[2] if entry[0] == 0 else None
+        if entry[0] in (st.st_mtime_ns, 0) and entry[1] == st.st_size:
+            return entry[2]
+        return None
+
+    def url(self, source, width, ext='webp'):
+        digest = self.digest_for(source)
+        if digest is None:
+            if os.path.exists(os.path.join(self.static_folder, *source.split('/'))):
+                self.generate_async(source)
+            return url_for('main.lazy_thumbnail', source=source, w=width, ext=ext)
+        width = min((w for w in self.widths if w >= width), default=self.widths[-1])
+        return url_for('main.thumbnail', name=f"{digest}_{width}.{ext}")
+
+    def srcset(self, source, ext='webp'):
+        return ", ".join(f"{self.url(source, w, ext)} {w}w" for w in self.widths)
+
+    # --- HOUSEKEEPING ---
+    def prune(self):
+        """Drops derivatives whose source no longer exists. Returns files removed."""
+        with self._lock:
+            rows = self._db_query("SELECT source, digest FROM manifest")
+            gone = {source for source, _ in rows
+                    if not os.path.exists(os.path.join(self.static_folder, *source.split('/')))}
+            self._db_write("DELETE FROM manifest WHERE source = ?", [(source,) for source in gone])
+            for source in gone:
+                self._manifest.pop(source, None)
+            live = {digest for source, digest in rows if source not in gone}
+        return self._remove_derivatives(live)
+
+    def discard(self, paths):
+        """Forgets deleted source files (absolute paths) and removes derivatives no other source uses.
+
+        Called by the upload retention pass, so thumbnails expire with their
+        uploads. Returns files removed.
+        """
+        sources = [os.path.relpath(p, self.static_folder).replace(os.sep, '/') for p in paths]
+        if not sources:
+            return 0
+        with self._lock:
+            digests = set()
+            for i in range(0, len(sources), 500):
+                chunk = sources[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                digests.update(d for d, in self._db_query(f"SELECT digest FROM manifest WHERE source IN ({marks})", chunk))
+            digests.update(self._manifest[s][2] for s in sources if s in self._manifest)
+            self._db_write("DELETE FROM manifest WHERE source = ?", [(s,) for s in sources])
+            for source in sources:
+                self._manifest.pop(source, None)
+            digests = [d for d in digests
+                       if not self._db_query("SELECT 1 FROM manifest WHERE digest = ? LIMIT 1", (d,))]
+        removed = 0
+        for digest in digests:
+            for width in self.widths:
+                for ext, _, _ in _FORMATS:
+                    try:
+                        os.remove(self._path(digest, width, ext))
+                        removed += 1
+                    except FileNotFoundError:
+                        pass
+        return removed
+
+    def _remove_derivatives(self, live):
+        removed = 0
+        cutoff = time.time() - _PRUNE_GRACE_S
+        extensions = {ext for ext, _, _ in _FORMATS}
+        for filename in os.listdir(self.folder):
+            stem, _, ext = filename.rpartition('.')
+            path = os.path.join(self.folder, filename)
+            if ext not in extensions or stem.split('_', 1)[0] in live:
+                continue
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _path(self, digest, width, ext):
+        return os.path.join(self.folder, f"{digest}_{width}.{ext}")
+
+    # --- MANIFEST (caller holds the lock) ---
+    def _lookup(self, source):
+        entry = self._manifest.get(source)
+        if entry is not None:
+            self._manifest.move_to_end(source)
+            return entry
+        rows = self._db_query("SELECT mtime_ns, size, digest FROM manifest WHERE source = ?", (source,))
+        if not rows:
+            return None
+        entry = list(rows[0])
+        self._remember(source, entry)
+        return entry
+
+    def _remember(self, source, entry):
+        self._manifest[source] = entry
+        self._manifest.move_to_end(source)
+        while len(self._manifest) > _MEMORY_ENTRIES:
+            self._manifest.popitem(last=False)
+
+    def _db_query(self, sql, params=()):
+        if not self._conn:
+            return []
+        try:
+            return self._conn.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logging.error(f"Thumbnail manifest read failed: {e}")
+            return []
+
+    def _db_write(self, sql, rows):
+        if not self._conn or not rows:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(sql, rows)
+        except sqlite3.Error as e:
+            logging.error(f"Thumbnail manifest update failed: {e}")
+
+    def _open_db(self, db_path):
+        try:
+            os.makedirs(os.path.dirname(db_path), exist_ok=True)
+            conn = sqlite3.connect(db_path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS manifest ("
+                "source TEXT PRIMARY KEY, mtime_ns INTEGER NOT NULL, size INTEGER NOT NULL, digest TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_manifest_digest ON manifest (digest)")
+            conn.commit()
+            self._conn = conn
+            self._import_json_manifest()
+        except Exception as e:
+            logging.error(f"Thumbnail manifest DB disabled: {e}")
+
+    def _import_json_manifest(self):
+        """Moves entries from the manifest.json used before the SQLite table."""
+        path = os.path.join(self.folder, 'manifest.json')
+        try:
+            with open(path) as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            logging.error(f"Error loading thumbnail manifest: {e}")
+            return
+        self._db_write("INSERT OR IGNORE INTO manifest (source, mtime_ns, size, digest) VALUES (?, ?, ?, ?)",
+                       [(source, *entry) for source, entry in entries.items()])
+        for name in ('manifest.json', 'manifest.json.lock'):
+            try:
+                os.remove(os.path.join(self.folder, name))
+            except FileNotFoundError:
+                pass
+
+
+thumbnails = ThumbnailCache()
@@ -1,9 +1,10 @@
-import sqlite3
 import os
 import shutil
 
-# Configuration
-DB_PATH = 'instance/database.db'
+from app import create_app
+from models import db, DelicacyInfo
+from migrations import upgrade, schema_version
+from delicacy_cache import delicacy_cache
 
 # --- 1. Define Source and Destination Directories ---
 # This matches the folder structure you showed in your screenshot
@@ -26,31 +27,28 @@ IMAGE_MAPPING = {
 
 
 def migrate_and_seed():
-    if not os.path.exists(DB_PATH):
-        print(f"❌ Error: {DB_PATH} not found. Run app.py first to create it.")
-        return
+    # Same engine, pragmas and write lock as the running app (see database.py)
+    app = create_app(prefork=True)
+    with app.app_context():
+        db_path = db.engine.url.database
+        if not os.path.exists(db_path):
+            print(f"❌ Error: {db_path} not found. Run app.py first to create it.")
+            return
+        _migrate_and_seed()
+
 
+def _migrate_and_seed():
     # Ensure uploads directory exists
     os.makedirs(DEST_DIR, exist_ok=True)
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
     print("--- 🛠️ Starting Database Update ---")
 
-    # 1. Check if 'image_filename' column exists
-    cursor.execute("PRAGMA table_info(delicacy_info)")
-    columns = [info[1] for info in cursor.fetchall()]
-
-    if 'image_filename' not in columns:
-        print("adding 'image_filename' column...")
-        try:
-            cursor.execute("ALTER TABLE delicacy_info ADD COLUMN image_filename VARCHAR(255)")
-            print("✅ Column added successfully.")
-        except Exception as e:
-            print(f"⚠️ Error adding column: {e}")
-    else:
-        print("ℹ️ Column 'image_filename' already exists.")
+    # 1. Create missing tables, then apply pending schema migrations (migrations.py)
+    db.create_all()
+    applied = upgrade(db.engine)
+    for version, description in applied:
+        print(f"✅ Applied migration v{version}: {description}")
+    print(f"ℹ️ Schema at v{schema_version(db.engine)}.")
 
     # 2. Update Data and Copy Images
     print("\n--- 🌱 Seeding Image Data & Copying Files ---")
@@ -71,20 +69,24 @@ def migrate_and_seed():
             # We continue anyway to update the DB, assuming you might add the file later
 
         # B. Update Database Record
-        cursor.execute("SELECT id FROM delicacy_info WHERE name = ?", (name,))
-        row = cursor.fetchone()
+        delicacy = DelicacyInfo.query.filter_by(name=name).first()
 
-        if row:
-            try:
-                cursor.execute("UPDATE delicacy_info SET image_filename = ? WHERE name = ?", (filename, name))
-                print(f"   💾 DB Updated: {name} -> {filename}")
-            except Exception as e:
-                print(f"   ❌ DB Update Failed for {name}: {e}")
+        if delicacy:
+            delicacy.image_filename = filename
+            print(f"   💾 DB Updated: {name} -> {filename}")
         else:
             print(f"   ⚠️ Skipped DB Update: {name} (Delicacy not found in DB)")
 
-    conn.commit()
-    conn.close()
+    try:
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f"   ❌ DB Update Failed: {e}")
+        return
+
+    # Tell running app processes to reload their DelicacyInfo cache
+    delicacy_cache.invalidate()
+    print("   🔄 Delicacy cache version bumped")
     print("\n--- ✨ Database & File Update Complete ---")
 
 
@@ -0,0 +1,220 @@
+import os
+import time
+import queue
+import atexit
+import logging
+import threading
+import click
+
+from thumbnails import thumbnails
+
+# Sniffed from the first bytes so the stored extension matches the content,
+# whatever the client called the file
+_SIGNATURES = (
+    (b'\xff\xd8\xff', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', '.png'),
+    (b'GIF8', '.gif'),
+    (b'BM', '.bmp'),
+)
+
+
+def _extension(data, filename):
+    for magic, ext in _SIGNATURES:
+        if data.startswith(magic):
+            return ext
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return '.webp'
+    ext = os.path.splitext(filename or '')[1].lower()
+    return ext if ext and len(ext) <= 5 else '.bin'
+
+
+def _is_shard(name):
+    return len(name) == 2 and all(c in '0123456789abcdef' for c in name)
+
+
+class UploadStore:
+    """Persists recognized photos off the request path, under content-addressed names.
+
+    `put()` returns the relative name immediately (e.g. "3f/a9/3fa9...e1.jpg")
+    and a background thread writes the bytes with a temp file + rename. Until
+    then the bytes stay in `pending` so the result page can still show them.
+    Identical photos share one file, and two users uploading "IMG_0001.jpg"
+    no longer overwrite each other.
+
+    Files under the two-level hex shards are pruned by age (UPLOAD_RETENTION_DAYS)
+    and total size (UPLOAD_MAX_TOTAL_MB, oldest first), together with their
+    thumbnails. Anything at the top of UPLOAD_FOLDER, such as the library
+    images, is never touched.
+    """
+
+    def __init__(self):
+        self.root = 'static/uploads'
+        self.retention_days = 30
+        self.max_total_mb = 2048
+        self.prune_interval = 3600
+        self._queue = queue.Queue(maxsize=256)
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_prune = time.monotonic()
+        self.written = 0
+        self.deduplicated = 0
+
+    def init_app(self, app):
+        self.root = os.path.join(app.root_path, app.config['UPLOAD_FOLDER'])
+        self.retention_days = app.config['UPLOAD_RETENTION_DAYS']
+        self.max_total_mb = app.config['UPLOAD_MAX_TOTAL_MB']
+        self.prune_interval = app.config['UPLOAD_PRUNE_INTERVAL']
+        self._queue = queue.Queue(maxsize=app.config['UPLOAD_WRITER_MAX_QUEUE'])
+        if not app.config.get('PREFORK'):
+            self.start()
+
+    def start(self):
+        """Starts the writer thread (in each worker when running under a pre-fork server)."""
+        self._thread = threading.Thread(target=self._run, name="upload-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    # --- PUBLIC API ---
+    @staticmethod
+    def name_for(digest, data, filename=None):
+        return f"{digest[:2]}/{digest[2:4]}/{digest}{_extension(data, filename)}"
+
+    def put(self, digest, data, filename=None):
+        name = self.name_for(digest, data, filename)
+        with self._lock:
+            if name in self._pending:
+                return name
+            self._pending[name] = data
+        if self._thread is None or not self._thread.is_alive():
+            self._write(name)
+            return name
+        try:
+            self._queue.put_nowait(name)
+        except queue.Full:
+            logging.warning("Upload writer queue full, writing synchronously.")
+            self._write(name)
+        return name
+
+    def pending(self, name):
+        """Bytes of an image that has not reached disk yet, or None."""
+        with self._lock:
+            return self._pending.get(name)
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    def stop(self, timeout=5.0):
+        if self._thread is None or not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    # --- WRITER THREAD ---
+    def _run(self):
+        while True:
+            try:
+                name = self._queue.get(timeout=min(self.prune_interval, 60))
+            except queue.Empty:
+                name = ''
+            if name is None:
+                return
+            if name:
+                self._write(name)
+            if self.prune_interval and time.monotonic() - self._last_prune >= self.prune_interval:
+                self._last_prune = time.monotonic()
+                try:
+                    self.prune()
+                except Exception as e:
+                    logging.error(f"Upload prune failed: {e}")
+
+    def _write(self, name):
+        with self._lock:
+            data = self._pending.get(name)
+        if data is None:
+            return
+        path = self.path(name)
+        try:
+            if os.path.exists(path):
+                # Same content already stored; refresh mtime so retention keeps it
+                os.utime(path)
+                self.deduplicated += 1
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp_path = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                self.written += 1
+        except OSError as e:
+            logging.error(f"Upload write failed for {name}: {e}")
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    # --- RETENTION ---
+    def prune(self, retention_days=None, max_total_mb=None):
+        """Deletes expired files, then the oldest ones until under the size cap.
+
+        Returns (files_removed, bytes_freed).
+        """
+        retention_days = self.retention_days if retention_days is None else retention_days
+        max_total_mb = self.max_total_mb if max_total_mb is None else max_total_mb
+        cutoff = time.time() - retention_days * 86400 if retention_days else None
+
+        files = []
+        for shard in os.listdir(self.root) if os.path.isdir(self.root) else []:
+            shard_path = os.path.join(self.root, shard)
+            if not _is_shard(shard) or not os.path.isdir(shard_path):
+                continue
+            for dirpath, _, filenames in os.walk(shard_path):
+                for filename in filenames:
+                    path = os.path.join(dirpath, filename)
+                    try:
+                        st = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    files.append((st.st_mtime, st.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        limit = max_total_mb * 1024 * 1024 if max_total_mb else None
+        removed, freed, deleted = 0, 0, []
+        for mtime, size, path in files:
+            expired = cutoff is not None and mtime < cutoff
+            over = limit is not None and total > limit
+            if not expired and not over:
+                break
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+            freed += size
+
+        # Drop shard directories left empty
+        for dirpath, dirnames, filenames in os.walk(self.root, topdown=False):
+            rel = os.path.relpath(dirpath, self.root)
+            if rel != '.' and all(_is_shard(p) for p in rel.split(os.sep)) and not os.listdir(dirpath):
+                os.rmdir(dirpath)
+
+        thumbs = thumbnails.discard(deleted)
+        if removed:
+            logging.info(f"Upload prune: removed {removed} file(s), freed {freed / (1024 * 1024):.1f} MB, "
+                         f"{thumbs} thumbnail(s)")
+        return removed, freed
+
+
+upload_store = UploadStore()
+
+
+@click.command('prune-uploads')
+@click.option('--days', type=int, default=None, help="Override UPLOAD_RETENTION_DAYS (0 disables the age rule).")
+@click.option('--max-mb', type=int, default=None, help="Override UPLOAD_MAX_TOTAL_MB (0 disables the size cap).")
+def prune_uploads_command(days, max_mb):
+    """Apply the uploads retention policy now."""
+    removed, freed = upload_store.prune(days, max_mb)
+    click.echo(f"Removed {removed} upload(s), freed {freed / (1024 * 1024):.1f} MB.")
+    click.echo(f"Removed {thumbnails.prune()} orphaned thumbnail(s).")
@@ -1,12 +1,7 @@
 import os
 import json
+import time
 import logging
-import numpy as np
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.resnet50 import preprocess_input as resnet_preprocess
-from tensorflow.keras.applications.mobilenet_v2 import preprocess_input as mobilenet_preprocess
-from tensorflow.keras.applications.efficientnet import preprocess_input as efficientnet_preprocess
 from models import db, User, DelicacyInfo
 
 # --- GLOBAL VARIABLES ---
@@ -20,6 +15,19 @@ MODEL_PATHS = {
     "EfficientNetB0 (Fine-Tuned)": "EfficientNetB0_v1_ft.keras"
 }
 
+# MODEL_PATHS name -> key used in model_metrics.json and the generated reports
+METRIC_KEYS = {
+    "AlexNet (Base)": "AlexNet",
+    "ResNet50 (Base)": "ResNet50",
+    "MobileNetV2 (Base)": "MobileNetV2",
+    "EfficientNetB0 (Base)": "EfficientNetB0",
+    "ResNet50 (Fine-Tuned)": "ResNet50_FT",
+    "MobileNetV2 (Fine-Tuned)": "MobileNetV2_FT",
+    "EfficientNetB0 (Fine-Tuned)": "EfficientNetB0_FT"
+}
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.webp'}
+
 CLASS_NAMES = sorted([
     "kuih_kaswi_pandan", "kuih_ketayap", "kuih_lapis", "kuih_seri_muka", "kuih_talam", "kuih_ubi_kayu", "onde_onde"
 ])
@@ -37,39 +45,110 @@ DISPLAY_NAMES = {
 SYSTEM_STATE = {
     "is_active": False,
     "current_model_name": "ResNet50 (Fine-Tuned)",
-    "loaded_model": None
+    # Defaults for /recognize; requests can override them with ?tta= / ?ensemble=
+    "tta_views": 1,
+    "ensemble_models": [],
+    "ensemble_weighting": "accuracy"
 }
 
+# Process lifecycle for the health probes
+SERVING_STATE = {
+    "started_at": time.time(),
+    "ready_at": None,
+    "draining": False
+}
 
-def prepare_image(img_path, model_name):
-    img = image.load_img(img_path, target_size=(224, 224))
-    img_array = image.img_to_array(img)
-    img_array = np.expand_dims(img_array, axis=0)
 
-    if "AlexNet" in model_name:
-        return img_array / 255.0
-    elif "ResNet50" in model_name:
-        return resnet_preprocess(img_array)
-    elif "MobileNetV2" in model_name:
-        return mobilenet_preprocess(img_array)
-    elif "EfficientNetB0" in model_name:
-        return efficientnet_preprocess(img_array)
-    else:
-        return img_array / 255.0
+def process_memory():
+    """RSS of this process in MB, plus the part shared with other processes (Linux only)."""
+    memory = {"rss_mb": None, "shared_mb": None}
+    try:
+        with open('/proc/self/smaps_rollup') as f:
+            fields = {line.split(':')[0]: int(line.split()[1]) for line in f if line.endswith('kB\n')}
+        memory["rss_mb"] = round(fields['Rss'] / 1024, 1)
+        memory["shared_mb"] = round((fields.get('Shared_Clean', 0) + fields.get('Shared_Dirty', 0)) / 1024, 1)
+    except (OSError, KeyError, ValueError):
+        import resource
+        memory["rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return memory
+
+
+# Parsed model_metrics.json, reused until the file's mtime or size changes
+_METRICS_CACHE = {"path": None, "stamp": None, "data": {}}
 
 
 def load_model_metrics(app_root):
+    """model_metrics.json (written by evaluate_models.py), parsed once per file version.
+
+    The returned dict is shared between requests; treat it as read-only.
+    """
+    json_path = os.path.join(app_root, 'model_metrics.json')
     try:
-        json_path = os.path.join(app_root, 'model_metrics.json')
-        if os.path.exists(json_path):
-            with open(json_path, 'r') as f:
-                return json.load(f)
-        else:
+        st = os.stat(json_path)
+    except OSError:
+        if _METRICS_CACHE["stamp"] != 'missing':
             logging.warning("model_metrics.json not found. Using empty data.")
-            return {}
+            _METRICS_CACHE.update(path=json_path, stamp='missing', data={})
+        return {}
+    stamp = (st.st_mtime_ns, st.st_size)
+    if _METRICS_CACHE["path"] == json_path and _METRICS_CACHE["stamp"] == stamp:
+        return _METRICS_CACHE["data"]
+    try:
+        with open(json_path, 'r') as f:
+            data = json.load(f)
     except Exception as e:
         logging.error(f"Error loading metrics: {e}")
         return {}
+    _METRICS_CACHE.update(path=json_path, stamp=stamp, data=data)
+    return data
+
+
+def load_quantization_report(app_root, model_folder='MyModels'):
+    # Written by convert_tflite.py; keyed like model_metrics.json
+    json_path = os.path.join(app_root, model_folder, 'tflite', 'tflite_report.json')
+    try:
+        if os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading quantization report: {e}")
+    return {}
+
+
+def load_benchmark_report(app_root, model_folder='MyModels'):
+    # Written by benchmark.py; keyed like model_metrics.json
+    json_path = os.path.join(app_root, model_folder, 'benchmark_report.json')
+    try:
+        if os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading benchmark report: {e}")
+    return {}
+
+
+def load_calibration_report(app_root, model_folder='MyModels'):
+    # Written by calibrate.py; keyed like model_metrics.json
+    json_path = os.path.join(app_root, model_folder, 'calibration.json')
+    try:
+        if os.path.exists(json_path):
+            with open(json_path, 'r') as f:
+                return json.load(f)
+    except Exception as e:
+        logging.error(f"Error loading calibration report: {e}")
+    return {}
+
+
+def iter_labelled_images(root):
+    """Yields (path, class_index) for a test folder laid out as root/<class_name>/*.jpg."""
+    for idx, class_name in enumerate(CLASS_NAMES):
+        folder = os.path.join(root, class_name)
+        if not os.path.isdir(folder):
+            logging.warning(f"Missing class folder: {folder}")
+            continue
+        for filename in sorted(os.listdir(folder)):
+            if os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.join(folder, filename), idx
 
 
 def init_db_data():
@@ -0,0 +1,237 @@
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing as mp
+from multiprocessing import shared_memory
+import numpy as np
+
+from preprocessing import IMG_SIZE
+from backends import load_inference_model, model_size_bytes
+
+# Output rows are written into a fixed-size shared block. The pool only
+# returns classifier outputs (one softmax row per image), so this just needs
+# headroom over the class count.
+OUTPUT_MAX_FLOATS = 1024
+
+
+def _worker_main(index, model_path, backend, in_name, out_name, max_batch, intra_threads, inter_threads, conn):
+    """Entry point of one inference process: load the model once, then serve batches."""
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    try:
+        if backend == 'keras':
+            import tensorflow as tf
+            tf.config.threading.set_intra_op_parallelism_threads(intra_threads)
+            tf.config.threading.set_inter_op_parallelism_threads(inter_threads)
+        model = load_inference_model(model_path, backend, num_threads=intra_threads)
+
+        # Spawned children share the parent's resource tracker, and the parent
+        # unlinks these blocks in close(), so attaching here is all we do
+        shm_in = shared_memory.SharedMemory(name=in_name)
+        shm_out = shared_memory.SharedMemory(name=out_name)
+        inputs = np.ndarray((max_batch,) + IMG_SIZE[::-1] + (3,), dtype=np.float32, buffer=shm_in.buf)
+        outputs = np.ndarray((max_batch * OUTPUT_MAX_FLOATS,), dtype=np.float32, buffer=shm_out.buf)
+        # Warm-up pass so graph tracing happens before the first real batch
+        inputs[:1] = 0
+        model.predict_on_batch(inputs[:1])
+        conn.send(('ready', model_size_bytes(model, model_path)))
+    except Exception as e:
+        conn.send(('error', f"{type(e).__name__}: {e}"))
+        return
+
+    while True:
+        try:
+            n = conn.recv()
+        except (EOFError, OSError):
+            break
+        if n is None:
+            break
+        try:
+            preds = np.asarray(model.predict_on_batch(inputs[:n]), dtype=np.float32).reshape(n, -1)
+            if preds.shape[1] > OUTPUT_MAX_FLOATS:
+                raise ValueError(f"Output width {preds.shape[1]} exceeds {OUTPUT_MAX_FLOATS}")
+            outputs[:preds.size] = preds.ravel()
+            conn.send(('ok', preds.shape))
+        except Exception as e:
+            conn.send(('error', f"{type(e).__name__}: {e}"))
+
+    del inputs, outputs
+    shm_in.close()
+    shm_out.close()
+
+
+class _Slot:
+    def __init__(self, index, max_batch):
+        self.index = index
+        self.generation = 0
+        self.process = None
+        self.conn = None
+        self.shm_in = shared_memory.SharedMemory(create=True, size=max_batch * IMG_SIZE[0] * IMG_SIZE[1] * 3 * 4)
+        self.shm_out = shared_memory.SharedMemory(create=True, size=max_batch * OUTPUT_MAX_FLOATS * 4)
+        self.inputs = np.ndarray((max_batch,) + IMG_SIZE[::-1] + (3,), dtype=np.float32, buffer=self.shm_in.buf)
+        self.outputs = np.ndarray((max_batch * OUTPUT_MAX_FLOATS,), dtype=np.float32, buffer=self.shm_out.buf)
+
+
+class InferencePool:
+    """N spawned processes each holding their own copy of one model.
+
+    Batches travel through per-worker shared-memory blocks; the pipe only
+    carries the row count and the output shape. A monitor thread restarts
+    any worker that dies.
+    """
+
+    def __init__(self, name, model_path, workers=2, backend='keras', intra_threads=2, inter_threads=1,
+                 max_batch=16, start_timeout=120):
+        self.name = name
+        self.model_path = model_path
+        self.backend = backend
+        self.workers = workers
+        self.intra_threads = intra_threads
+        self.inter_threads = inter_threads
+        self.max_batch = max_batch
+        self.start_timeout = start_timeout
+        self.size_bytes = 0
+        self.restarts = 0
+        self._ctx = mp.get_context('spawn')
+        self._idle = queue.Queue()
+        self._stop = threading.Event()
+        self._monitor = None
+        self._slots = [_Slot(i, max_batch) for i in range(workers)]
+        try:
+            for slot in self._slots:
+                self._spawn(slot)
+            for slot in self._slots:
+                self._await_ready(slot)
+        except Exception:
+            self.close()
+            raise
+        self._monitor = threading.Thread(target=self._watch, name=f"pool-monitor-{name}", daemon=True)
+        self._monitor.start()
+        logging.info(f"Inference pool for {name}: {workers} worker(s), "
+                     f"{intra_threads} intra-op / {inter_threads} inter-op threads each")
+
+    # --- PUBLIC API ---
+    def predict(self, batch):
+        n = batch.shape[0]
+        if n > self.max_batch:
+            raise ValueError(f"{n} rows exceed pool max batch {self.max_batch}")
+        slot, generation = self._checkout()
+        try:
+            slot.inputs[:n] = batch
+            slot.conn.send(n)
+            status, payload = slot.conn.recv()
+        except (EOFError, OSError) as e:
+            # Worker died mid-batch; the monitor will restart it
+            raise RuntimeError(f"Inference worker {slot.index} for {self.name} died") from e
+        if status != 'ok':
+            self._checkin(slot, generation)
+            raise RuntimeError(payload)
+        rows, cols = payload
+        result = slot.outputs[:rows * cols].reshape(rows, cols).copy()
+        self._checkin(slot, generation)
+        return result
+
+    def alive(self):
+        return sum(1 for s in self._slots if s.process is not None and s.process.is_alive())
+
+    def close(self):
+        # Stop the monitor first so a restart in flight cannot spawn a worker
+        # onto segments that are about to be unlinked
+        self._stop.set()
+        if self._monitor is not None and self._monitor is not threading.current_thread():
+            self._monitor.join()
+        for slot in self._slots:
+            try:
+                if slot.conn:
+                    slot.conn.send(None)
+            except (OSError, ValueError):
+                pass
+        for slot in self._slots:
+            if slot.process is not None:
+                slot.process.join(5)
+                if slot.process.is_alive():
+                    slot.process.terminate()
+            if slot.conn:
+                slot.conn.close()
+            slot.inputs = slot.outputs = None
+            slot.shm_in.close()
+            slot.shm_in.unlink()
+            slot.shm_out.close()
+            slot.shm_out.unlink()
+
+    # --- SLOT MANAGEMENT ---
+    def _checkout(self):
+        deadline = time.monotonic() + self.start_timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                slot, generation = self._idle.get(timeout=max(0.0, remaining))
+            except queue.Empty:
+                raise RuntimeError(f"No inference worker available for {self.name}")
+            if generation == slot.generation and slot.process.is_alive():
+                return slot, generation
+
+    def _checkin(self, slot, generation):
+        if generation == slot.generation:
+            self._idle.put((slot, generation))
+
+    def _spawn(self, slot):
+        parent_conn, child_conn = self._ctx.Pipe()
+        slot.process = self._ctx.Process(
+            target=_worker_main,
+            args=(slot.index, self.model_path, self.backend, slot.shm_in.name, slot.shm_out.name, self.max_batch,
+                  self.intra_threads, self.inter_threads, child_conn),
+            name=f"inference-{self.name}-{slot.index}",
+            daemon=True
+        )
+        slot.process.start()
+        child_conn.close()
+        slot.conn = parent_conn
+
+    def _await_ready(self, slot):
+        deadline = time.monotonic() + self.start_timeout
+        while not slot.conn.poll(0.5):
+            if self._stop.is_set():
+                raise RuntimeError(f"Inference pool for {self.name} is closing")
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Inference worker {slot.index} for {self.name} did not start")
+        try:
+            status, payload = slot.conn.recv()
+        except EOFError:
+            status, payload = 'error', f"exited with code {slot.process.exitcode}"
+        if status != 'ready':
+            raise RuntimeError(f"Inference worker {slot.index} failed: {payload}")
+        self.size_bytes = payload
+        self._idle.put((slot, slot.generation))
+
+    def _restart(self, slots):
+        """Respawns every dead slot before waiting on any, so they load the model in parallel."""
+        spawned = []
+        for slot in slots:
+            if self._stop.is_set():
+                break
+            slot.generation += 1
+            if slot.process.is_alive():
+                slot.process.terminate()
+            slot.process.join(5)
+            slot.conn.close()
+            self.restarts += 1
+            logging.warning(f"Restarting inference worker {slot.index} for {self.name} "
+                            f"(exit code {slot.process.exitcode})")
+            try:
+                self._spawn(slot)
+                spawned.append(slot)
+            except Exception as e:
+                logging.error(f"Worker restart failed ({self.name}/{slot.index}): {e}")
+        for slot in spawned:
+            try:
+                self._await_ready(slot)
+            except Exception as e:
+                logging.error(f"Worker restart failed ({self.name}/{slot.index}): {e}")
+
+    def _watch(self):
+        while not self._stop.wait(1.0):
+            dead = [slot for slot in self._slots if not slot.process.is_alive()]
+            if dead:
+                self._restart(dead)
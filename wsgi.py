@@ -0,0 +1,93 @@
+"""Production entry point for a pre-forking server.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The master creates the app, prepares the database and reads shareable model
+weights once. Each forked worker then starts its own background threads and
+loads/warms the active model; /readyz stays 503 until that is done.
+"""
+import time
+import logging
+import threading
+
+_started = time.perf_counter()
+
+from app import create_app
+from models import db
+from database import dispose_engines
+from migrations import upgrade
+from model_registry import registry
+from prediction_cache import prediction_cache
+from log_writer import log_writer
+from upload_store import upload_store
+from thumbnails import thumbnails
+from stats import ensure_backfilled
+from utils import init_db_data, process_memory, SYSTEM_STATE, SERVING_STATE
+
+app = create_app(prefork=True)
+
+with app.app_context():
+    db.create_all()
+    upgrade(db.engine)
+    init_db_data()
+    ensure_backfilled()
+    # Pooled SQLite connections must not be inherited by workers
+    dispose_engines()
+
+
+def startup_models():
+    names = [SYSTEM_STATE['current_model_name']] + list(app.config['MODEL_PRELOAD'])
+    return list(dict.fromkeys(names))
+
+
+registry.share_before_fork(startup_models())
+_master_ready_s = time.perf_counter() - _started
+logging.info(f"WSGI master ready in {_master_ready_s:.1f}s | RSS {process_memory()['rss_mb']} MB")
+
+
+# --- WORKER LIFECYCLE (called from gunicorn.conf.py) ---
+def init_worker():
+    """Runs in each worker right after fork."""
+    started = time.perf_counter()
+    with app.app_context():
+        dispose_engines(close=False)
+    prediction_cache.start()
+    log_writer.start()
+    upload_store.start()
+    thumbnails.start()
+    registry.start()
+
+    def _warm():
+        # Loading can outlast the server's worker timeout, so it runs beside the
+        # request loop; /readyz reports 503 until it finishes
+        name = SYSTEM_STATE['current_model_name']
+        try:
+            if app.config['WSGI_AUTOSTART']:
+                entry = registry.activate(name)
+                SYSTEM_STATE['is_active'] = True
+                detail = f"{name} loaded in {entry.load_time_s:.1f}s, warm-up {entry.warmup_ms} ms"
+            else:
+                detail = "autostart off"
+            SERVING_STATE['ready_at'] = time.time()
+            memory = process_memory()
+            logging.info(f"Worker ready in {time.perf_counter() - started:.1f}s ({detail}) | "
+                         f"RSS {memory['rss_mb']} MB, shared {memory['shared_mb']} MB")
+        except Exception as e:
+            logging.error(f"Worker warm-up failed ({name}): {e}")
+
+    threading.Thread(target=_warm, name="worker-warmup", daemon=True).start()
+
+
+def drain():
+    """Fail readiness so the load balancer stops routing here; in-flight requests still finish."""
+    SERVING_STATE['draining'] = True
+    logging.info("Worker draining")
+
+
+def shutdown():
+    drain()
+    log_writer.stop()
+    upload_store.stop()
+    for entry in registry.resident():
+        entry.close()
+    logging.info("Worker stopped: logs flushed, models released")